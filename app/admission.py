@@ -0,0 +1,186 @@
+"""Admission control: per-client rate limits and a bound on concurrent writes.
+
+SQLite has a single writer. A client bursting writes used to fill the
+event loop with requests queued on the write lock, slowing every other
+client down and ending in "database is locked" errors after the busy
+timeout. ``AdmissionMiddleware`` refuses the excess before it reaches the
+handlers:
+
+1. every request takes a token from the bucket of its client and route
+   class (``route_class``): ``read``, ``write`` or ``bulk`` (bulk creates
+   and delete-all), each with the rate and burst of ``config.rate_limits``.
+   An empty bucket means 429 Too Many Requests, with Retry-After set to the
+   seconds until the next token
+2. writes then wait for one of ``config.write_concurrency`` slots, for at
+   most ``config.write_queue_timeout`` seconds, and get 503 Service
+   Unavailable with Retry-After otherwise. Registrations going through the
+   registration queue skip the slots: the queue is bounded on its own
+
+Buckets live in memory, one per (client, class) pair, in an LRU dict capped
+at ``config.rate_limit_max_clients`` entries: taking a token and evicting
+the oldest bucket are O(1), with no background task. A client is its peer
+address, or the first value of ``config.rate_limit_client_header`` behind
+a proxy. Limits apply per worker process.
+
+Refused requests are counted in ``http_requests_rejected_total``.
+Benchmark: ``python -m benchmarks.bench_admission``.
+"""
+
+import asyncio
+import json
+import math
+import re
+import time
+from collections import OrderedDict
+
+from app.config import config
+from app.metrics import rejected_requests
+
+
+# Bulk creates (events, users, registrations of an event)
+BULK_PATHS = re.compile(r"^/(events|users|events/\d+/register)/bulk/?$")
+# DELETE on these deletes every row of the table
+DELETE_ALL_PATHS = re.compile(r"^/(events|users)/?$")
+# Registrations handed to the registration queue when it is enabled
+REGISTER_PATHS = re.compile(r"^/events/\d+/register/?$")
+
+READ_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+
+def route_class(method: str, path: str) -> str | None:
+    '''
+    \nThe rate limit class of a request.
+
+    Return value:
+        "read", "write" or "bulk", None for the static files (not limited)
+    '''
+    if path.startswith("/static/"):
+        return None
+    if method in READ_METHODS:
+        return "read"
+    if BULK_PATHS.match(path) or (method == "DELETE" and DELETE_ALL_PATHS.match(path)):
+        return "bulk"
+    return "write"
+
+
+class TokenBuckets:
+    '''
+    \nToken buckets keyed by (client, route class), refilled lazily when a
+    token is taken. The least recently used bucket is dropped when there are
+    more than ``config.rate_limit_max_clients``: a client coming back after
+    that starts with a full bucket, as a new one would.
+    '''
+
+    def __init__(self):
+        # (client, class) -> [tokens, time of the last refill]
+        self._buckets: OrderedDict[tuple[str, str], list[float]] = OrderedDict()
+
+    def take(self, client: str, klass: str) -> float:
+        '''
+        \nTakes a token from the bucket of a client.
+
+        Return value:
+            0 if the request is admitted, otherwise the seconds until the
+            bucket has a token again
+        '''
+        rate, burst = config.rate_limits[klass]
+        now = time.monotonic()
+        key = (client, klass)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [float(burst), now]
+            while len(self._buckets) > config.rate_limit_max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(float(burst), bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+        if bucket[0] >= 1.0:
+            bucket[0] -= 1.0
+            return 0.0
+        return (1.0 - bucket[0]) / rate
+
+    def clear(self) -> None:
+        self._buckets.clear()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+token_buckets: TokenBuckets = TokenBuckets()
+
+
+def client_id(scope) -> str:
+    '''
+    \nThe client sending a request: the first value of
+    ``config.rate_limit_client_header`` when set and present, the peer address
+    otherwise (also the scope of the idempotency keys, see
+    ``app.data.idempotency``).
+    '''
+    header = config.rate_limit_client_header
+    if header is not None:
+        name = header.encode("latin-1")
+        value = next((value for key, value in scope["headers"] if key == name), None)
+        if value:
+            # X-Forwarded-For: client, proxy1, proxy2
+            return value.decode("latin-1").split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+async def _send_error(send, status: int, detail: str, retry_after: int) -> None:
+    body = json.dumps({"detail": detail}).encode()
+    await send({"type": "http.response.start", "status": status, "headers": [
+        (b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+        (b"retry-after", str(retry_after).encode()),
+    ]})
+    await send({"type": "http.response.body", "body": body})
+
+
+class AdmissionMiddleware:
+    '''
+    \nASGI middleware applying the rate limits and the write slots (see the
+    module docstring).
+    '''
+
+    def __init__(self, app):
+        self.app = app
+        # Created on the first write, in the event loop serving it
+        self._write_slots: asyncio.Semaphore | None = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not config.rate_limit_enabled:
+            await self.app(scope, receive, send)
+            return
+        method, path = scope["method"], scope["path"]
+        klass = route_class(method, path)
+        if klass is None:
+            await self.app(scope, receive, send)
+            return
+
+        wait = token_buckets.take(client_id(scope), klass)
+        if wait > 0:
+            rejected_requests.inc(klass, "429")
+            retry_after = math.ceil(wait)
+            await _send_error(send, 429, f"Too many requests: retry in {retry_after} s", retry_after)
+            return
+
+        if klass == "read" or (config.register_queue_enabled and method == "POST" and REGISTER_PATHS.match(path)):
+            await self.app(scope, receive, send)
+            return
+
+        if self._write_slots is None:
+            self._write_slots = asyncio.Semaphore(config.write_concurrency)
+        if self._write_slots.locked():
+            try:
+                await asyncio.wait_for(self._write_slots.acquire(), config.write_queue_timeout)
+            except asyncio.TimeoutError:
+                rejected_requests.inc(klass, "503")
+                await _send_error(send, 503, "Server busy: too many writes in progress", 1)
+                return
+        else:
+            await self._write_slots.acquire()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self._write_slots.release()
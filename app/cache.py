@@ -0,0 +1,190 @@
+"""In-process HTTP response cache for the read endpoints.
+
+Serialized bodies are kept in a bounded LRU keyed by the request URL (and
+the media type negotiated with the client, see ``app.encoding``).
+Each entry carries tags naming the rows it was built from (``events``,
+``event:42``, ``user:mario`` ...) and the write paths invalidate exactly those
+tags after committing. Cached responses carry an ETag and Last-Modified and
+answer conditional requests with 304 Not Modified.
+
+The same LRU holds the HTML fragments of the server-rendered pages (one per
+event card, user card, event detail, list page ...), under ``fragment:`` keys
+and with the same tags, so every write path invalidates them as well.
+"""
+
+import hashlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Any, Iterable
+
+from fastapi import Request, Response
+
+from app.config import config
+from app.encoding import JSON, encode, negotiate
+
+
+@dataclass
+class CachedResponse:
+    body: bytes
+    etag: str
+    last_modified: float
+    headers: dict[str, str] = field(default_factory=dict)
+    tags: frozenset[str] = frozenset()
+    media_type: str = JSON
+
+    def not_modified(self, request: Request) -> bool:
+        # If-None-Match takes precedence over If-Modified-Since (RFC 9110)
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            return if_none_match.strip() == "*" or self.etag in [t.strip() for t in if_none_match.split(",")]
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since is not None:
+            try:
+                return int(self.last_modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def to_response(self, request: Request) -> Response:
+        headers = {
+            **self.headers,
+            "ETag": self.etag,
+            "Last-Modified": formatdate(self.last_modified, usegmt=True),
+            # Clients may keep the body but must revalidate it (cheap 304) before reuse
+            "Cache-Control": "no-cache",
+            "Vary": "Accept",
+        }
+        if self.not_modified(request):
+            return Response(status_code=304, headers=headers)
+        return Response(content=self.body, media_type=self.media_type, headers=headers)
+
+
+@dataclass
+class CachedFragment:
+    html: str
+    tags: frozenset[str] = frozenset()
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, CachedResponse | CachedFragment] = OrderedDict()
+        self._keys_by_tag: dict[str, set[str]] = {}
+        # Bumped by every invalidation: a response computed while a write was
+        # committing must not be cached (see store())
+        self.generation: int = 0
+
+    @staticmethod
+    def key(request: Request, media_type: str = JSON) -> str:
+        key = f"{request.url.path}?{request.url.query}"
+        return key if media_type == JSON else f"{key} {media_type}"
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(self, request: Request) -> Response | None:
+        '''
+        \nReturns the cached response for the request (200, or 304 for a matching
+        conditional request), None on a cache miss.
+        '''
+        if not config.cache_enabled:
+            return None
+        key = self.key(request, negotiate(request))
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        return entry.to_response(request)
+
+    def fragment(self, key: str) -> str | None:
+        '''
+        \nReturns the cached HTML fragment stored under ``key``, None on a cache miss.
+        '''
+        if not config.cache_enabled:
+            return None
+        entry = self._entries.get(f"fragment:{key}")
+        if entry is None:
+            return None
+        self._entries.move_to_end(f"fragment:{key}")
+        return entry.html
+
+    def store_fragment(self, key: str, html: str, tags: Iterable[str], generation: int) -> str:
+        '''
+        \nCaches a rendered HTML fragment (see store() for ``tags`` and ``generation``)
+        and returns it.
+        '''
+        if config.cache_enabled and generation == self.generation:
+            self._put(f"fragment:{key}", CachedFragment(html=html, tags=frozenset(tags)))
+        return html
+
+    def store(self,
+              request: Request,
+              content: Any,
+              tags: Iterable[str],
+              generation: int,
+              headers: dict[str, str] | None = None
+             ) -> Response:
+        '''
+        \nSerializes ``content``, caches it under the request URL and returns the response.
+
+        Args:
+            request: the request being answered
+            content: value returned by the handler (``Rows``, models, lists of models ...)
+            tags: rows the content depends on, used by invalidate()
+            generation: value of ``generation`` read before querying the DB
+            headers: extra headers to replay with the cached body (e.g. X-Next-Cursor)
+
+        Return value:
+            JSON (or MessagePack) response with ETag / Last-Modified
+        '''
+        media_type = negotiate(request)
+        body = encode(content, media_type)
+        entry = CachedResponse(
+            body=body,
+            etag=f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"',
+            last_modified=time.time(),
+            headers=dict(headers or {}),
+            tags=frozenset(tags),
+            media_type=media_type,
+        )
+        if config.cache_enabled and generation == self.generation:
+            self._put(self.key(request, media_type), entry)
+        return entry.to_response(request)
+
+    def invalidate(self, *tags: str) -> None:
+        '''
+        \nDrops every entry carrying at least one of ``tags``.
+        '''
+        self.generation += 1
+        for tag in tags:
+            for key in self._keys_by_tag.pop(tag, set()):
+                self._discard(key)
+
+    def clear(self) -> None:
+        self.generation += 1
+        self._entries.clear()
+        self._keys_by_tag.clear()
+
+    def _put(self, key: str, entry: CachedResponse | CachedFragment) -> None:
+        self._discard(key)
+        self._entries[key] = entry
+        for tag in entry.tags:
+            self._keys_by_tag.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._discard(next(iter(self._entries)))
+
+    def _discard(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry.tags:
+            keys = self._keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_tag[tag]
+
+
+response_cache: ResponseCache = ResponseCache(config.cache_max_entries)
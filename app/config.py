@@ -4,6 +4,65 @@ from pathlib import Path
 class _Config:
     def __init__(self):
         self._root_dir: Path = Path("app")
+        # None = <root_dir>/data/database.db (set before importing app.data.db)
+        self._db_file: Path | None = None
+        self._default_page_size: int = 50
+        self._max_page_size: int = 500
+        self._bulk_max_items: int = 10_000
+        self._export_chunk_size: int = 1000
+        self._cache_enabled: bool = True
+        self._cache_max_entries: int = 1024
+
+        # Static asset pipeline (app/static_assets.py)
+        self._static_build_dir: Path | None = None             # None = <root_dir>/static_build
+        self._static_compress_min_size: int = 256              # bytes, smaller files are not precompressed
+        self._static_image_widths: tuple[int, ...] = (480, 960, 1600)
+
+        # Change feed (GET /changes)
+        self._changes_poll_interval: float = 1.0        # s, also how late the commits of other processes show up
+        self._changes_keepalive: float = 15.0           # s between keep-alive comments on an idle stream
+        self._changes_stream_max_seconds: float = 300.0 # streams are closed after this, clients reconnect and resume
+        self._changes_retention: int = 100_000          # deltas kept for resuming clients
+
+        # Group commit of POST /events/{id}/register (app.data.registrations.RegistrationQueue)
+        self._register_queue_enabled: bool = False
+        self._register_batch_size: int = 200         # registrations per commit at most
+        self._register_batch_delay: float = 0.002    # s the writer waits for more registrations before committing
+        self._register_queue_size: int = 10_000      # callers wait beyond this backlog
+
+        # Idempotency-Key of POST /events, /users, /events/{id}/register (app.data.idempotency)
+        self._idempotency_enabled: bool = True
+        self._idempotency_ttl: float = 24 * 3600.0        # s a stored response is replayed for
+        self._idempotency_lock_timeout: float = 60.0      # s after which an unfinished request can run again
+
+        # Admission control (app.admission): token buckets per client and route class, write slots
+        self._rate_limit_enabled: bool = True
+        self._rate_limits: dict[str, tuple[float, int]] = {
+            "read": (100.0, 200),     # (tokens per second, burst)
+            "write": (20.0, 40),
+            "bulk": (1.0, 5),         # bulk creates and delete-all
+        }
+        self._rate_limit_max_clients: int = 10_000         # buckets kept, the least recently used are dropped
+        self._rate_limit_client_header: str | None = None  # e.g. "x-forwarded-for" behind a proxy, None = peer address
+        self._write_concurrency: int = 8                   # write requests running at once (read on the first write)
+        self._write_queue_timeout: float = 2.0             # s a write waits for a slot before 503
+
+        # Request / SQL metrics (GET /metrics)
+        self._metrics_enabled: bool = True
+        self._metrics_n_plus_one_threshold: int = 10   # executions of one statement in a request
+        self._slow_query_ms: float | None = None       # None = slow query log disabled
+
+        # SQLite engine profile, the PRAGMAs are applied on every new connection
+        self._db_echo: bool = False
+        self._db_journal_mode: str = "WAL"
+        self._db_synchronous: str = "NORMAL"
+        self._db_mmap_size: int = 256 * 1024 * 1024   # bytes
+        self._db_cache_size: int = -64 * 1024         # negative = KiB (64 MiB)
+        self._db_busy_timeout: int = 5000             # ms
+        self._db_foreign_keys: bool = True
+        self._db_pool_size: int = 5
+        self._db_max_overflow: int = 10
+        self._db_read_pool_size: int = 10
 
     @property
     def root_dir(self) -> Path:
@@ -13,5 +72,344 @@ class _Config:
     def root_dir(self, value: str | Path) -> None:
         self._root_dir = Path(value)
 
+    @property
+    def db_file(self) -> Path:
+        if self._db_file is None:
+            return self._root_dir / "data/database.db"
+        return self._db_file
+
+    @db_file.setter
+    def db_file(self, value: str | Path | None) -> None:
+        self._db_file = None if value is None else Path(value)
+
+    @property
+    def default_page_size(self) -> int:
+        return self._default_page_size
+
+    @default_page_size.setter
+    def default_page_size(self, value: int) -> None:
+        self._default_page_size = int(value)
+
+    @property
+    def max_page_size(self) -> int:
+        return self._max_page_size
+
+    @max_page_size.setter
+    def max_page_size(self, value: int) -> None:
+        self._max_page_size = int(value)
+
+    @property
+    def bulk_max_items(self) -> int:
+        return self._bulk_max_items
+
+    @bulk_max_items.setter
+    def bulk_max_items(self, value: int) -> None:
+        self._bulk_max_items = int(value)
+
+    @property
+    def export_chunk_size(self) -> int:
+        return self._export_chunk_size
+
+    @export_chunk_size.setter
+    def export_chunk_size(self, value: int) -> None:
+        self._export_chunk_size = int(value)
+
+    @property
+    def cache_enabled(self) -> bool:
+        return self._cache_enabled
+
+    @cache_enabled.setter
+    def cache_enabled(self, value: bool) -> None:
+        self._cache_enabled = bool(value)
+
+    @property
+    def cache_max_entries(self) -> int:
+        return self._cache_max_entries
+
+    @cache_max_entries.setter
+    def cache_max_entries(self, value: int) -> None:
+        self._cache_max_entries = int(value)
+
+    @property
+    def static_build_dir(self) -> Path:
+        if self._static_build_dir is None:
+            return self._root_dir / "static_build"
+        return self._static_build_dir
+
+    @static_build_dir.setter
+    def static_build_dir(self, value: str | Path | None) -> None:
+        self._static_build_dir = None if value is None else Path(value)
+
+    @property
+    def static_compress_min_size(self) -> int:
+        return self._static_compress_min_size
+
+    @static_compress_min_size.setter
+    def static_compress_min_size(self, value: int) -> None:
+        self._static_compress_min_size = int(value)
+
+    @property
+    def static_image_widths(self) -> tuple[int, ...]:
+        return self._static_image_widths
+
+    @static_image_widths.setter
+    def static_image_widths(self, value) -> None:
+        self._static_image_widths = tuple(sorted(int(width) for width in value))
+
+    @property
+    def changes_poll_interval(self) -> float:
+        return self._changes_poll_interval
+
+    @changes_poll_interval.setter
+    def changes_poll_interval(self, value: float) -> None:
+        self._changes_poll_interval = float(value)
+
+    @property
+    def changes_keepalive(self) -> float:
+        return self._changes_keepalive
+
+    @changes_keepalive.setter
+    def changes_keepalive(self, value: float) -> None:
+        self._changes_keepalive = float(value)
+
+    @property
+    def changes_stream_max_seconds(self) -> float:
+        return self._changes_stream_max_seconds
+
+    @changes_stream_max_seconds.setter
+    def changes_stream_max_seconds(self, value: float) -> None:
+        self._changes_stream_max_seconds = float(value)
+
+    @property
+    def changes_retention(self) -> int:
+        return self._changes_retention
+
+    @changes_retention.setter
+    def changes_retention(self, value: int) -> None:
+        self._changes_retention = int(value)
+
+    @property
+    def register_queue_enabled(self) -> bool:
+        return self._register_queue_enabled
+
+    @register_queue_enabled.setter
+    def register_queue_enabled(self, value: bool) -> None:
+        self._register_queue_enabled = bool(value)
+
+    @property
+    def register_batch_size(self) -> int:
+        return self._register_batch_size
+
+    @register_batch_size.setter
+    def register_batch_size(self, value: int) -> None:
+        self._register_batch_size = max(int(value), 1)
+
+    @property
+    def register_batch_delay(self) -> float:
+        return self._register_batch_delay
+
+    @register_batch_delay.setter
+    def register_batch_delay(self, value: float) -> None:
+        self._register_batch_delay = max(float(value), 0.0)
+
+    @property
+    def register_queue_size(self) -> int:
+        return self._register_queue_size
+
+    @register_queue_size.setter
+    def register_queue_size(self, value: int) -> None:
+        self._register_queue_size = int(value)
+
+    @property
+    def idempotency_enabled(self) -> bool:
+        return self._idempotency_enabled
+
+    @idempotency_enabled.setter
+    def idempotency_enabled(self, value: bool) -> None:
+        self._idempotency_enabled = bool(value)
+
+    @property
+    def idempotency_ttl(self) -> float:
+        return self._idempotency_ttl
+
+    @idempotency_ttl.setter
+    def idempotency_ttl(self, value: float) -> None:
+        self._idempotency_ttl = float(value)
+
+    @property
+    def idempotency_lock_timeout(self) -> float:
+        return self._idempotency_lock_timeout
+
+    @idempotency_lock_timeout.setter
+    def idempotency_lock_timeout(self, value: float) -> None:
+        self._idempotency_lock_timeout = float(value)
+
+    @property
+    def rate_limit_enabled(self) -> bool:
+        return self._rate_limit_enabled
+
+    @rate_limit_enabled.setter
+    def rate_limit_enabled(self, value: bool) -> None:
+        self._rate_limit_enabled = bool(value)
+
+    @property
+    def rate_limits(self) -> dict[str, tuple[float, int]]:
+        return self._rate_limits
+
+    @rate_limits.setter
+    def rate_limits(self, value: dict[str, tuple[float, int]]) -> None:
+        # Only the classes given change, the others keep their limits
+        for route_class, (rate, burst) in value.items():
+            if route_class not in self._rate_limits:
+                raise ValueError(f"unknown route class '{route_class}', allowed: {', '.join(self._rate_limits)}")
+            self._rate_limits[route_class] = (max(float(rate), 0.001), max(int(burst), 1))
+
+    @property
+    def rate_limit_max_clients(self) -> int:
+        return self._rate_limit_max_clients
+
+    @rate_limit_max_clients.setter
+    def rate_limit_max_clients(self, value: int) -> None:
+        self._rate_limit_max_clients = max(int(value), 1)
+
+    @property
+    def rate_limit_client_header(self) -> str | None:
+        return self._rate_limit_client_header
+
+    @rate_limit_client_header.setter
+    def rate_limit_client_header(self, value: str | None) -> None:
+        self._rate_limit_client_header = None if value is None else value.lower()
+
+    @property
+    def write_concurrency(self) -> int:
+        return self._write_concurrency
+
+    @write_concurrency.setter
+    def write_concurrency(self, value: int) -> None:
+        self._write_concurrency = max(int(value), 1)
+
+    @property
+    def write_queue_timeout(self) -> float:
+        return self._write_queue_timeout
+
+    @write_queue_timeout.setter
+    def write_queue_timeout(self, value: float) -> None:
+        self._write_queue_timeout = max(float(value), 0.0)
+
+    @property
+    def metrics_enabled(self) -> bool:
+        return self._metrics_enabled
+
+    @metrics_enabled.setter
+    def metrics_enabled(self, value: bool) -> None:
+        self._metrics_enabled = bool(value)
+
+    @property
+    def metrics_n_plus_one_threshold(self) -> int:
+        return self._metrics_n_plus_one_threshold
+
+    @metrics_n_plus_one_threshold.setter
+    def metrics_n_plus_one_threshold(self, value: int) -> None:
+        self._metrics_n_plus_one_threshold = int(value)
+
+    @property
+    def slow_query_ms(self) -> float | None:
+        return self._slow_query_ms
+
+    @slow_query_ms.setter
+    def slow_query_ms(self, value: float | None) -> None:
+        self._slow_query_ms = None if value is None else float(value)
+
+    @property
+    def db_echo(self) -> bool:
+        return self._db_echo
+
+    @db_echo.setter
+    def db_echo(self, value: bool) -> None:
+        self._db_echo = bool(value)
+
+    @property
+    def db_journal_mode(self) -> str:
+        return self._db_journal_mode
+
+    @db_journal_mode.setter
+    def db_journal_mode(self, value: str) -> None:
+        self._db_journal_mode = value.upper()
+
+    @property
+    def db_synchronous(self) -> str:
+        return self._db_synchronous
+
+    @db_synchronous.setter
+    def db_synchronous(self, value: str) -> None:
+        self._db_synchronous = value.upper()
+
+    @property
+    def db_mmap_size(self) -> int:
+        return self._db_mmap_size
+
+    @db_mmap_size.setter
+    def db_mmap_size(self, value: int) -> None:
+        self._db_mmap_size = int(value)
+
+    @property
+    def db_cache_size(self) -> int:
+        return self._db_cache_size
+
+    @db_cache_size.setter
+    def db_cache_size(self, value: int) -> None:
+        self._db_cache_size = int(value)
+
+    @property
+    def db_busy_timeout(self) -> int:
+        return self._db_busy_timeout
+
+    @db_busy_timeout.setter
+    def db_busy_timeout(self, value: int) -> None:
+        self._db_busy_timeout = int(value)
+
+    @property
+    def db_foreign_keys(self) -> bool:
+        return self._db_foreign_keys
+
+    @db_foreign_keys.setter
+    def db_foreign_keys(self, value: bool) -> None:
+        self._db_foreign_keys = bool(value)
+
+    @property
+    def db_pool_size(self) -> int:
+        return self._db_pool_size
+
+    @db_pool_size.setter
+    def db_pool_size(self, value: int) -> None:
+        self._db_pool_size = int(value)
+
+    @property
+    def db_max_overflow(self) -> int:
+        return self._db_max_overflow
+
+    @db_max_overflow.setter
+    def db_max_overflow(self, value: int) -> None:
+        self._db_max_overflow = int(value)
+
+    @property
+    def db_read_pool_size(self) -> int:
+        return self._db_read_pool_size
+
+    @db_read_pool_size.setter
+    def db_read_pool_size(self, value: int) -> None:
+        self._db_read_pool_size = int(value)
+
+    @property
+    def db_pragmas(self) -> dict[str, str | int]:
+        return {
+            "journal_mode": self._db_journal_mode,
+            "synchronous": self._db_synchronous,
+            "mmap_size": self._db_mmap_size,
+            "cache_size": self._db_cache_size,
+            "busy_timeout": self._db_busy_timeout,
+            "foreign_keys": "ON" if self._db_foreign_keys else "OFF",
+        }
+
 
 config: _Config = _Config()
@@ -0,0 +1,259 @@
+"""Change feed: create / update / delete deltas of events, users and registrations.
+
+The write paths call ``record`` with their deltas before committing, so a
+delta lands in ``change_log`` in the same transaction as the change itself:
+it exists if and only if the write does, and since SQLite commits one
+writer at a time the sequence numbers become visible in order, with no gaps
+to wait for. A delta is ``{"seq", "entity", "op", "key", "data"}`` with op:
+
+- ``put``: the row was created or replaced, ``data`` is the whole row
+- ``delete``: the row was deleted (with its registrations, for events and
+  users); ``data`` carries username and event_id for registrations
+- ``clear``: every row of the entity was deleted
+
+Event rows are published when their fields change, not when a registration
+moves their ``registered_count``.
+
+``change_feed`` tails the table: a commit that recorded deltas wakes it up
+(``after_commit`` listener) and it also polls every
+``config.changes_poll_interval`` seconds, which picks up the commits of
+other processes. Recent deltas stay in memory for the subscribers (GET
+/changes); a subscriber resuming from an older sequence number reads them
+from the table, and gets ``ResumeTooOld`` when they have been pruned
+(``config.changes_retention`` rows are kept).
+"""
+
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from typing import Any
+
+from sqlalchemy import Connection, column, event, insert, select, table, text
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.orm import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.config import config
+
+
+logger = logging.getLogger("app.changes")
+
+CHANGE_LOG_DDL = [
+    # AUTOINCREMENT: sequence numbers are never reused, even after pruning the newest rows
+    """CREATE TABLE IF NOT EXISTS change_log (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        created_at REAL NOT NULL,
+        entity TEXT NOT NULL,
+        op TEXT NOT NULL,
+        key TEXT,
+        data TEXT
+    )""",
+]
+
+# Deltas kept in memory for the subscribers
+BUFFER_SIZE = 1000
+# Deltas read from the table per query
+READ_BATCH = 1000
+
+change_log = table("change_log", column("seq"), column("created_at"), column("entity"),
+                   column("op"), column("key"), column("data"))
+
+
+def create_change_log(conn: Connection) -> None:
+    for statement in CHANGE_LOG_DDL:
+        conn.execute(text(statement))
+
+
+class ResumeTooOld(Exception):
+    '''
+    \nThe deltas after the requested sequence number have been pruned.
+    '''
+
+
+def change(entity: str, op: str, key: Any = None, data: dict | None = None) -> dict:
+    '''
+    \nBuilds a delta for ``record``.
+
+    Args:
+        entity: event, user or registration
+        op: put, delete or clear
+        key: primary key of the row (event id, username, "username/event_id")
+        data: JSON-ready row (``model.model_dump(mode="json")``)
+    '''
+    return {
+        "created_at": time.time(),
+        "entity": entity,
+        "op": op,
+        "key": None if key is None else str(key),
+        "data": None if data is None else json.dumps(data, separators=(",", ":")),
+    }
+
+
+async def record(session: AsyncSession, *changes: dict) -> None:
+    '''
+    \nAdds deltas to the current transaction of ``session``: they are published
+    when it commits.
+    '''
+    if changes:
+        await session.exec(insert(change_log), params=list(changes))
+        session.sync_session.info["changes"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session: Session) -> None:
+    if session.info.pop("changes", False):
+        change_feed.notify()
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session: Session) -> None:
+    session.info.pop("changes", None)
+
+
+def _delta(row) -> dict:
+    return {"seq": row.seq, "entity": row.entity, "op": row.op, "key": row.key,
+            "data": None if row.data is None else json.loads(row.data)}
+
+
+class ChangeFeed:
+    def __init__(self):
+        self.last_seq = 0
+        self._buffer: deque[dict] = deque(maxlen=BUFFER_SIZE)
+        self._read_engine: AsyncEngine | None = None
+        self._write_engine: AsyncEngine | None = None
+        self._wakeup: asyncio.Event | None = None
+        # Set (and replaced) when new deltas have been read
+        self._new_changes: asyncio.Event | None = None
+        self._read_lock: asyncio.Lock | None = None
+        self._task: asyncio.Task | None = None
+        # Checked by the tail loop: wait_for may swallow the cancel of stop()
+        self._stopping = False
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def start(self, read_engine: AsyncEngine, write_engine: AsyncEngine) -> None:
+        '''
+        \nStarts tailing the change log (from its current end).
+
+        Args:
+            read_engine: engine the deltas are read with
+            write_engine: engine used to prune the table
+        '''
+        self._read_engine, self._write_engine = read_engine, write_engine
+        self._wakeup = asyncio.Event()
+        self._new_changes = asyncio.Event()
+        self._read_lock = asyncio.Lock()
+        async with read_engine.connect() as conn:
+            self.last_seq = (await conn.execute(text("SELECT coalesce(max(seq), 0) FROM change_log"))).scalar_one()
+        self._buffer.clear()
+        self._stopping = False
+        self._task = asyncio.create_task(self._tail())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._stopping = True
+            self._wakeup.set()
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def notify(self) -> None:
+        '''
+        \nWakes the tail task up (new deltas committed by this process).
+        '''
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _tail(self) -> None:
+        last_prune = time.monotonic()
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), config.changes_poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            if self._stopping:
+                return
+            self._wakeup.clear()
+            try:
+                await self._read_new()
+                if time.monotonic() - last_prune >= 60:
+                    last_prune = time.monotonic()
+                    await self._prune()
+            except Exception:
+                logger.exception("change feed: reading the change log failed")
+
+    async def _read_new(self) -> None:
+        async with self._read_lock:
+            while True:
+                deltas = await self._read(self.last_seq)
+                if not deltas:
+                    return
+                self._buffer.extend(deltas)
+                self.last_seq = deltas[-1]["seq"]
+                self._new_changes.set()
+                self._new_changes = asyncio.Event()
+                if len(deltas) < READ_BATCH:
+                    return
+
+    async def _read(self, after: int) -> list[dict]:
+        async with self._read_engine.connect() as conn:
+            rows = await conn.execute(
+                select(change_log).where(change_log.c.seq > after).order_by(change_log.c.seq).limit(READ_BATCH))
+            return [_delta(row) for row in rows]
+
+    async def _prune(self) -> None:
+        async with self._write_engine.begin() as conn:
+            await conn.execute(text("DELETE FROM change_log WHERE seq <= :last"),
+                               {"last": self.last_seq - config.changes_retention})
+
+    async def changes_after(self, seq: int) -> list[dict]:
+        '''
+        \nThe deltas published after ``seq`` (at most READ_BATCH), oldest first.
+
+        Raises:
+            ResumeTooOld: if some of them have been pruned, or ``seq`` is not
+                          a sequence number of this database
+        '''
+        if seq > self.last_seq:
+            # Maybe handed out by another process that has seen newer deltas.
+            # Shielded here and below: a client closing its stream must not
+            # cancel a query half-way, which tears its pooled connection down
+            await asyncio.shield(self._read_new())
+            if seq > self.last_seq:
+                raise ResumeTooOld(seq)
+        if seq == self.last_seq:
+            return []
+        if self._buffer and self._buffer[0]["seq"] <= seq + 1:
+            return [delta for delta in self._buffer if delta["seq"] > seq][:READ_BATCH]
+
+        # Older than the buffer: from the table. Sequence numbers have no holes
+        # (AUTOINCREMENT rolls back with the transaction), so a hole means pruned deltas
+        deltas = await asyncio.shield(self._read(seq))
+        if not deltas or deltas[0]["seq"] != seq + 1:
+            raise ResumeTooOld(seq)
+        return deltas
+
+    async def wait(self, seq: int, timeout: float) -> bool:
+        '''
+        \nWaits until deltas after ``seq`` are available.
+
+        Return value:
+            False if ``timeout`` seconds passed without new deltas
+        '''
+        deadline = time.monotonic() + timeout
+        while self.last_seq <= seq:
+            try:
+                await asyncio.wait_for(self._new_changes.wait(), deadline - time.monotonic())
+            except asyncio.TimeoutError:
+                return False
+        return True
+
+
+change_feed: ChangeFeed = ChangeFeed()
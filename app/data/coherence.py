@@ -0,0 +1,133 @@
+"""Coherence of the in-process caches between worker processes.
+
+Each worker keeps its own ``response_cache``; its write paths invalidate it
+directly, but the writes of the other workers only show up in the database.
+``cache_sync`` watches the database through a private SQLite connection:
+``PRAGMA data_version`` changes whenever another connection (of any process)
+commits, and only reads the WAL index, so checking it at the start of every
+request costs a few microseconds. When it moved, the deltas recorded in
+``change_log`` since the last check (see ``app.data.changes``) are mapped to
+the cache tags the write paths invalidate, and the change feed is woken up
+so its subscribers see the other workers' writes right away.
+
+A request therefore never gets a cached response older than the writes
+committed before it arrived, in whichever worker they ran. Writes made
+behind the app's back (the ``sqlite3`` shell, ``python -m app.data.seed``)
+record no delta and are not seen by the running workers.
+"""
+
+import json
+import logging
+import sqlite3
+from pathlib import Path
+
+from app.cache import response_cache
+from app.data.changes import READ_BATCH, change_feed
+
+
+logger = logging.getLogger("app.coherence")
+
+
+def cache_tags(delta: dict) -> list[str]:
+    '''
+    \nTags of the cached responses made stale by a delta of the change log
+    (the ones the write path that recorded it invalidates).
+    '''
+    entity, op, key = delta["entity"], delta["op"], delta["key"]
+    if entity == "event":
+        return ["events", "event:*"] if op == "clear" else ["events", f"event:{key}"]
+    if entity == "user":
+        if op == "put":
+            return ["users", f"user:{key}"]
+        # Deleting users frees seats of their events
+        return ["users", "user:*" if op == "clear" else f"user:{key}", "events", "event:*"]
+    if entity == "registration":
+        data = delta["data"] or {}
+        return ["users", f"user:{data.get('username')}", "events", f"event:{data.get('event_id')}"]
+    return []
+
+
+class CacheSync:
+    def __init__(self):
+        self._conn: sqlite3.Connection | None = None
+        self._data_version: int | None = None
+        # Last delta applied to the cache
+        self._seq = 0
+
+    @property
+    def running(self) -> bool:
+        return self._conn is not None
+
+    def start(self, db_file: Path, seq: int) -> None:
+        '''
+        \nOpens the connection watching ``db_file`` (once per process, after
+        the workers have been forked).
+
+        Args:
+            db_file: the SQLite database
+            seq: sequence number of the change log the cache is current with
+        '''
+        self._conn = sqlite3.connect(db_file, check_same_thread=False)
+        self._conn.execute("PRAGMA query_only = ON")
+        self._data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        self._seq = seq
+
+    def stop(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def check(self) -> None:
+        '''
+        \nInvalidates the cached responses made stale by the deltas committed
+        since the previous check. Runs on the event loop: the query only
+        happens after a commit and reads a range of the change log's primary key.
+        '''
+        if self._conn is None:
+            return
+        try:
+            data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            if data_version == self._data_version:
+                return
+            self._data_version = data_version
+            rows = self._conn.execute(
+                "SELECT seq, entity, op, key, data FROM change_log WHERE seq > ? ORDER BY seq LIMIT ?",
+                (self._seq, READ_BATCH + 1)).fetchall()
+        except sqlite3.Error:
+            logger.exception("cache sync: reading the change log failed, dropping the cache")
+            response_cache.clear()
+            return
+        if not rows:
+            # A write without deltas (pruning of the change log, migrations)
+            return
+
+        self._seq = rows[-1][0]
+        if len(rows) > READ_BATCH:
+            # A large batch of writes: cheaper to start over
+            response_cache.clear()
+            self._seq = self._conn.execute("SELECT coalesce(max(seq), 0) FROM change_log").fetchone()[0]
+        else:
+            tags = set()
+            for seq, entity, op, key, data in rows:
+                tags.update(cache_tags({"entity": entity, "op": op, "key": key,
+                                        "data": None if data is None else json.loads(data)}))
+            response_cache.invalidate(*tags)
+        change_feed.notify()
+
+
+cache_sync: CacheSync = CacheSync()
+
+
+class CacheSyncMiddleware:
+    '''
+    \nASGI middleware bringing the cache up to date with the writes of the
+    other workers before each HTTP request.
+    '''
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            cache_sync.check()
+        await self.app(scope, receive, send)
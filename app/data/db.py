@@ -1,8 +1,11 @@
-from sqlmodel import create_engine, SQLModel, Session, select
-from typing import Annotated
+from sqlmodel import create_engine, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from typing import Annotated, AsyncIterator
 from fastapi import Depends
 import os
-from faker import Faker
 from app.config import config
 
 # TODO: remember to import all the DB models here
@@ -10,53 +13,111 @@ from app.config import config
 from app.models.registration import Registration  # NOQA
 from app.models.event import Event, EventForm
 from app.models.user import User
+from app.data.migrations import migrate
+from app.data.seed import generate
+from app.metrics import instrument_engine
 
 
-sqlite_file_name = config.root_dir / "data/database.db" # data/database.db
+sqlite_file_name = config.db_file # data/database.db unless configured otherwise
 sqlite_url = f"sqlite:///{sqlite_file_name}"
 connect_args = {"check_same_thread": False}
-engine = create_engine(sqlite_url, connect_args=connect_args, echo=True)
 
 
-def init_database() -> None:
-    ds_exists = os.path.isfile(sqlite_file_name)
-    SQLModel.metadata.create_all(engine)
-    if not ds_exists:
-        f = Faker("it_IT")
-        with Session(engine) as session:
+def apply_pragmas(dbapi_connection, query_only: bool = False) -> None:
+    '''
+    \nApplies the engine profile of the config (WAL, synchronous, mmap, cache,
+    busy timeout, foreign keys) to a new DB-API connection.
 
-            # Fake users table
-            users = [
-                User(username=f.user_name(),
-                     name = f.name(),
-                     email=f.email()
-                    )
-                for _ in range(10)
-            ]
-            # Commit users table to database
-            session.add_all(users)
-            session.commit()
+    Args:
+        dbapi_connection: raw sqlite3 / aiosqlite connection
+        query_only: if True the connection refuses any write (read pool)
+    '''
+    pragmas = dict(config.db_pragmas)
+    if query_only:
+        pragmas["query_only"] = "ON"
 
+    cursor = dbapi_connection.cursor()
+    for name, value in pragmas.items():
+        cursor.execute(f"PRAGMA {name} = {value}")
+    cursor.close()
 
-            # Fake events table
-            events = [
-                Event(title=f.catch_phrase(),
-                      description=f.text(), 
-                      date=f.date_time_this_year(), 
-                      location=f.city()
-                     )
-                for _ in range(10)
-            ]
-            # Commit events table to database
-            session.add_all(events)
-            session.commit()
 
+# Synchronous engine: only used at startup (schema creation and seeding)
+engine = create_engine(sqlite_url, connect_args=connect_args, echo=config.db_echo)
+event.listen(engine, "connect", lambda conn, _: apply_pragmas(conn))
 
+# Asynchronous engines used by the request handlers: queries run on the aiosqlite
+# worker thread, so a slow statement no longer blocks the event loop.
+# Writes go through a small pool (SQLite has a single writer anyway), while
+# read-only requests get their own, larger pool of query_only connections that
+# in WAL mode never wait for the writer.
+async_sqlite_url = f"sqlite+aiosqlite:///{sqlite_file_name}"
+async_engine = create_async_engine(
+    async_sqlite_url,
+    echo=config.db_echo,
+    poolclass=AsyncAdaptedQueuePool,
+    pool_size=config.db_pool_size,
+    max_overflow=config.db_max_overflow,
+)
+event.listen(async_engine.sync_engine, "connect", lambda conn, _: apply_pragmas(conn))
 
+async_read_engine = create_async_engine(
+    async_sqlite_url,
+    echo=config.db_echo,
+    poolclass=AsyncAdaptedQueuePool,
+    pool_size=config.db_read_pool_size,
+    max_overflow=config.db_max_overflow,
+)
+event.listen(async_read_engine.sync_engine, "connect", lambda conn, _: apply_pragmas(conn, query_only=True))
 
-def get_session():
-    with Session(engine) as session:
-        yield session   
+# Statement counts and timings per request, slow query log (see app.metrics)
+instrument_engine(async_engine.sync_engine, "write")
+instrument_engine(async_read_engine.sync_engine, "read")
 
 
-SessionDep = Annotated[Session, Depends(get_session)]
+
+def _discard_pools_after_fork() -> None:
+    # Worker processes forked from a parent that already imported (or used) the
+    # engines, e.g. gunicorn --preload: each child starts with empty pools and
+    # never touches the connections it inherited, which stay the parent's
+    for pooled_engine in (engine, async_engine.sync_engine, async_read_engine.sync_engine):
+        pooled_engine.dispose(close=False)
+
+
+os.register_at_fork(after_in_child=_discard_pools_after_fork)
+
+# expire_on_commit=False: attributes stay readable after commit without a lazy (blocking) reload
+async_session_maker = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+async_read_session_maker = async_sessionmaker(async_read_engine, class_=AsyncSession, expire_on_commit=False)
+
+
+def _is_empty() -> bool:
+    with engine.connect() as conn:
+        return all(conn.execute(select(model).limit(1)).first() is None for model in (Event, User))
+
+
+def init_database(seed_fake_data: bool = True) -> None:
+    # Schema DDL only runs when the database is behind the latest migration
+    applied = migrate(engine)
+
+    # 1 in applied: this process created the schema (not a concurrent worker,
+    # which may also have created the file first), on a new database rather
+    # than one from before the versioning
+    if 1 in applied and seed_fake_data and _is_empty():
+        # A few fake users and events to play with
+        generate(engine, events=10, users=10, registrations=0, workers=1, defer_indexes=False)
+
+
+async def get_session() -> AsyncIterator[AsyncSession]:
+    async with async_session_maker() as session:
+        yield session
+
+
+async def get_read_session() -> AsyncIterator[AsyncSession]:
+    async with async_read_session_maker() as session:
+        yield session
+
+
+SessionDep = Annotated[AsyncSession, Depends(get_session)]
+# Session for read-only handlers (GET): served by the query_only read pool
+ReadSessionDep = Annotated[AsyncSession, Depends(get_read_session)]
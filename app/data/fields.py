@@ -0,0 +1,52 @@
+"""Sparse fieldsets: the ``fields`` query parameter of the list and detail endpoints.
+
+``?fields=title,date,location`` becomes ``SELECT title, date, location FROM
+event ...``: the other columns are neither read from the table nor sent.
+Columns the endpoint needs for itself (the sort keys the next-page cursor
+is built from) are added at the end of the SELECT and left out of the
+response (``Rows.keys``).
+"""
+
+from typing import Sequence
+
+from fastapi import HTTPException
+from sqlalchemy import Select, select
+
+from app.encoding import table_columns
+
+
+FIELDS_DESCRIPTION = "Comma separated fields to return (default: all of them)"
+
+
+def select_fields(model, fields: str | None, required: Sequence = ()) -> tuple[Select, tuple[str, ...]]:
+    '''
+    \nResolves a ``fields`` query parameter into the SELECT of its columns
+    (a Core SELECT: the session returns rows even for a single column).
+
+    Args:
+        model: table model of the endpoint
+        fields: requested fields, None for all of them
+        required: columns the endpoint reads besides the requested ones (sort keys)
+
+    Return value:
+        (SELECT to add the filters to, names of the fields to return: the
+        first columns of the SELECT, in the order of the model)
+
+    Raises:
+        HTTPException 400 if a field is unknown or none is given
+    '''
+    columns = table_columns(model)
+    if fields is None:
+        selected = columns
+    else:
+        names = {name.strip() for name in fields.split(",") if name.strip()}
+        allowed = [col.key for col in columns]
+        if not names or not names.issubset(allowed):
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid fields '{fields}', allowed: {', '.join(allowed)}",
+            )
+        selected = [col for col in columns if col.key in names]
+
+    keys = tuple(col.key for col in selected)
+    return select(*selected, *(col for col in required if col.key not in keys)), keys
@@ -0,0 +1,138 @@
+"""Full-text search over events (SQLite FTS5).
+
+``event_fts`` is an external-content FTS5 index over ``event.title``,
+``description`` and ``location``: it stores only the inverted index and
+reads the text back from the ``event`` table. Triggers keep it in sync on
+every INSERT / UPDATE / DELETE of ``event``, whatever the write path.
+
+Rebuild the index of an existing database with:
+
+    python -m app.data.fts rebuild
+"""
+
+import argparse
+import re
+
+from sqlalchemy import Connection, Select, column, literal_column, select, table, text
+
+from app.models.event import Event
+from app.encoding import table_columns
+
+
+FTS_DDL = [
+    # remove_diacritics: "citta" matches "città"; prefix: index 3-char prefixes for "mil*"-style queries
+    """CREATE VIRTUAL TABLE IF NOT EXISTS event_fts USING fts5(
+        title, description, location,
+        content='event', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='3'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS event_fts_ai AFTER INSERT ON event BEGIN
+        INSERT INTO event_fts(rowid, title, description, location)
+        VALUES (new.id, new.title, new.description, new.location);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS event_fts_ad AFTER DELETE ON event BEGIN
+        INSERT INTO event_fts(event_fts, rowid, title, description, location)
+        VALUES ('delete', old.id, old.title, old.description, old.location);
+    END""",
+    # Only the indexed columns: seat counter updates must not re-index the event
+    # (dropped first to replace the version that fired on any column)
+    "DROP TRIGGER IF EXISTS event_fts_au",
+    """CREATE TRIGGER IF NOT EXISTS event_fts_au AFTER UPDATE OF title, description, location ON event BEGIN
+        INSERT INTO event_fts(event_fts, rowid, title, description, location)
+        VALUES ('delete', old.id, old.title, old.description, old.location);
+        INSERT INTO event_fts(rowid, title, description, location)
+        VALUES (new.id, new.title, new.description, new.location);
+    END""",
+]
+
+# Shortest word matched as a prefix by match_query()
+PREFIX_MIN_LENGTH = 3
+
+# Lightweight handle on the virtual table for query building
+event_fts = table("event_fts", column("rowid"), column("rank"))
+
+
+def create_fts(conn: Connection) -> None:
+    '''
+    \nCreates the FTS index and its triggers if missing. When the index is new
+    and ``event`` already has rows, it is filled from the table.
+    '''
+    exists = conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'event_fts'")
+    ).first()
+    for statement in FTS_DDL:
+        conn.execute(text(statement))
+    if not exists:
+        rebuild_fts(conn)
+
+
+def rebuild_fts(conn: Connection) -> None:
+    '''
+    \nRebuilds the whole FTS index from the ``event`` table.
+    '''
+    conn.execute(text("INSERT INTO event_fts(event_fts) VALUES ('rebuild')"))
+
+
+def match_query(q: str) -> str | None:
+    '''
+    \nTurns free text into an FTS5 query: every word must match. The last word
+    is matched as a prefix (search-as-you-type) when it has at least
+    PREFIX_MIN_LENGTH characters: shorter prefixes match so many terms that
+    ranking them would cost a scan of a large part of the index.
+
+    Args:
+        q: text typed by the user
+
+    Return value:
+        FTS5 MATCH expression (e.g. '"jazz" "mil"*'), None if q has no words
+    '''
+    words = re.findall(r"\w+", q)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    if len(words[-1]) >= PREFIX_MIN_LENGTH:
+        terms[-1] += "*"
+    return " ".join(terms)
+
+
+def search_statement(match: str, limit: int, offset: int, events: Select | None = None):
+    '''
+    \nBuilds the ranked search query.
+
+    The MATCH, ORDER BY rank and LIMIT run in a subquery on the FTS table,
+    which lets FTS5 pick the best rows without materializing the events,
+    then only the rows of the page are joined back to ``event`` (``events``,
+    the SELECT of the requested columns; all of them by default).
+    '''
+    hits = (
+        select(event_fts.c.rowid, event_fts.c.rank)
+        .where(literal_column("event_fts").op("MATCH")(match))
+        .order_by(event_fts.c.rank, event_fts.c.rowid)
+        .limit(limit)
+        .offset(offset)
+        .subquery("hits")
+    )
+    return (
+        (events if events is not None else select(*table_columns(Event)))
+        .join(hits, hits.c.rowid == Event.id)
+        .order_by(hits.c.rank, hits.c.rowid)
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Manage the full-text index of events")
+    parser.add_argument("command", choices=["rebuild"])
+    args = parser.parse_args()
+
+    from app.data.db import engine
+
+    if args.command == "rebuild":
+        with engine.begin() as conn:
+            create_fts(conn)
+            rebuild_fts(conn)
+        print("event_fts rebuilt")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+"""Idempotency keys for the POST endpoints creating rows.
+
+A client that times out and retries ``POST /events``, ``POST /users`` or
+``POST /events/{id}/register`` with the ``Idempotency-Key`` header of the
+first attempt gets the response of that attempt back, replayed from the
+``idempotency_key`` table: the handler does not run again, so the retry
+cannot create a second event with a new id. Keys belong to the client that
+sent them (``app.admission.client_id``: peer address, or the proxy header of
+``config.rate_limit_client_header``): another client sending the same key
+runs its own request and never sees the stored response.
+``IdempotencyMiddleware``:
+
+1. looks the key up (client, method, path and key) on a read connection: a
+   stored response is replayed with ``Idempotent-Replayed: true``, or refused
+   with 422 if the body of the request differs from the one of the first
+   attempt
+2. otherwise reserves the key with a row without response (one upsert), so a
+   retry arriving while the first attempt still runs, in any worker process,
+   gets 409 Conflict with Retry-After instead of running it a second time
+3. runs the request and stores its response in the reserved row. 3xx, 5xx,
+   408 and 429 responses are not kept (the reservation is dropped): the
+   retry runs the request again
+
+Responses are replayed for ``config.idempotency_ttl`` seconds. Expired rows
+are deleted at most once a minute, through ``ix_idempotency_key_created_at``;
+a reservation older than ``config.idempotency_lock_timeout`` (the worker
+died while running the request) is taken over by the next retry.
+
+Cost: a POST with a key runs two short write transactions besides the one
+of its handler (the reservation and the stored response), each waiting for
+SQLite's write lock. The reservation can't join the handler's transaction:
+the other workers must see it while the handler runs (in process, POST
+/users goes from about 7 to 10.5 ms with a key). POSTs without the header
+don't touch the table.
+"""
+
+import hashlib
+import json
+import logging
+import re
+import time
+from dataclasses import dataclass
+
+from sqlalchemy import Connection, text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.admission import client_id
+from app.config import config
+
+
+logger = logging.getLogger("app.idempotency")
+
+IDEMPOTENCY_DDL = [
+    """CREATE TABLE IF NOT EXISTS idempotency_key (
+        client TEXT NOT NULL,
+        key TEXT NOT NULL,
+        route TEXT NOT NULL,
+        fingerprint BLOB NOT NULL,
+        created_at REAL NOT NULL,
+        status INTEGER,
+        headers TEXT,
+        body BLOB,
+        PRIMARY KEY (client, key, route)
+    ) WITHOUT ROWID""",
+    "CREATE INDEX IF NOT EXISTS ix_idempotency_key_created_at ON idempotency_key (created_at)",
+]
+
+# POST paths honouring the header (with or without the trailing slash)
+IDEMPOTENT_PATHS = re.compile(r"^/(events|users|events/\d+/register)/?$")
+MAX_KEY_LENGTH = 255
+# Seconds between two deletions of the expired keys
+PURGE_INTERVAL = 60
+
+
+def create_idempotency_keys(conn: Connection) -> None:
+    for statement in IDEMPOTENCY_DDL:
+        conn.execute(text(statement))
+
+
+@dataclass
+class StoredResponse:
+    fingerprint: bytes
+    # None while the first request is running
+    status: int | None
+    headers: list[list[str]] | None
+    body: bytes | None
+
+
+def _storable(status: int) -> bool:
+    # Redirects, server errors, timeouts and rate limiting: the retry should run again
+    return 200 <= status < 300 or (400 <= status < 500 and status not in (408, 429))
+
+
+class IdempotencyStore:
+    def __init__(self):
+        self._read_engine: AsyncEngine | None = None
+        self._write_engine: AsyncEngine | None = None
+        self._last_purge = 0.0
+
+    def start(self, read_engine: AsyncEngine, write_engine: AsyncEngine) -> None:
+        self._read_engine, self._write_engine = read_engine, write_engine
+        self._last_purge = time.monotonic()
+
+    @property
+    def running(self) -> bool:
+        return self._write_engine is not None
+
+    async def lookup(self, client: str, key: str, route: str) -> StoredResponse | None:
+        '''
+        \nThe response stored (or reserved) for a key, None if there is none or
+        it has expired.
+        '''
+        async with self._read_engine.connect() as conn:
+            row = (await conn.execute(
+                text("SELECT fingerprint, status, headers, body FROM idempotency_key "
+                     "WHERE client = :client AND key = :key AND route = :route AND created_at >= :expired "
+                     "AND (status IS NOT NULL OR created_at >= :abandoned)"),
+                self._params(client, key, route),
+            )).first()
+        return None if row is None else self._stored(row)
+
+    async def reserve(self, client: str, key: str, route: str, fingerprint: bytes) -> StoredResponse | None:
+        '''
+        \nReserves a key for the request about to run.
+
+        Return value:
+            None if the key is now reserved for this request, otherwise the
+            row that holds it (a response stored meanwhile, or a reservation
+            of a request still running)
+        '''
+        params = {**self._params(client, key, route), "fingerprint": fingerprint, "now": time.time()}
+        async with self._write_engine.begin() as conn:
+            # Starts with a write: the transaction takes the write lock at once
+            reserved = (await conn.execute(
+                text("INSERT INTO idempotency_key (client, key, route, fingerprint, created_at) "
+                     "VALUES (:client, :key, :route, :fingerprint, :now) "
+                     "ON CONFLICT (client, key, route) DO UPDATE SET fingerprint = excluded.fingerprint, "
+                     "created_at = excluded.created_at, status = NULL, headers = NULL, body = NULL "
+                     "WHERE created_at < :expired OR (status IS NULL AND created_at < :abandoned) "
+                     "RETURNING key"),
+                params,
+            )).first()
+            if reserved is not None:
+                return None
+            row = (await conn.execute(
+                text("SELECT fingerprint, status, headers, body FROM idempotency_key "
+                     "WHERE client = :client AND key = :key AND route = :route"),
+                params,
+            )).first()
+        return self._stored(row)
+
+    async def complete(self, client: str, key: str, route: str,
+                       status: int, headers: list[list[str]], body: bytes) -> None:
+        '''
+        \nStores the response of a reserved key, or drops the reservation if
+        the response must not be replayed.
+        '''
+        async with self._write_engine.begin() as conn:
+            if _storable(status):
+                await conn.execute(
+                    text("UPDATE idempotency_key SET status = :status, headers = :headers, body = :body "
+                         "WHERE client = :client AND key = :key AND route = :route"),
+                    {"client": client, "key": key, "route": route, "status": status, "body": body,
+                     "headers": json.dumps(headers, separators=(",", ":"))},
+                )
+            else:
+                await self._release(conn, client, key, route)
+            if time.monotonic() - self._last_purge >= PURGE_INTERVAL:
+                self._last_purge = time.monotonic()
+                await conn.execute(text("DELETE FROM idempotency_key WHERE created_at < :expired"),
+                                   {"expired": time.time() - config.idempotency_ttl})
+
+    async def release(self, client: str, key: str, route: str) -> None:
+        async with self._write_engine.begin() as conn:
+            await self._release(conn, client, key, route)
+
+    @staticmethod
+    async def _release(conn, client: str, key: str, route: str) -> None:
+        await conn.execute(text("DELETE FROM idempotency_key "
+                                "WHERE client = :client AND key = :key AND route = :route AND status IS NULL"),
+                           {"client": client, "key": key, "route": route})
+
+    @staticmethod
+    def _params(client: str, key: str, route: str) -> dict:
+        now = time.time()
+        return {"client": client, "key": key, "route": route, "expired": now - config.idempotency_ttl,
+                "abandoned": now - config.idempotency_lock_timeout}
+
+    @staticmethod
+    def _stored(row) -> StoredResponse:
+        return StoredResponse(fingerprint=row.fingerprint, status=row.status,
+                              headers=None if row.headers is None else json.loads(row.headers), body=row.body)
+
+
+idempotency_store: IdempotencyStore = IdempotencyStore()
+
+
+async def _send_response(send, status: int, headers: list, body: bytes) -> None:
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _send_error(send, status: int, detail: str, headers: list | None = None) -> None:
+    body = json.dumps({"detail": detail}).encode()
+    await _send_response(send, status, [
+        (b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()), *(headers or []),
+    ], body)
+
+
+class IdempotencyMiddleware:
+    '''
+    \nASGI middleware replaying the responses of the POST requests sent again
+    with the same Idempotency-Key (see the module docstring).
+    '''
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] != "http" or scope["method"] != "POST" or not config.idempotency_enabled
+                or not idempotency_store.running or not IDEMPOTENT_PATHS.match(scope["path"])):
+            await self.app(scope, receive, send)
+            return
+        key = next((value for name, value in scope["headers"] if name == b"idempotency-key"), None)
+        if key is None:
+            await self.app(scope, receive, send)
+            return
+        key = key.decode("latin-1").strip()
+        if not 1 <= len(key) <= MAX_KEY_LENGTH:
+            await _send_error(send, 400, f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters")
+            return
+
+        # The body is needed for the fingerprint: read it all, then hand it to the app
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] != "http.request":
+                return
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                break
+        body = b"".join(chunks)
+        client = client_id(scope)
+        route = f"POST {scope['path'].rstrip('/')}"
+        fingerprint = hashlib.blake2b(body, digest_size=16).digest()
+
+        stored = await idempotency_store.lookup(client, key, route)
+        if stored is None:
+            stored = await idempotency_store.reserve(client, key, route, fingerprint)
+        if stored is not None:
+            await self._replay(send, stored, fingerprint)
+            return
+
+        body_sent = False
+
+        async def receive_body():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        status, headers, response_body = 500, [], []
+
+        async def send_wrapper(message):
+            nonlocal status, headers
+            if message["type"] == "http.response.start":
+                status, headers = message["status"], message.get("headers", [])
+            elif message["type"] == "http.response.body":
+                response_body.append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive_body, send_wrapper)
+        except BaseException:
+            await idempotency_store.release(client, key, route)
+            raise
+        await idempotency_store.complete(
+            client, key, route, status,
+            [[name.decode("latin-1"), value.decode("latin-1")] for name, value in headers],
+            b"".join(response_body),
+        )
+
+    @staticmethod
+    async def _replay(send, stored: StoredResponse, fingerprint: bytes) -> None:
+        if stored.fingerprint != fingerprint:
+            await _send_error(send, 422, "Idempotency-Key already used for a different request")
+        elif stored.status is None:
+            await _send_error(send, 409, "A request with this Idempotency-Key is still running",
+                              [(b"retry-after", b"1")])
+        else:
+            headers = [(name.encode("latin-1"), value.encode("latin-1")) for name, value in stored.headers]
+            await _send_response(send, stored.status, [*headers, (b"idempotent-replayed", b"true")], stored.body)
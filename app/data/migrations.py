@@ -0,0 +1,181 @@
+"""Versioned schema migrations.
+
+The ``schema_version`` table records the migrations applied to a database.
+At startup ``migrate`` reads the current version with a single query and, when
+it is already ``LATEST_VERSION``, returns without running any DDL. Otherwise
+the pending migrations run in order inside one ``BEGIN IMMEDIATE``
+transaction: a failed migration leaves the schema untouched, and concurrent
+workers starting together wait on the write lock, re-read the version and
+find nothing left to do.
+
+Versions 1-5 bring databases created before the versioning (at any point of
+their history) to the current schema, so they are written to be idempotent.
+New schema changes are new functions appended to ``MIGRATIONS``; never edit
+one that has already shipped.
+
+Show the version of a database with:
+
+    python -m app.data.migrations
+"""
+
+import logging
+from typing import Callable
+
+from sqlalchemy import Connection, Engine, text
+from sqlalchemy.schema import CreateColumn, CreateIndex, CreateTable
+from sqlmodel import SQLModel
+
+from app.config import config
+from app.data.changes import create_change_log
+from app.data.fts import create_fts
+from app.data.idempotency import create_idempotency_keys
+from app.data.registrations import create_registration_counter
+from app.data.stats import create_stats
+from app.models.registration import Registration
+
+
+logger = logging.getLogger("app.migrations")
+
+SCHEMA_VERSION_DDL = """CREATE TABLE IF NOT EXISTS schema_version (
+    version INTEGER PRIMARY KEY,
+    description TEXT NOT NULL,
+    applied_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+)"""
+
+
+def _create_tables(conn: Connection) -> None:
+    # Whole current schema on a new database, missing tables on an old one
+    SQLModel.metadata.create_all(conn)
+
+
+def _add_missing_columns(conn: Connection) -> None:
+    # Columns declared after the tables were created (event.capacity,
+    # event.registered_count): create_all never alters a table
+    added = set()
+    for table in SQLModel.metadata.sorted_tables:
+        existing = {row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({table.name})")}
+        for column in table.columns:
+            if column.name not in existing:
+                ddl = CreateColumn(column).compile(dialect=conn.dialect)
+                conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {ddl}")
+                added.add(f"{table.name}.{column.name}")
+    create_registration_counter(conn, recount="event.registered_count" in added)
+
+
+def _registration_cascade(conn: Connection) -> None:
+    # Rebuilds the registration table of databases created before its foreign
+    # keys were declared ON DELETE CASCADE (SQLite cannot alter a foreign key in place).
+    # Columns of foreign_key_list: id, seq, table, from, to, on_update, on_delete, match
+    foreign_keys = conn.exec_driver_sql("PRAGMA foreign_key_list(registration)").all()
+    if all(fk[6] == "CASCADE" for fk in foreign_keys):
+        return
+
+    table = Registration.__table__
+    for index in table.indexes:
+        conn.exec_driver_sql(f"DROP INDEX IF EXISTS {index.name}")
+    conn.exec_driver_sql("ALTER TABLE registration RENAME TO registration_old")
+    conn.execute(CreateTable(table))
+    for index in table.indexes:
+        conn.execute(CreateIndex(index))
+    conn.exec_driver_sql(
+        "INSERT INTO registration (username, event_id) SELECT username, event_id FROM registration_old")
+    conn.exec_driver_sql("DROP TABLE registration_old")
+    # The rename took the triggers of the table along: put the counter back
+    create_registration_counter(conn)
+
+
+def _create_indexes(conn: Connection) -> None:
+    # create_all skips the indexes of tables that already exist
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+
+def _statistics(conn: Connection) -> None:
+    # ix_event_registered_count, then the summary tables and the calendar
+    # counts (filled from the current rows)
+    _create_indexes(conn)
+    create_stats(conn)
+
+
+MIGRATIONS: list[tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "tables", _create_tables),
+    (2, "event capacity and registration counter", _add_missing_columns),
+    (3, "registration foreign keys ON DELETE CASCADE", _registration_cascade),
+    (4, "secondary indexes", _create_indexes),
+    (5, "event_fts full-text index", create_fts),
+    (6, "change_log of the change feed", create_change_log),
+    (7, "statistics summary tables", _statistics),
+    (8, "idempotency_key of the POST endpoints", create_idempotency_keys),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_version(conn: Connection) -> int:
+    '''
+    \nVersion of the schema of the database, 0 if it is not versioned (new
+    database or created before the versioning).
+    '''
+    exists = conn.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'schema_version'").first()
+    if not exists:
+        return 0
+    return conn.exec_driver_sql("SELECT coalesce(max(version), 0) FROM schema_version").scalar_one()
+
+
+def migrate(engine: Engine) -> list[int]:
+    '''
+    \nApplies the pending migrations.
+
+    Args:
+        engine: synchronous engine of the database
+
+    Return value:
+        versions applied (empty if the schema was already current)
+    '''
+    # Fast path: one read, no DDL and no write lock
+    with engine.connect() as conn:
+        if schema_version(conn) == LATEST_VERSION:
+            return []
+
+    applied = []
+    with engine.connect() as conn:
+        # Foreign keys off for the table rebuilds (the PRAGMA is ignored inside a transaction)
+        conn.exec_driver_sql("PRAGMA foreign_keys = OFF")
+        try:
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+            conn.exec_driver_sql(SCHEMA_VERSION_DDL)
+            # Read again under the write lock: another worker may have just migrated
+            current = schema_version(conn)
+            for version, description, migration in MIGRATIONS:
+                if version <= current:
+                    continue
+                migration(conn)
+                conn.execute(text("INSERT INTO schema_version (version, description) VALUES (:v, :d)"),
+                             {"v": version, "d": description})
+                applied.append(version)
+            violations = conn.exec_driver_sql("PRAGMA foreign_key_check").all()
+            if violations:
+                raise RuntimeError(f"foreign key violations after migrating: {violations[:10]}")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            conn.exec_driver_sql(f"PRAGMA foreign_keys = {config.db_pragmas['foreign_keys']}")
+    if applied:
+        logger.info("schema migrated to version %d (applied %s)", LATEST_VERSION, applied)
+    return applied
+
+
+def main() -> None:
+    from app.data.db import engine
+
+    with engine.connect() as conn:
+        version = schema_version(conn)
+    print(f"schema version {version} (latest {LATEST_VERSION})")
+
+
+if __name__ == "__main__":
+    main()
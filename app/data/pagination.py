@@ -0,0 +1,132 @@
+"""Keyset (cursor) pagination shared by the list endpoints.
+
+Every page is fetched with ``WHERE (sort_key, pk) > (:last_sort_key, :last_pk)
+ORDER BY sort_key, pk LIMIT :limit + 1`` so, as long as an index covers the
+sort columns, the cost of a page does not depend on how deep into the table
+the client is (no OFFSET scans).
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Any, Sequence
+
+from fastapi import HTTPException, Request, Response
+from sqlalchemy import DateTime, tuple_
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    '''
+    \nEncodes the sort key of the last row of a page into an opaque cursor.
+
+    Args:
+        values: values of the sort columns of the last row
+
+    Return value:
+        url-safe cursor string
+    '''
+    payload = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, columns: Sequence[Any]) -> list[Any]:
+    '''
+    \nDecodes a cursor produced by encode_cursor.
+
+    Args:
+        cursor: cursor string received from the client
+        columns: sort columns the cursor refers to (used to restore the value types)
+
+    Return value:
+        list of sort key values
+
+    Raises:
+        HTTPException 400 if the cursor is malformed
+    '''
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError("cursor does not match the sort order")
+        return [
+            datetime.fromisoformat(v) if isinstance(col.type, DateTime) else v
+            for v, col in zip(values, columns)
+        ]
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def parse_sort(sort: str, sorts: dict[str, tuple]) -> tuple[tuple, bool]:
+    '''
+    \nResolves a ``sort`` query parameter (``key`` or ``-key``) into its columns.
+
+    Args:
+        sort: requested sort order, a leading "-" means descending
+        sorts: allowed sort keys mapped to their columns (primary key last, as tie-breaker)
+
+    Return value:
+        (columns, descending)
+
+    Raises:
+        HTTPException 400 if the sort key is not allowed
+    '''
+    descending = sort.startswith("-")
+    columns = sorts.get(sort.lstrip("-"))
+    if columns is None:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid sort '{sort}', allowed: {', '.join(sorts)} (prefix with '-' for descending)",
+        )
+    return columns, descending
+
+
+async def paginate(session: AsyncSession,
+                   statement,
+                   columns: Sequence[Any],
+                   descending: bool,
+                   cursor: str | None,
+                   limit: int
+                  ) -> tuple[list, str | None]:
+    '''
+    \nRuns one keyset page of ``statement``.
+
+    Args:
+        session: DB session
+        statement: SELECT (already filtered) to paginate
+        columns: sort columns, ending with the primary key so the order is total
+        descending: sort direction
+        cursor: cursor returned with the previous page, None for the first page
+        limit: maximum number of rows in the page
+
+    Return value:
+        (rows of the page, cursor of the next page or None if this is the last one)
+    '''
+    key = tuple_(*columns)
+    if cursor is not None:
+        last = tuple_(*decode_cursor(cursor, columns))
+        statement = statement.where(key < last if descending else key > last)
+
+    order = [col.desc() if descending else col.asc() for col in columns]
+    # Fetch one row more than requested to know whether a next page exists
+    rows = list((await session.exec(statement.order_by(*order).limit(limit + 1))).all())
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last_row = rows[-1]
+        next_cursor = encode_cursor([getattr(last_row, col.key) for col in columns])
+    return rows, next_cursor
+
+
+def set_next_cursor(request: Request, response: Response, next_cursor: str | None) -> None:
+    '''
+    \nExposes the next-page cursor through the ``X-Next-Cursor`` and ``Link`` headers,
+    so list endpoints keep returning a plain JSON array.
+    '''
+    if next_cursor is None:
+        return
+    response.headers["X-Next-Cursor"] = next_cursor
+    next_url = request.url.include_query_params(cursor=next_cursor)
+    response.headers["Link"] = f'<{next_url}>; rel="next"'
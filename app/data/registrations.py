@@ -0,0 +1,305 @@
+"""Registration writes shared by the single, bulk and queued registration paths.
+
+``event.registered_count`` is claimed with a guarded UPDATE
+(``registered_count < capacity``) before the registration row is inserted, so
+concurrent sign-ups can never overbook an event: SQLite runs one writer at a
+time and the check and the increment are the same statement. Deletes of
+registrations (directly or through ON DELETE CASCADE) give the seat back
+through the ``registration_count_ad`` trigger.
+
+``RegistrationQueue`` is the write-behind mode of the single registrations
+(``config.register_queue_enabled``): during a burst, one writer task takes the
+queued registrations in batches and writes each batch with ``register_batch``,
+a constant number of statements and a single commit instead of four
+statements and a commit per registration.
+"""
+
+import asyncio
+import logging
+from collections import Counter
+from dataclasses import dataclass
+
+from sqlalchemy import Connection, insert, or_, text, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.config import config
+from app.models.event import Event
+from app.models.registration import Registration, RegistrationRequest
+from app.models.user import User
+from app.data.changes import change, record
+
+
+logger = logging.getLogger("app.registrations")
+
+COUNTER_DDL = [
+    """CREATE TRIGGER IF NOT EXISTS registration_count_ad AFTER DELETE ON registration BEGIN
+        UPDATE event SET registered_count = registered_count - 1 WHERE id = old.event_id;
+    END""",
+]
+
+
+def create_registration_counter(conn: Connection, recount: bool = False) -> None:
+    '''
+    \nCreates the trigger maintaining ``event.registered_count`` on deletes.
+
+    Args:
+        conn: connection inside a transaction
+        recount: recompute every counter from the registration table
+                 (when the column has just been added to an existing database)
+    '''
+    for statement in COUNTER_DDL:
+        conn.execute(text(statement))
+    if recount:
+        conn.execute(text(
+            "UPDATE event SET registered_count = "
+            "(SELECT count(*) FROM registration WHERE registration.event_id = event.id)"
+        ))
+
+
+def upsert_users_statement():
+    '''
+    \nINSERT ... ON CONFLICT(username) DO UPDATE of users: new users are created,
+    existing ones get the name and email of the request (executemany-friendly).
+    '''
+    statement = sqlite_insert(User)
+    return statement.on_conflict_do_update(
+        index_elements=[User.username],
+        set_={"name": statement.excluded.name, "email": statement.excluded.email},
+    )
+
+
+def claim_seats_statement(event_id: int, seats: int = 1):
+    '''
+    \nUPDATE taking ``seats`` places of the event, only if they are all available.
+    Returns the event id when the seats were taken, no row otherwise.
+    '''
+    return (
+        update(Event)
+        .where(Event.id == event_id)
+        .where(or_(Event.capacity.is_(None), Event.registered_count + seats <= Event.capacity))
+        .values(registered_count=Event.registered_count + seats)
+        .returning(Event.id)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def register_user(session: AsyncSession,
+                        event_id: int,
+                        reg_req: RegistrationRequest
+                       ) -> tuple[int, str | None]:
+    '''
+    \nRegisters a user to an event inside the current transaction (the caller commits).
+
+    1) Takes a seat with the guarded UPDATE (first write: SQLite's write lock is
+       held from here on, so nothing can change under the following statements).
+    2) Creates or updates the user with an upsert.
+    3) Inserts the registration with ON CONFLICT DO NOTHING; if it already
+       existed the seat is given back.
+    4) Records the user and registration deltas of the change feed.
+
+    Args:
+        session: DB session
+        event_id: ID of the event
+        reg_req: user data
+
+    Return value:
+        (HTTP status, error detail): 201, 404 (no event) or 409 (full / already registered).
+        On 404 and "full" nothing has been written.
+    '''
+    claimed = (await session.exec(claim_seats_statement(event_id))).first()
+    if claimed is None:
+        exists = (await session.exec(select(Event.id).where(Event.id == event_id))).first()
+        if exists is None:
+            return 404, "Event not found"
+        already = (await session.exec(
+            select(Registration.username)
+            .where(Registration.username == reg_req.username)
+            .where(Registration.event_id == event_id)
+        )).first()
+        return 409, "Already registered" if already is not None else "Event is full"
+
+    await session.exec(upsert_users_statement(), params=[reg_req.model_dump()])
+
+    inserted = (await session.exec(
+        sqlite_insert(Registration)
+        .values(username=reg_req.username, event_id=event_id)
+        .on_conflict_do_nothing()
+        .returning(Registration.username)
+    )).first()
+    if inserted is None:
+        # Give the seat back: the user was already registered
+        await session.exec(
+            update(Event)
+            .where(Event.id == event_id)
+            .values(registered_count=Event.registered_count - 1)
+            .execution_options(synchronize_session=False)
+        )
+        return 409, "Already registered"
+
+    # The user may have been created or renamed by the upsert
+    await record(session,
+                 change("user", "put", reg_req.username, reg_req.model_dump(mode="json")),
+                 change("registration", "put", f"{reg_req.username}/{event_id}",
+                        {"username": reg_req.username, "event_id": event_id}))
+    return 201, None
+
+
+async def register_batch(session: AsyncSession,
+                         requests: list[tuple[int, RegistrationRequest]]
+                        ) -> list[tuple[int, str | None]]:
+    '''
+    \nRegisters users to events inside the current transaction (the caller
+    commits, and must hold the write lock already: BEGIN IMMEDIATE), each
+    request getting the outcome ``register_user`` would have given it running
+    after the previous ones. Refused requests write nothing.
+
+    1) Reads the seats of the events and the existing registrations (two queries).
+    2) Decides every request in order: 404, 409 already registered (also when
+       an earlier request of the batch took the seat), 409 full or 201.
+    3) Writes the accepted ones with one upsert of the users, one multi-row
+       INSERT of the registrations and one counter UPDATE per event, then
+       records their deltas.
+
+    Args:
+        session: DB session
+        requests: (event ID, user data) in arrival order
+
+    Return value:
+        (HTTP status, error detail) of each request
+    '''
+    event_ids = {event_id for event_id, _ in requests}
+    seats = {event_id: (capacity, registered_count) for event_id, capacity, registered_count in (await session.exec(
+        select(Event.id, Event.capacity, Event.registered_count).where(Event.id.in_(event_ids))
+    )).all()}
+    registered = set((await session.exec(
+        select(Registration.username, Registration.event_id)
+        .where(Registration.event_id.in_(seats))
+        .where(Registration.username.in_({reg_req.username for _, reg_req in requests}))
+    )).all())
+
+    results, accepted, taken = [], [], Counter()
+    for event_id, reg_req in requests:
+        if event_id not in seats:
+            results.append((404, "Event not found"))
+        elif (reg_req.username, event_id) in registered:
+            results.append((409, "Already registered"))
+        elif seats[event_id][0] is not None and seats[event_id][1] + taken[event_id] >= seats[event_id][0]:
+            results.append((409, "Event is full"))
+        else:
+            registered.add((reg_req.username, event_id))
+            taken[event_id] += 1
+            accepted.append((event_id, reg_req))
+            results.append((201, None))
+
+    if accepted:
+        await session.exec(upsert_users_statement(), params=[reg_req.model_dump() for _, reg_req in accepted])
+        await session.exec(insert(Registration),
+                           params=[{"username": reg_req.username, "event_id": event_id} for event_id, reg_req in accepted])
+        for event_id, seats_taken in taken.items():
+            await session.exec(claim_seats_statement(event_id, seats_taken))
+        await record(session, *(delta for event_id, reg_req in accepted for delta in (
+            change("user", "put", reg_req.username, reg_req.model_dump(mode="json")),
+            change("registration", "put", f"{reg_req.username}/{event_id}",
+                   {"username": reg_req.username, "event_id": event_id}))))
+    return results
+
+
+@dataclass
+class _QueuedRegistration:
+    event_id: int
+    reg_req: RegistrationRequest
+    result: asyncio.Future
+
+
+class RegistrationQueue:
+    def __init__(self):
+        self._queue: asyncio.Queue[_QueuedRegistration] | None = None
+        self._session_maker = None
+        self._task: asyncio.Task | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def start(self, session_maker) -> None:
+        '''
+        \nStarts the writer task.
+
+        Args:
+            session_maker: factory of the (write) sessions the batches run in
+        '''
+        self._session_maker = session_maker
+        self._queue = asyncio.Queue(config.register_queue_size)
+        self._task = asyncio.create_task(self._writer())
+
+    async def stop(self) -> None:
+        # The registrations already queued are committed first
+        if self._task is not None:
+            await self._queue.join()
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def submit(self, event_id: int, reg_req: RegistrationRequest) -> tuple[int, str | None]:
+        '''
+        \nQueues a registration and waits until the batch it went into is committed.
+
+        Args:
+            event_id: ID of the event
+            reg_req: user data
+
+        Return value:
+            (HTTP status, error detail), as ``register_user``
+
+        Raises:
+            Exception: the error of the registration, or of the commit of its batch
+        '''
+        result = asyncio.get_running_loop().create_future()
+        await self._queue.put(_QueuedRegistration(event_id, reg_req, result))
+        return await result
+
+    async def _writer(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            # Lets the burst build up a batch (a commit takes longer than the wait)
+            if config.register_batch_delay and self._queue.qsize() < config.register_batch_size - 1:
+                await asyncio.sleep(config.register_batch_delay)
+            while len(batch) < config.register_batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+            try:
+                await self._commit(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _commit(self, batch: list[_QueuedRegistration]) -> None:
+        results: list[tuple[int, str | None]] | list[Exception]
+        try:
+            async with self._session_maker() as session:
+                # Write lock before reading the seats: nothing changes under the batch
+                await session.exec(text("BEGIN IMMEDIATE"))
+                results = await register_batch(session, [(item.event_id, item.reg_req) for item in batch])
+                await session.commit()
+        except Exception as e:
+            logger.exception("registration queue: commit of a batch of %d failed", len(batch))
+            results = [e] * len(batch)
+
+        # Answers only now that the whole batch is committed (callers may have gone away)
+        for item, result in zip(batch, results):
+            if item.result.done():
+                continue
+            if isinstance(result, Exception):
+                item.result.set_exception(result)
+            else:
+                item.result.set_result(result)
+
+
+registration_queue: RegistrationQueue = RegistrationQueue()
@@ -0,0 +1,389 @@
+"""Fast bulk seeding and import of events, users and registrations.
+
+Rows go through the raw sqlite3 connection with ``executemany`` in large
+transactions, with the secondary indexes, the FTS insert trigger and the
+statistics triggers dropped for the duration of the load: they are rebuilt
+once at the end (index builds sort the data once instead of updating a
+B-tree per row).
+
+``generate`` builds fake rows from Faker vocabularies. The rows of block ``b``
+depend only on (seed, table, b), so the output is the same whatever the
+number of workers. With ``--workers N`` the blocks are generated in N
+processes, each writing its own scratch database, and the main process
+merges them with ``INSERT ... SELECT`` while the workers go on.
+
+``import`` loads NDJSON or CSV files in the format of the export endpoints.
+
+Usage (from the repository root):
+
+    python -m app.data.seed generate --events 1000000 --users 1000000 --registrations 2000000 --workers 4
+    python -m app.data.seed import events.ndjson users.csv registrations.ndjson
+"""
+
+import argparse
+import csv
+import json
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+from functools import lru_cache
+from typing import Any, Iterator
+
+from sqlalchemy import Engine, Table, text
+from sqlalchemy.schema import CreateIndex
+
+from app.config import config
+from app.data.fts import create_fts, rebuild_fts
+from app.data.registrations import create_registration_counter
+from app.data.stats import create_stats, drop_stats_triggers, rebuild_stats
+from app.models.event import Event
+from app.models.registration import Registration
+from app.models.user import User
+
+
+TABLES: dict[str, Table] = {
+    "event": Event.__table__,
+    "user": User.__table__,
+    "registration": Registration.__table__,
+}
+# Load order: registrations reference users and events
+LOAD_ORDER = ["event", "user", "registration"]
+
+# Rows generated with one random state (determinism unit) and inserted per executemany
+BLOCK_SIZE = 50_000
+# Size of the Faker vocabularies the rows are assembled from
+POOL_SIZE = 1000
+START_DATE = datetime(2025, 1, 1)
+# Storage format of SQLAlchemy's SQLite DateTime
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+
+def _columns(table: Table) -> list[str]:
+    return [column.name for column in table.columns]
+
+
+def _insert_sql(table: Table, or_ignore: bool = False) -> str:
+    columns = _columns(table)
+    return (f"INSERT {'OR IGNORE ' if or_ignore else ''}INTO \"{table.name}\" "
+            f"({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})")
+
+
+# Generation ---------------------------------------------------------------------
+
+@lru_cache
+def _pools(seed: int) -> dict[str, list[str]]:
+    # Lazy import: Faker is slow to import and only needed to generate data
+    from faker import Faker
+
+    fake = Faker("it_IT")
+    fake.seed_instance(seed)
+    return {
+        "title": [fake.catch_phrase() for _ in range(POOL_SIZE)],
+        "description": [fake.text() for _ in range(POOL_SIZE)],
+        # Provinces: fake.city() draws from a set, whose order changes with the
+        # hash seed of the process (the workers would disagree)
+        "location": [fake.administrative_unit() for _ in range(POOL_SIZE)],
+        "name": [fake.name() for _ in range(POOL_SIZE)],
+        "username": [fake.user_name() for _ in range(POOL_SIZE)],
+        "domain": [fake.free_email_domain() for _ in range(POOL_SIZE // 10)],
+    }
+
+
+def _username(pools: dict[str, list[str]], i: int) -> str:
+    # Derived from the index only (registrations recompute it), unique thanks to the suffix
+    return f"{pools['username'][i * 7919 % POOL_SIZE]}{i}"
+
+
+def _event_pair_offsets(seed: int, events: int) -> tuple[int, int]:
+    rng = random.Random(f"{seed}-registration")
+    step = rng.randrange(1, max(2, events))
+    return step, rng.randrange(max(1, events))
+
+
+def generate_rows(table: str, start: int, stop: int, seed: int, sizes: dict[str, int],
+                  event_id_offset: int = 0, pools: dict[str, list[str]] | None = None) -> list[tuple]:
+    '''
+    \nGenerates the rows ``start..stop-1`` of a table (``start`` must be a
+    multiple of BLOCK_SIZE), as tuples in the column order of the table.
+
+    Args:
+        table: event, user or registration
+        seed: random seed of the whole dataset
+        sizes: number of events, users and registrations of the dataset
+        event_id_offset: ids already taken in the event table (ids start after it)
+        pools: Faker vocabularies (built from the seed if None, cached per process)
+    '''
+    pools = pools or _pools(seed)
+    users, events = sizes["user"], sizes["event"]
+    step, shift = _event_pair_offsets(seed, events)
+    rows = []
+    for block_start in range(start, stop, BLOCK_SIZE):
+        rng = random.Random(f"{seed}-{table}-{block_start // BLOCK_SIZE}")
+        for i in range(block_start, min(block_start + BLOCK_SIZE, stop)):
+            if table == "event":
+                date = START_DATE + timedelta(seconds=rng.randrange(2 * 365 * 24 * 3600))
+                rows.append((event_id_offset + i + 1,
+                             rng.choice(pools["title"]),
+                             rng.choice(pools["description"]),
+                             date.strftime(DATETIME_FORMAT),
+                             rng.choice(pools["location"]),
+                             None,
+                             0))
+            elif table == "user":
+                username = _username(pools, i)
+                rows.append((username, rng.choice(pools["name"]), f"{username}@{rng.choice(pools['domain'])}"))
+            else:
+                # User i % users registered to consecutive events from a per-user
+                # starting point: unique pairs as long as registrations <= users * events
+                user = i % users
+                event = (user * step + shift + i // users) % events
+                rows.append((_username(pools, user), event_id_offset + event + 1))
+    if table != "event":
+        # In primary key order: appends to the B-tree instead of random page splits
+        rows.sort()
+    return rows
+
+
+def _generate_part(table: str, start: int, stop: int, seed: int, sizes: dict[str, int],
+                   event_id_offset: int, part_dir: str) -> str:
+    '''
+    \nWorker process: writes rows start..stop-1 of a table to a scratch database.
+    '''
+    import sqlite3
+
+    path = os.path.join(part_dir, f"{table}-{start}.db")
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute(f'CREATE TABLE "{table}" ({", ".join(_columns(TABLES[table]))})')
+    rows = generate_rows(table, start, stop, seed, sizes, event_id_offset)
+    with conn:
+        conn.executemany(_insert_sql(TABLES[table]), rows)
+    conn.close()
+    return path
+
+
+# Loading ------------------------------------------------------------------------
+
+@contextmanager
+def bulk_load(engine: Engine, defer_indexes: bool = True, check_foreign_keys: bool = True) -> Iterator[Any]:
+    '''
+    \nYields a raw sqlite3 connection tuned for bulk inserts (transactions are
+    managed by the caller). When ``defer_indexes`` is True the secondary
+    indexes, the FTS insert trigger and the statistics triggers are dropped
+    first; on exit they are recreated, the FTS index rebuilt and the
+    registration counters and statistics recomputed.
+    ``check_foreign_keys=False`` skips the parent lookups of every inserted
+    registration, for data that is consistent by construction.
+    '''
+    with engine.begin() as conn:
+        create_fts(conn)
+        create_registration_counter(conn)
+        create_stats(conn)
+        if defer_indexes:
+            for table in TABLES.values():
+                for index in table.indexes:
+                    conn.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+            conn.execute(text("DROP TRIGGER IF EXISTS event_fts_ai"))
+            drop_stats_triggers(conn)
+
+    raw = engine.raw_connection()
+    driver = raw.driver_connection
+    # The load can be replayed: trade durability for speed on this connection only
+    driver.execute("PRAGMA synchronous = OFF")
+    if not check_foreign_keys:
+        driver.execute("PRAGMA foreign_keys = OFF")
+    try:
+        yield driver
+    finally:
+        driver.execute(f"PRAGMA synchronous = {config.db_synchronous}")
+        driver.execute(f"PRAGMA foreign_keys = {'ON' if config.db_foreign_keys else 'OFF'}")
+        raw.close()
+
+        with engine.begin() as conn:
+            if defer_indexes:
+                for table in TABLES.values():
+                    for index in table.indexes:
+                        conn.execute(CreateIndex(index, if_not_exists=True))
+                create_fts(conn)
+                rebuild_fts(conn)
+            create_registration_counter(conn, recount=True)
+            create_stats(conn)
+            rebuild_stats(conn)
+            # Sampled statistics: a full ANALYZE would read every index again
+            conn.execute(text("PRAGMA analysis_limit = 1000"))
+            conn.execute(text("ANALYZE"))
+
+
+def _event_id_offset(driver) -> int:
+    return driver.execute("SELECT coalesce(max(id), 0) FROM event").fetchone()[0]
+
+
+def generate(engine: Engine,
+             events: int,
+             users: int,
+             registrations: int,
+             seed: int = 0,
+             workers: int = 1,
+             defer_indexes: bool = True) -> dict[str, int]:
+    '''
+    \nGenerates and inserts fake events, users and registrations. Event ids
+    continue after the existing ones; users already present are kept.
+
+    Args:
+        engine: synchronous engine of the target database (schema already created)
+        events, users, registrations: number of rows to generate
+        seed: random seed, the same seed always gives the same rows
+        workers: generator processes (1 = generate in this process)
+        defer_indexes: drop and rebuild the secondary indexes around the load
+
+    Return value:
+        number of rows inserted per table
+    '''
+    if registrations and registrations > users * events:
+        raise ValueError("registrations must not exceed users * events")
+    sizes = {"event": events, "user": users, "registration": registrations}
+    inserted = {}
+
+    # Generated registrations only reference generated events and users
+    with bulk_load(engine, defer_indexes, check_foreign_keys=False) as driver:
+        offset = _event_id_offset(driver)
+        before = {name: driver.execute(f'SELECT count(*) FROM "{name}"').fetchone()[0] for name in LOAD_ORDER}
+        blocks = [(name, start, min(start + BLOCK_SIZE, sizes[name]))
+                  for name in LOAD_ORDER for start in range(0, sizes[name], BLOCK_SIZE)]
+
+        if workers <= 1:
+            for name, start, stop in blocks:
+                rows = generate_rows(name, start, stop, seed, sizes, offset)
+                with driver:
+                    driver.executemany(_insert_sql(TABLES[name], or_ignore=name != "event"), rows)
+        else:
+            with tempfile.TemporaryDirectory() as part_dir, ProcessPoolExecutor(workers) as pool:
+                futures = [pool.submit(_generate_part, name, start, stop, seed, sizes, offset, part_dir)
+                           for name, start, stop in blocks]
+                # Merge in submission order (events and users before registrations)
+                for (name, _, _), future in zip(blocks, futures):
+                    path = future.result()
+                    columns = ", ".join(_columns(TABLES[name]))
+                    driver.execute("ATTACH DATABASE ? AS part", (path,))
+                    with driver:
+                        driver.execute(f'INSERT {"OR IGNORE " if name != "event" else ""}INTO main."{name}" '
+                                       f'({columns}) SELECT {columns} FROM part."{name}"')
+                    driver.execute("DETACH DATABASE part")
+                    os.remove(path)
+
+        for name in LOAD_ORDER:
+            inserted[name] = driver.execute(f'SELECT count(*) FROM "{name}"').fetchone()[0] - before[name]
+    return inserted
+
+
+def _table_of(path: Path) -> str:
+    # events.ndjson -> event (file names of the export endpoints)
+    name = path.stem.lower()
+    for table in TABLES:
+        if name.startswith(table):
+            return table
+    raise ValueError(f"{path}: cannot tell the table from the file name, use --table")
+
+
+def _read_rows(path: Path) -> Iterator[dict[str, Any]]:
+    with open(path, newline="") as f:
+        if path.suffix == ".csv":
+            for row in csv.DictReader(f):
+                yield {key: value if value != "" else None for key, value in row.items()}
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def import_file(driver, path: Path, table: str | None = None) -> int:
+    '''
+    \nInserts the rows of an NDJSON or CSV file (as produced by the export
+    endpoints) in batches. Rows whose key already exists are skipped.
+
+    Args:
+        driver: raw sqlite3 connection (see bulk_load)
+        path: .ndjson or .csv file
+        table: event, user or registration (default: from the file name)
+
+    Return value:
+        number of rows inserted
+    '''
+    table = table or _table_of(path)
+    columns = _columns(TABLES[table])
+    sql = _insert_sql(TABLES[table], or_ignore=True)
+    before = driver.total_changes
+    rows = _read_rows(path)
+    while True:
+        batch = []
+        for row in rows:
+            unknown = set(row) - set(columns)
+            if unknown:
+                raise ValueError(f"{path}: unknown columns {sorted(unknown)} for table {table}")
+            if table == "event" and row.get("date") is not None:
+                row["date"] = datetime.fromisoformat(row["date"]).strftime(DATETIME_FORMAT)
+            if table == "event" and row.get("registered_count") is None:
+                row["registered_count"] = 0   # recomputed at the end of the load
+            batch.append(tuple(row.get(column) for column in columns))
+            if len(batch) == BLOCK_SIZE:
+                break
+        if not batch:
+            break
+        with driver:
+            driver.executemany(sql, batch)
+    return driver.total_changes - before
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Bulk seeding and import of events, users and registrations")
+    parser.add_argument("--db", type=Path, help="database file (default: the one of the app)")
+    parser.add_argument("--keep-indexes", action="store_true",
+                        help="do not drop the secondary indexes during the load "
+                             "(faster for small loads into a large database)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    generate_parser = commands.add_parser("generate", help="generate fake data")
+    generate_parser.add_argument("--events", type=int, default=0)
+    generate_parser.add_argument("--users", type=int, default=0)
+    generate_parser.add_argument("--registrations", type=int, default=0)
+    generate_parser.add_argument("--seed", type=int, default=0)
+    generate_parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+
+    import_parser = commands.add_parser("import", help="load NDJSON / CSV exports")
+    import_parser.add_argument("files", nargs="+", type=Path)
+    import_parser.add_argument("--table", choices=list(TABLES), help="table of all the files")
+    args = parser.parse_args()
+
+    if args.db is not None:
+        config.db_file = args.db
+    # Imported here: the engine is bound to config.db_file on import
+    from app.data.db import engine, init_database
+
+    init_database(seed_fake_data=False)
+    start = time.perf_counter()
+
+    if args.command == "generate":
+        inserted = generate(engine, args.events, args.users, args.registrations,
+                            seed=args.seed, workers=args.workers, defer_indexes=not args.keep_indexes)
+    else:
+        files = sorted(args.files, key=lambda path: LOAD_ORDER.index(args.table or _table_of(path)))
+        inserted = {}
+        with bulk_load(engine, defer_indexes=not args.keep_indexes) as driver:
+            for path in files:
+                table = args.table or _table_of(path)
+                inserted[table] = inserted.get(table, 0) + import_file(driver, path, table)
+
+    elapsed = time.perf_counter() - start
+    total = sum(inserted.values())
+    print(", ".join(f"{count} {table}" for table, count in inserted.items())
+          + f" rows inserted in {elapsed:.1f} s ({total / elapsed * 60:,.0f} rows/min)")
+
+
+if __name__ == "__main__":
+    main()
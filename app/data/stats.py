@@ -0,0 +1,252 @@
+"""Statistics summary tables, maintained incrementally.
+
+The dashboard questions (totals, registrations per location, sign-ups per
+day, fullest events) are answered from small summary tables instead of
+scanning ``event`` and ``registration``:
+
+- ``stats_total``: number of events, users and registrations (one row each)
+- ``stats_location``: events and registrations per location, indexed on both
+  counts for the top-N queries
+- ``stats_day``: registrations made and removed per (UTC) day; removals
+  include the ones cascaded from deleting an event or a user
+- ``stats_event_day``: events taking place per day and location, keyed on
+  (day, location) and indexed on (location, day), so the per-day counts of a
+  calendar range (GET /events/calendar) are one range scan, with or without
+  a location
+
+Triggers on ``event``, ``user`` and ``registration`` update them in the
+transaction of every write, whatever the path (single, bulk, queued, ON
+DELETE CASCADE), the same way ``registration_count_ad`` keeps
+``event.registered_count``; the registration counters per location follow
+``registered_count`` itself. The registrations per event are
+``event.registered_count``, read through ``ix_event_registered_count``.
+
+``stats_day`` is only fed by the triggers: registrations made before the
+tables existed, or bulk loaded (``app.data.seed``), are not in it. The other
+tables can be rebuilt from scratch with:
+
+    python -m app.data.stats rebuild
+"""
+
+import argparse
+import calendar
+from datetime import date, timedelta
+
+from sqlalchemy import Connection, column, func, select, table, text
+
+from app.models.stats import EventStats
+
+
+STATS_TABLES_DDL = [
+    "CREATE TABLE IF NOT EXISTS stats_total (name TEXT PRIMARY KEY, value INTEGER NOT NULL) WITHOUT ROWID",
+    """CREATE TABLE IF NOT EXISTS stats_location (
+        location TEXT PRIMARY KEY,
+        events INTEGER NOT NULL DEFAULT 0,
+        registrations INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID""",
+    "CREATE INDEX IF NOT EXISTS ix_stats_location_registrations ON stats_location (registrations, location)",
+    "CREATE INDEX IF NOT EXISTS ix_stats_location_events ON stats_location (events, location)",
+    """CREATE TABLE IF NOT EXISTS stats_day (
+        day TEXT PRIMARY KEY,
+        registered INTEGER NOT NULL DEFAULT 0,
+        cancelled INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID""",
+    """CREATE TABLE IF NOT EXISTS stats_event_day (
+        day TEXT NOT NULL,
+        location TEXT NOT NULL,
+        events INTEGER NOT NULL,
+        PRIMARY KEY (day, location)
+    ) WITHOUT ROWID""",
+    "CREATE INDEX IF NOT EXISTS ix_stats_event_day_location ON stats_event_day (location, day, events)",
+]
+
+# Adds the contribution of the event row ``new`` to its location
+_ADD_LOCATION = """INSERT INTO stats_location (location, events, registrations) VALUES (new.location, 1, new.registered_count)
+        ON CONFLICT (location) DO UPDATE SET events = events + 1, registrations = registrations + excluded.registrations;"""
+# Removes the contribution of the event row ``old`` (and the location once it has no events left)
+_REMOVE_LOCATION = """UPDATE stats_location SET events = events - 1, registrations = registrations - old.registered_count
+        WHERE location = old.location;
+        DELETE FROM stats_location WHERE location = old.location AND events = 0;"""
+# Same for the calendar day of the event (date() of the stored datetime)
+_ADD_DAY = """INSERT INTO stats_event_day (day, location, events) VALUES (date(new.date), new.location, 1)
+        ON CONFLICT (day, location) DO UPDATE SET events = events + 1;"""
+_REMOVE_DAY = """UPDATE stats_event_day SET events = events - 1 WHERE day = date(old.date) AND location = old.location;
+        DELETE FROM stats_event_day WHERE day = date(old.date) AND location = old.location AND events = 0;"""
+
+STATS_TRIGGERS_DDL = {
+    "stats_event_ai": f"""CREATE TRIGGER IF NOT EXISTS stats_event_ai AFTER INSERT ON event BEGIN
+        UPDATE stats_total SET value = value + 1 WHERE name = 'events';
+        {_ADD_LOCATION}
+    END""",
+    "stats_event_ad": f"""CREATE TRIGGER IF NOT EXISTS stats_event_ad AFTER DELETE ON event BEGIN
+        UPDATE stats_total SET value = value - 1 WHERE name = 'events';
+        {_REMOVE_LOCATION}
+    END""",
+    # A new location or a new seat count: the event moves its whole contribution
+    "stats_event_au": f"""CREATE TRIGGER IF NOT EXISTS stats_event_au AFTER UPDATE OF location, registered_count ON event
+        WHEN old.location IS NOT new.location OR old.registered_count IS NOT new.registered_count BEGIN
+        {_REMOVE_LOCATION}
+        {_ADD_LOCATION}
+    END""",
+    "stats_event_day_ai": f"""CREATE TRIGGER IF NOT EXISTS stats_event_day_ai AFTER INSERT ON event BEGIN
+        {_ADD_DAY}
+    END""",
+    "stats_event_day_ad": f"""CREATE TRIGGER IF NOT EXISTS stats_event_day_ad AFTER DELETE ON event BEGIN
+        {_REMOVE_DAY}
+    END""",
+    "stats_event_day_au": f"""CREATE TRIGGER IF NOT EXISTS stats_event_day_au AFTER UPDATE OF date, location ON event
+        WHEN date(old.date) IS NOT date(new.date) OR old.location IS NOT new.location BEGIN
+        {_REMOVE_DAY}
+        {_ADD_DAY}
+    END""",
+    "stats_user_ai": """CREATE TRIGGER IF NOT EXISTS stats_user_ai AFTER INSERT ON "user" BEGIN
+        UPDATE stats_total SET value = value + 1 WHERE name = 'users';
+    END""",
+    "stats_user_ad": """CREATE TRIGGER IF NOT EXISTS stats_user_ad AFTER DELETE ON "user" BEGIN
+        UPDATE stats_total SET value = value - 1 WHERE name = 'users';
+    END""",
+    "stats_registration_ai": """CREATE TRIGGER IF NOT EXISTS stats_registration_ai AFTER INSERT ON registration BEGIN
+        UPDATE stats_total SET value = value + 1 WHERE name = 'registrations';
+        INSERT INTO stats_day (day, registered) VALUES (date('now'), 1)
+            ON CONFLICT (day) DO UPDATE SET registered = registered + 1;
+    END""",
+    "stats_registration_ad": """CREATE TRIGGER IF NOT EXISTS stats_registration_ad AFTER DELETE ON registration BEGIN
+        UPDATE stats_total SET value = value - 1 WHERE name = 'registrations';
+        INSERT INTO stats_day (day, cancelled) VALUES (date('now'), 1)
+            ON CONFLICT (day) DO UPDATE SET cancelled = cancelled + 1;
+    END""",
+}
+
+STATS_TRIGGERS = list(STATS_TRIGGERS_DDL)
+
+# Lightweight handles on the summary tables for query building
+stats_total = table("stats_total", column("name"), column("value"))
+stats_location = table("stats_location", column("location"), column("events"), column("registrations"))
+stats_day = table("stats_day", column("day"), column("registered"), column("cancelled"))
+stats_event_day = table("stats_event_day", column("day"), column("location"), column("events"))
+
+
+def create_stats(conn: Connection) -> None:
+    '''
+    \nCreates the summary tables and their triggers if missing. When a table
+    is new they are filled from ``event``, ``user`` and ``registration``.
+    '''
+    # The tables are always created together: checking one is enough
+    exists = conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'stats_event_day'")
+    ).first()
+    for statement in (*STATS_TABLES_DDL, *STATS_TRIGGERS_DDL.values()):
+        conn.execute(text(statement))
+    if not exists:
+        rebuild_stats(conn)
+
+
+def drop_stats_triggers(conn: Connection) -> None:
+    '''
+    \nDrops the triggers (bulk loads): ``create_stats`` and ``rebuild_stats`` put
+    them and the counters back.
+    '''
+    for name in STATS_TRIGGERS:
+        conn.execute(text(f"DROP TRIGGER IF EXISTS {name}"))
+
+
+def rebuild_stats(conn: Connection) -> None:
+    '''
+    \nRecomputes the totals, the per-location and the per-day counters (one
+    scan of each table). ``stats_day`` is kept: it cannot be derived from the
+    tables.
+    '''
+    conn.execute(text(
+        "INSERT OR REPLACE INTO stats_total (name, value) VALUES "
+        "('events', (SELECT count(*) FROM event)), "
+        "('users', (SELECT count(*) FROM \"user\")), "
+        "('registrations', (SELECT count(*) FROM registration))"
+    ))
+    conn.execute(text("DELETE FROM stats_location"))
+    conn.execute(text(
+        "INSERT INTO stats_location (location, events, registrations) "
+        "SELECT location, count(*), sum(registered_count) FROM event GROUP BY location"
+    ))
+    conn.execute(text("DELETE FROM stats_event_day"))
+    conn.execute(text(
+        "INSERT INTO stats_event_day (day, location, events) "
+        "SELECT date(date), location, count(*) FROM event GROUP BY date(date), location"
+    ))
+
+
+def event_stats(event_id: int, title: str, location: str, capacity: int | None, registered_count: int) -> EventStats:
+    '''
+    \nStatistics of an event from its row (no query: the counter is on the event).
+    '''
+    return EventStats(
+        event_id=event_id, title=title, location=location, capacity=capacity, registered_count=registered_count,
+        available=None if capacity is None else max(capacity - registered_count, 0),
+        fill_rate=None if capacity is None else round(registered_count / capacity, 4),
+    )
+
+
+# First day of the bucket holding a day: in SQL (over stats_event_day.day) and in Python
+CALENDAR_GROUPS = ["day", "week", "month"]
+_SQL_BUCKET_START = {
+    "day": lambda day: day,
+    # Monday of the week: back 6 days, then forward to the first Monday
+    "week": lambda day: func.date(day, "-6 days", "weekday 1"),
+    "month": lambda day: func.date(day, "start of month"),
+}
+
+
+def bucket_start(day: date, group: str) -> date:
+    if group == "week":
+        return day - timedelta(days=day.weekday())
+    if group == "month":
+        return day.replace(day=1)
+    return day
+
+
+def bucket_end(start: date, group: str) -> date:
+    '''
+    \nLast day of the bucket starting on ``start``.
+    '''
+    if group == "week":
+        return start + timedelta(days=6)
+    if group == "month":
+        return start.replace(day=calendar.monthrange(start.year, start.month)[1])
+    return start
+
+
+def calendar_statement(date_from: date, date_to: date, location: str | None, group: str):
+    '''
+    \nBuilds the query counting the events per bucket between two days (both
+    included): one range scan of stats_event_day, on its primary key or on
+    ix_stats_event_day_location for a location.
+
+    Return value:
+        SELECT of (first day of the bucket, number of events), oldest first
+    '''
+    start = _SQL_BUCKET_START[group](stats_event_day.c.day)
+    statement = (
+        select(start, func.sum(stats_event_day.c.events))
+        .where(stats_event_day.c.day >= date_from.isoformat())
+        .where(stats_event_day.c.day <= date_to.isoformat())
+    )
+    if location is not None:
+        statement = statement.where(stats_event_day.c.location == location)
+    return statement.group_by(start).order_by(start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Statistics summary tables")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.parse_args()
+
+    from app.data.db import engine
+
+    with engine.begin() as conn:
+        create_stats(conn)
+        rebuild_stats(conn)
+        totals = dict(conn.execute(text("SELECT name, value FROM stats_total")).all())
+    print(f"statistics rebuilt: {totals}")
+
+
+if __name__ == "__main__":
+    main()
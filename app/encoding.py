@@ -0,0 +1,146 @@
+"""Fast encoding of the responses of the read endpoints.
+
+The list endpoints select the columns of their table (``table_columns``)
+instead of ORM entities: the rows come out of the cursor as plain tuples,
+wrapped in ``Rows``, and go straight to the encoder. There is no model
+instance and no ``response_model`` validation per row, which is what used
+to dominate the time of a large page. The rows are the table itself, so
+the output matches the models field by field.
+
+The body is JSON, encoded with orjson (``json`` module if it is missing,
+same document). Clients sending ``Accept: application/msgpack`` get
+MessagePack instead: same structure, with datetimes as ISO 8601 strings.
+orjson and msgpack are in requirements.txt; without msgpack the negotiation
+always picks JSON.
+
+Benchmark: ``python -m benchmarks.bench_serialization``.
+"""
+
+import json
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Any, Sequence
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+try:
+    import orjson
+except ImportError:   # stdlib json, slower
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:   # Accept: application/msgpack gets JSON
+    msgpack = None
+
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+
+# Media types clients use to ask for MessagePack
+MSGPACK_TYPES = {"application/msgpack", "application/x-msgpack", "application/vnd.msgpack"}
+
+
+@dataclass(slots=True)
+class Rows:
+    '''
+    \nRows of a Core SELECT (``select(*table_columns(Model))``), encoded as a
+    list of objects keyed by column name. With ``keys``, only the first
+    ``len(keys)`` columns are encoded (see ``app.data.fields``).
+    '''
+    rows: Sequence[Any]
+    keys: Sequence[str] | None = None
+
+    def dicts(self) -> list[dict]:
+        if not self.rows:
+            return []
+        keys = self.keys or self.rows[0]._fields
+        return [dict(zip(keys, row)) for row in self.rows]
+
+
+def table_columns(model) -> list:
+    '''
+    \nColumns of the table of ``model``, in the order of its fields.
+    '''
+    return list(model.__table__.columns)
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not serializable")
+
+
+def _dumps_stdlib(data: Any) -> bytes:
+    return json.dumps(data, default=_default, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def _dumps_orjson(data: Any) -> bytes:
+    # Serializes datetimes natively, as isoformat() does
+    return orjson.dumps(data)
+
+
+dumps_json = _dumps_orjson if orjson is not None else _dumps_stdlib
+
+
+def negotiate(request: Request) -> str:
+    '''
+    \nPicks the media type of the response from the Accept header.
+
+    Return value:
+        MSGPACK when the client names a MessagePack type with a weight not
+        lower than JSON's (and msgpack is installed), JSON otherwise
+    '''
+    accept = request.headers.get("accept", "").lower()
+    if msgpack is None or "msgpack" not in accept:
+        return JSON
+    msgpack_q = json_q = 0.0
+    for media_range in accept.split(","):
+        media_type, *params = media_range.split(";")
+        media_type = media_type.strip()
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if media_type in MSGPACK_TYPES:
+            msgpack_q = max(msgpack_q, q)
+        elif media_type in (JSON, "application/*", "*/*"):
+            json_q = max(json_q, q)
+    return MSGPACK if msgpack_q > 0 and msgpack_q >= json_q else JSON
+
+
+def encode(content: Any, media_type: str = JSON) -> bytes:
+    '''
+    \nEncodes the value returned by a handler.
+
+    Args:
+        content: ``Rows``, or models / lists of models (through jsonable_encoder)
+        media_type: JSON or MSGPACK
+
+    Return value:
+        the body
+    '''
+    data = content.dicts() if isinstance(content, Rows) else jsonable_encoder(content)
+    if media_type == MSGPACK:
+        return msgpack.packb(data, default=_default)
+    return dumps_json(data)
+
+
+def respond(request: Request, content: Any, headers: dict[str, str] | None = None) -> Response:
+    '''
+    \nEncodes ``content`` in the media type negotiated with the client (for the
+    read endpoints that are not cached, see ``ResponseCache.store`` otherwise).
+
+    Args:
+        request: the request being answered
+        content: ``Rows`` or models
+        headers: extra headers (e.g. X-Next-Cursor)
+    '''
+    media_type = negotiate(request)
+    return Response(content=encode(content, media_type), media_type=media_type,
+                    headers={**(headers or {}), "Vary": "Accept"})
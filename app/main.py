@@ -13,31 +13,75 @@ if Path(__file__).parent == Path(os.getcwd()):
 # You can add imports from here...
 
 from fastapi import FastAPI
-from app.routers import frontend, events, registrations, users
-from fastapi.staticfiles import StaticFiles
+from app.routers import frontend, events, registrations, users, metrics, changes, stats
 from contextlib import asynccontextmanager
-from app.data.db import init_database
+import time
+from app.data.db import init_database, async_engine, async_read_engine, async_session_maker
+from app.data.changes import change_feed
+from app.data.registrations import registration_queue
+from app.data.coherence import CacheSyncMiddleware, cache_sync
+from app.data.idempotency import IdempotencyMiddleware, idempotency_store
+from app.metrics import MetricsMiddleware, startup_duration
+from app.admission import AdmissionMiddleware
+from app.static_assets import AssetFiles, static_assets
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # on start
+    start = time.perf_counter()
     init_database()
+    static_assets.build()
+    await change_feed.start(async_read_engine, async_engine)
+    cache_sync.start(config.db_file, change_feed.last_seq)
+    idempotency_store.start(async_read_engine, async_engine)
+    await registration_queue.start(async_session_maker)
+    startup_duration.set(time.perf_counter() - start)
     yield
     # on close
+    await registration_queue.stop()
+    cache_sync.stop()
+    await change_feed.stop()
+    await async_engine.dispose()
+    await async_read_engine.dispose()
 
 
 app = FastAPI(lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
+# Replays the responses of retried POSTs carrying an Idempotency-Key (see app.data.idempotency)
+app.add_middleware(IdempotencyMiddleware)
+# Drops the responses made stale by the other worker processes (see app.data.coherence)
+app.add_middleware(CacheSyncMiddleware)
+# Outermost: refuses the requests over the rate limits before any other work (see app.admission)
+app.add_middleware(AdmissionMiddleware)
 app.mount(
     "/static",
-    StaticFiles(directory=config.root_dir / "static"),
+    AssetFiles(directory=config.root_dir / "static"),
     name="static"
 )
 app.include_router(frontend.router)
 app.include_router(events.router)
 app.include_router(registrations.router)
 app.include_router(users.router)
+app.include_router(metrics.router)
+app.include_router(changes.router)
+app.include_router(stats.router)
 
 if __name__ == "__main__":
+    import argparse
     import uvicorn
-    uvicorn.run("main:app", reload=True)
+
+    parser = argparse.ArgumentParser(description="Runs the app with uvicorn")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="worker processes sharing the database (1 = development server with reload)")
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        # Every worker imports the app on its own: engines, caches and the
+        # change feed are per process, kept coherent through the database.
+        # Same as: gunicorn main:app -k uvicorn.workers.UvicornWorker -w N
+        uvicorn.run("main:app", host=args.host, port=args.port, workers=args.workers)
+    else:
+        uvicorn.run("main:app", host=args.host, port=args.port, reload=True)
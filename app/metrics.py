@@ -0,0 +1,250 @@
+"""Request timing, SQL query accounting and Prometheus exposition.
+
+``MetricsMiddleware`` times every request and, through a context variable,
+collects the SQL statements it runs: SQLAlchemy cursor events on the engines
+of ``app.data.db`` (see ``instrument_engine``) add each statement and its
+duration to the stats of the request being served. At the end of the request
+the totals go into per-route histograms, and a request that ran the same
+statement ``config.metrics_n_plus_one_threshold`` times or more is counted
+(and logged) as a probable N+1.
+
+Statements slower than ``config.slow_query_ms`` are logged on the
+``app.slow_query`` logger. Everything is rendered in the Prometheus text
+format by ``render()`` (served on GET /metrics).
+"""
+
+import logging
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any
+
+from sqlalchemy import Engine, event
+
+from app.config import config
+
+
+logger = logging.getLogger("app.metrics")
+slow_query_logger = logging.getLogger("app.slow_query")
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...], buckets: tuple[float, ...]):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> ([count per bucket] + [+Inf], sum)
+        self._series: dict[tuple[str, ...], list[Any]] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for label_values, (counts, total) in sorted(self._series.items()):
+            labels = _labels(self.labels, label_values)
+            cumulative = 0
+            for bound, count in zip([*self.buckets, "+Inf"], counts):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{{{labels + ',' if labels else ''}{le}}} {cumulative}")
+            lines.append(f"{self.name}_sum{{{labels}}} {total}")
+            lines.append(f"{self.name}_count{{{labels}}} {cumulative}")
+        return lines
+
+
+class CounterMetric:
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...]):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values: Counter[tuple[str, ...]] = Counter()
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        self._values[label_values] += amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for label_values, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{{{_labels(self.labels, label_values)}}} {value}")
+        return lines
+
+
+class GaugeMetric:
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self.value: float | None = None
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        if self.value is not None:
+            lines.append(f"{self.name} {self.value}")
+        return lines
+
+
+def _labels(names: tuple[str, ...], values: tuple[str, ...]) -> str:
+    def escape(value: str) -> str:
+        return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return ",".join(f'{name}="{escape(str(value))}"' for name, value in zip(names, values))
+
+
+http_requests = CounterMetric(
+    "http_requests_total", "HTTP requests by route and status", ("method", "route", "status"))
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "Request latency (until the last body byte)", ("method", "route"),
+    LATENCY_BUCKETS)
+http_request_db_statements = Histogram(
+    "http_request_db_statements", "SQL statements run per request", ("method", "route"), STATEMENT_BUCKETS)
+http_request_db_duration = Histogram(
+    "http_request_db_duration_seconds", "Time spent in SQL statements per request", ("method", "route"),
+    LATENCY_BUCKETS)
+db_statement_duration = Histogram(
+    "db_statement_duration_seconds", "Duration of single SQL statements", ("engine",), LATENCY_BUCKETS)
+n_plus_one_requests = CounterMetric(
+    "http_n_plus_one_requests_total", "Requests that repeated one SQL statement at least the N+1 threshold",
+    ("method", "route"))
+slow_queries = CounterMetric(
+    "db_slow_queries_total", "SQL statements slower than the slow query threshold", ("engine",))
+rejected_requests = CounterMetric(
+    "http_requests_rejected_total", "Requests refused by admission control (429 rate limit, 503 write slots)",
+    ("route_class", "status"))
+startup_duration = GaugeMetric(
+    "app_startup_duration_seconds", "Time spent in the startup hook (migrations, static assets)")
+
+METRICS = [http_requests, http_request_duration, http_request_db_statements, http_request_db_duration,
+           db_statement_duration, n_plus_one_requests, slow_queries, rejected_requests, startup_duration]
+
+
+@dataclass
+class RequestStats:
+    statements: int = 0
+    db_seconds: float = 0.0
+    # SQL text -> executions, to spot the same statement run once per row (N+1)
+    by_statement: Counter[str] = field(default_factory=Counter)
+
+
+_request_stats: ContextVar[RequestStats | None] = ContextVar("request_stats", default=None)
+
+
+# SQL accounting -----------------------------------------------------------------
+
+def instrument_engine(engine: Engine, name: str) -> None:
+    '''
+    \nTimes every statement run on ``engine`` (pass ``async_engine.sync_engine``
+    for async engines) and adds it to the stats of the current request.
+
+    Args:
+        engine: synchronous engine (or sync_engine of an AsyncEngine)
+        name: value of the ``engine`` label (write, read ...)
+    '''
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        if not config.metrics_enabled:
+            return
+        db_statement_duration.observe(elapsed, name)
+
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.statements += 1
+            stats.db_seconds += elapsed
+            stats.by_statement[statement] += 1
+
+        if config.slow_query_ms is not None and elapsed * 1000 >= config.slow_query_ms:
+            slow_queries.inc(name)
+            slow_query_logger.warning("%.1f ms on %s: %s %r", elapsed * 1000, name,
+                                      " ".join(statement.split()), _truncate(parameters))
+
+
+def _truncate(parameters: Any, limit: int = 10) -> Any:
+    # executemany parameter lists can hold thousands of rows
+    if isinstance(parameters, list) and len(parameters) > limit:
+        return [*parameters[:limit], f"... {len(parameters) - limit} more"]
+    return parameters
+
+
+# Middleware ---------------------------------------------------------------------
+
+class MetricsMiddleware:
+    '''
+    \nASGI middleware timing each HTTP request and recording its SQL statements.
+    The route label is the path template of the matched route
+    ("/events/{event_id}"), "unmatched" for 404s on unknown paths.
+    '''
+
+    def __init__(self, app):
+        self.app = app
+        self._route_paths: dict[Any, str] | None = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not config.metrics_enabled:
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_stats.reset(token)
+            self._record(scope, status, time.perf_counter() - start, stats)
+
+    def _route(self, scope) -> str:
+        # The router leaves the matched endpoint in the scope: map it back to its path template
+        if self._route_paths is None:
+            self._route_paths = {}
+            for route in scope["app"].routes:
+                endpoint = getattr(route, "endpoint", None) or getattr(route, "app", None)
+                self._route_paths[endpoint] = route.path
+        return self._route_paths.get(scope.get("endpoint"), "unmatched")
+
+    def _record(self, scope, status: int, elapsed: float, stats: RequestStats) -> None:
+        method, route = scope["method"], self._route(scope)
+        http_requests.inc(method, route, str(status))
+        http_request_duration.observe(elapsed, method, route)
+        http_request_db_statements.observe(stats.statements, method, route)
+        http_request_db_duration.observe(stats.db_seconds, method, route)
+
+        if stats.by_statement:
+            statement, executions = stats.by_statement.most_common(1)[0]
+            if executions >= config.metrics_n_plus_one_threshold:
+                n_plus_one_requests.inc(method, route)
+                logger.warning("probable N+1 on %s %s: %d executions of %s",
+                               method, route, executions, " ".join(statement.split()))
+
+
+def render() -> str:
+    '''
+    \nAll the metrics in the Prometheus text exposition format (version 0.0.4).
+    '''
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,9 @@
+from sqlmodel import SQLModel
+
+
+class BulkItemResult(SQLModel):
+    """Outcome of one item of a bulk request (items are reported in payload order)"""
+    index: int
+    status: int
+    key: int | str | None = None
+    detail: str | None = None
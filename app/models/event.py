@@ -1,14 +1,25 @@
 from sqlmodel import SQLModel, Field
+from sqlalchemy import Index
 
 from datetime import datetime
 
 
 class Event(SQLModel, table=True):
+    # Composite index used by the location filter of GET /events ordered by date,
+    # and the fullest events first for GET /stats/events (scanned backwards)
+    __table_args__ = (Index("ix_event_location_date", "location", "date"),
+                      Index("ix_event_registered_count", "registered_count", "id"))
+
     id: int | None = Field(default=None, primary_key=True)
     title: str
     description: str
-    date: datetime
+    date: datetime = Field(index=True)
     location: str
+    # Maximum number of registrations, None = unlimited
+    capacity: int | None = Field(default=None, ge=1)
+    # Number of registrations: incremented atomically by the registration paths
+    # (guarded by capacity), decremented by a trigger on every registration delete
+    registered_count: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
 
 
 class EventForm(SQLModel):
@@ -16,4 +27,5 @@ class EventForm(SQLModel):
     description: str
     date: datetime
     location: str
+    capacity: int | None = Field(default=None, ge=1)
 
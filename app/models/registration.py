@@ -1,9 +1,15 @@
 from sqlmodel import SQLModel, Field
+from sqlalchemy import Index
 
 
 class Registration(SQLModel, table=True):
-    username: str = Field(primary_key=True, foreign_key="user.username")
-    event_id: int = Field(primary_key=True, foreign_key="event.id")
+    # The primary key only covers lookups by username: index event_id as well
+    __table_args__ = (Index("ix_registration_event_id_username", "event_id", "username"),)
+
+    # ON DELETE CASCADE: deleting a user or an event removes its registrations
+    # in the same statement (requires PRAGMA foreign_keys = ON, see config.db_foreign_keys)
+    username: str = Field(primary_key=True, foreign_key="user.username", ondelete="CASCADE")
+    event_id: int = Field(primary_key=True, foreign_key="event.id", ondelete="CASCADE")
     
 """Schema di input per la registrazione: riceve username, name e email"""
 class RegistrationRequest(SQLModel):
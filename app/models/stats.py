@@ -0,0 +1,54 @@
+from sqlmodel import SQLModel
+
+from datetime import date, datetime
+
+
+class StatsTotals(SQLModel):
+    """Number of events, users and registrations (GET /stats)"""
+    events: int
+    users: int
+    registrations: int
+
+
+class EventStats(SQLModel):
+    """Registrations of one event (GET /stats/events, GET /events/{id}/stats)"""
+    event_id: int
+    title: str
+    location: str
+    capacity: int | None = None
+    registered_count: int
+    # Seats left and registered_count / capacity, None for unlimited events
+    available: int | None = None
+    fill_rate: float | None = None
+
+
+class LocationStats(SQLModel):
+    """Events and registrations of one location (GET /stats/locations)"""
+    location: str
+    events: int
+    registrations: int
+
+
+class DayStats(SQLModel):
+    """Registrations made and removed on one day (GET /stats/registrations/daily)"""
+    day: date
+    registered: int
+    cancelled: int
+
+
+class CalendarEvent(SQLModel):
+    """An event in a bucket of the calendar"""
+    id: int
+    title: str
+    date: datetime
+    location: str
+
+
+class CalendarBucket(SQLModel):
+    """Events of one day, week (from Monday) or month (GET /events/calendar)"""
+    start: date
+    # Last day of the bucket
+    end: date
+    count: int
+    # Only with include_events=true
+    events: list[CalendarEvent] | None = None
@@ -1,10 +1,14 @@
 from sqlmodel import SQLModel, Field
+from sqlalchemy import Index
 
 from datetime import datetime
 
 
 
 class User(SQLModel, table=True):
+    # Covers GET /users?sort=name (username is the tie-breaker of the keyset)
+    __table_args__ = (Index("ix_user_name_username", "name", "username"),)
+
     username: str = Field(primary_key=True)
     name : str
     email: str
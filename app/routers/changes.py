@@ -0,0 +1,75 @@
+import json
+import time
+from typing import Annotated, AsyncIterator
+
+from fastapi import APIRouter, Header, HTTPException, Query
+from fastapi.responses import StreamingResponse
+
+from app.config import config
+from app.data.changes import ResumeTooOld, change_feed
+
+
+router = APIRouter(tags=["changes"])
+
+
+def _event(name: str, data: dict, id: int | None = None) -> str:
+    lines = [f"event: {name}"]
+    if id is not None:
+        lines.append(f"id: {id}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'))}")
+    return "\n".join(lines) + "\n\n"
+
+
+async def _stream(seq: int) -> AsyncIterator[str]:
+    # Reconnect delay of EventSource, then the deltas after seq as they are committed
+    yield "retry: 2000\n\n"
+    deadline = time.monotonic() + config.changes_stream_max_seconds
+    while time.monotonic() < deadline:
+        try:
+            deltas = await change_feed.changes_after(seq)
+        except ResumeTooOld:
+            # The client missed deltas: it reloads its data and goes on from here
+            seq = change_feed.last_seq
+            yield _event("reset", {"seq": seq}, seq)
+            continue
+
+        for delta in deltas:
+            yield _event("change", delta, delta["seq"])
+            seq = delta["seq"]
+        if not deltas:
+            timeout = min(config.changes_keepalive, max(deadline - time.monotonic(), 0))
+            if not await change_feed.wait(seq, timeout):
+                yield ": keepalive\n\n"
+
+
+# GET /changes
+@router.get("/changes")
+async def changes(since: Annotated[int | None, Query(ge=0, description="Last sequence number seen (default: from now on)")] = None,
+                  last_event_id: Annotated[int | None, Header(ge=0)] = None
+                 ) -> StreamingResponse:
+    '''
+    \nServer-Sent Events stream of the create / update / delete deltas of events,
+    users and registrations ("change" events, the SSE id is the sequence number).
+
+    Args:
+        since: resume after this sequence number
+        last_event_id: Last-Event-ID header sent by EventSource when it reconnects (wins over since)
+
+    Return value:
+        text/event-stream response; a "reset" event means that deltas were lost
+        (resume point too old) and the client must reload its data. The stream
+        ends after config.changes_stream_max_seconds, EventSource reconnects on its own.
+
+    Raises:
+        HTTPException: 503 if the change feed is not running
+    '''
+    if not change_feed.running:
+        raise HTTPException(status_code=503, detail="Change feed not running")
+
+    seq = last_event_id if last_event_id is not None else since
+    return StreamingResponse(
+        _stream(change_feed.last_seq if seq is None else seq),
+        media_type="text/event-stream",
+        # no-transform: proxies must not buffer or compress the stream
+        headers={"Cache-Control": "no-cache, no-transform", "X-Accel-Buffering": "no"},
+    )
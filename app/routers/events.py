@@ -1,17 +1,29 @@
-from fastapi import APIRouter, HTTPException, Request, Path, Query, Form, Response
-from fastapi.responses import HTMLResponse
+from fastapi import APIRouter, HTTPException, Request, Path, Query, Form, Response, Body
+from fastapi.responses import HTMLResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from app.config import config
 
-from sqlmodel import Session, select, delete
+from sqlmodel import Session, select, delete, insert
+from sqlalchemy import true, update
 
-from typing import List, Annotated
+from typing import List, Annotated, Literal
 from app.models.event import Event, EventForm
 from app.models.registration import Registration, RegistrationRequest
 from app.models.user import User
-from app.data.db import SessionDep
+from app.models.bulk import BulkItemResult
+from app.models.stats import EventStats, CalendarBucket, CalendarEvent
+from app.data.db import SessionDep, ReadSessionDep
+from app.data.pagination import paginate, parse_sort, set_next_cursor, encode_cursor, decode_cursor
+from app.data.fts import match_query, search_statement
+from app.data.registrations import register_user, upsert_users_statement, claim_seats_statement, registration_queue
+from app.data.export import ExportFormat, export_response
+from app.data.changes import change, record
+from app.data.stats import event_stats, calendar_statement, bucket_start, bucket_end
+from app.cache import response_cache
+from app.encoding import Rows, respond, table_columns
+from app.data.fields import FIELDS_DESCRIPTION, select_fields
 
-from datetime import datetime
+from datetime import date, datetime, time, timedelta
 
 
 
@@ -19,34 +31,77 @@ router = APIRouter(prefix='/events')
 templates = Jinja2Templates(directory=config.root_dir / "templates")
 
 # GET - events
+# Allowed sort keys, each ending with the primary key as keyset tie-breaker
+EVENT_SORTS = {
+    "id": (Event.id,),
+    "date": (Event.date, Event.id),
+}
+
 @router.get("/", response_model=List[Event])
-async def get_events(session: SessionDep) -> List[Event]:
+async def get_events(session: ReadSessionDep,
+                     request: Request,
+                     response: Response,
+                     limit: Annotated[int, Query(ge=1, le=config.max_page_size)] = config.default_page_size,
+                     cursor: Annotated[str | None, Query(description="X-Next-Cursor of the previous page")] = None,
+                     sort: Annotated[str, Query(description="id, date (prefix with '-' for descending)")] = "id",
+                     date_from: Annotated[datetime | None, Query(description="Only events on or after this date")] = None,
+                     date_to: Annotated[datetime | None, Query(description="Only events before this date")] = None,
+                     location: Annotated[str | None, Query(description="Only events in this location")] = None,
+                     fields: Annotated[str | None, Query(description=FIELDS_DESCRIPTION)] = None
+                    ) -> List[Event]:
     '''
-    \nReturns the list of existing events.
+    \nReturns a page of the existing events.
 
     Args:
         session: DB session
+        limit: maximum number of events in the page
+        cursor: cursor of the page to fetch (X-Next-Cursor header of the previous page)
+        sort: sort order
+        date_from, date_to, location: optional filters
+        fields: fields of the events to return (only those columns are read)
 
-    Return Value:
-        list of all existing events fetched from the DB
+    Return value:
+        list of events of the requested page (JSON, or MessagePack if the Accept
+        header asks for it), the X-Next-Cursor / Link headers point to the next
+        page (absent on the last one)
 
     Raises:
-        HTTPException: If no events are found / Any other kind of errors
+        HTTPException: If the cursor or sort are invalid / Any other kind of errors
     '''
+    sort_columns, descending = parse_sort(sort, EVENT_SORTS)
+    # The sort columns are read as well: the next cursor is built from them
+    statement, keys = select_fields(Event, fields, sort_columns)
+
+    # Serve the page from the response cache when possible (304 if the client copy is current)
+    cached = response_cache.lookup(request)
+    if cached is not None:
+        return cached
+    generation = response_cache.generation
+
     try:
-        # Build SELECT query for all Event rows ("SELECT * FROM event")
-        statement = select(Event)
+        # Add the requested filters to the SELECT of the requested fields ("SELECT fields FROM event WHERE ...")
+        if date_from is not None:
+            statement = statement.where(Event.date >= date_from)
+        if date_to is not None:
+            statement = statement.where(Event.date < date_to)
+        if location is not None:
+            statement = statement.where(Event.location == location)
 
-        # Execute query and build list of events
-        events: List[Event] = session.exec(statement).all()
+        # Execute query for a single keyset page
+        events, next_cursor = await paginate(session, statement, sort_columns, descending, cursor, limit)
+
+    # Malformed cursor
+    except HTTPException:
+        raise
 
-        return events
-    
     # If exception occurs, rollback any pending transaction and raise HTTP 500 Internal Server Error
     except Exception as e:
-        session.rollback()
+        await session.rollback()
         raise HTTPException(status_code=500,detail=f"Error retrieving events: {e}")
 
+    set_next_cursor(request, response, next_cursor)
+    return response_cache.store(request, Rows(events, keys), ["events"], generation, dict(response.headers))
+
 
 
 # POST - events
@@ -69,22 +124,70 @@ async def create_event(session: SessionDep,
     '''
     try:
         # Build new event instance
-        new_event = Event(**event.dict())
+        new_event = Event(**event.model_dump())
 
-        # Add, commit to the DB session and then refresh
+        # Add and flush (assigns the id), publish the new event, commit and then refresh
         session.add(new_event)
-        session.commit()
-        session.refresh(new_event)
+        await session.flush()
+        await record(session, change("event", "put", new_event.id, new_event.model_dump(mode="json")))
+        await session.commit()
+        await session.refresh(new_event)
+
+        # Drop the cached event lists
+        response_cache.invalidate("events")
 
         return f"Event \'{event.title}\' successfully added!"
     
     # If exception occurs, rollback any pending transaction and raise HTTP 500 Internal Server Error
     except Exception as e:
-        session.rollback()
+        await session.rollback()
         raise HTTPException(status_code=500,detail=f"Error creating event: {e}")
 
 
 
+# POST - events/bulk
+@router.post("/bulk", response_model=List[BulkItemResult])
+async def create_events_bulk(session: SessionDep,
+                             events: Annotated[List[EventForm], Body(min_length=1, max_length=config.bulk_max_items)]
+                            ) -> List[BulkItemResult]:
+    '''
+    \nCreates many events in a single transaction.
+
+    Args:
+        session: Database session
+        events: list of EventForm objects (the whole payload is validated before writing)
+
+    Return value:
+        one result per event, in payload order, carrying the id of the created event
+
+    Raises:
+        HTTPException if the events couldn't be created (nothing is written)
+    '''
+    try:
+        # Multi-row "INSERT INTO event ... VALUES (...), (...) RETURNING id" on the table (Core):
+        # the ORM form, or asking RETURNING for payload order, runs one INSERT per event.
+        # SQLite gives new rows max(id) + 1 in VALUES order, so sorted ids follow the payload
+        statement = insert(Event.__table__).returning(Event.__table__.c.id)
+        rows = [{**event.model_dump(), "registered_count": 0} for event in events]
+        ids = sorted((await session.exec(statement, params=rows)).all())
+        await record(session, *(
+            change("event", "put", row[0], {**event.model_dump(mode="json"), "id": row[0], "registered_count": 0})
+            for event, row in zip(events, ids)
+        ))
+        await session.commit()
+
+        # Drop the cached event lists
+        response_cache.invalidate("events")
+
+    # If exception occurs, rollback any pending transaction and raise HTTP 500 Internal Server Error
+    except Exception as e:
+        await session.rollback()
+        raise HTTPException(status_code=500, detail=f"Error creating events: {e}")
+
+    return [BulkItemResult(index=i, status=201, key=row[0]) for i, row in enumerate(ids)]
+
+
+
 # DELETE - events
 @router.delete("/", response_model=str)
 async def delete_all_events(session: SessionDep) -> str:
@@ -101,30 +204,170 @@ async def delete_all_events(session: SessionDep) -> str:
         HTTPException if the events couldn't be deleted 
     '''
     try:
-        # Build DELETE query ("DELETE FROM event")
+        # Build DELETE query ("DELETE FROM event"), registrations go with it (ON DELETE CASCADE)
         statement = delete(Event)
 
-        #Prima elimina tutte le registrazioni
-        session.exec(delete(Registration))
-        
         # Execute query and commit to DB
-        session.exec(statement) 
-        session.commit()
+        await session.exec(statement) 
+        await record(session, change("event", "clear"))
+        await session.commit()
+
+        # Drop every cached event list and event detail
+        response_cache.invalidate("events", "event:*")
 
         return "All events and related registrations are succesfully deleted!"
 
     # If exception occurs, rollback any pending transaction and raise HTTP 500 Internal Server Error
     except Exception as e:
-        session.rollback()
+        await session.rollback()
         raise HTTPException(status_code=500,detail=f"Error deleting all events: {e}")
 
 
 
+# GET /events/export
+@router.get("/export")
+async def export_events(format: Annotated[ExportFormat, Query(description="ndjson or csv")] = ExportFormat.ndjson
+                       ) -> StreamingResponse:
+    '''
+    \nStreams every event as NDJSON or CSV, ordered by id.
+
+    Args:
+        format: output format
+
+    Return value:
+        streaming download, read from the DB in chunks through a server-side cursor
+    '''
+    # Every column of the table, so that `python -m app.data.seed import` restores the events as they were
+    return export_response(table_columns(Event), [Event.id], format, "events")
+
+
+
+# GET /events/search
+@router.get("/search", response_model=List[Event])
+async def search_events(session: ReadSessionDep,
+                        request: Request,
+                        response: Response,
+                        q: Annotated[str, Query(min_length=1, description="Words to look for in title, description and location (prefix match)")],
+                        limit: Annotated[int, Query(ge=1, le=config.max_page_size)] = config.default_page_size,
+                        cursor: Annotated[str | None, Query(description="X-Next-Cursor of the previous page")] = None,
+                        fields: Annotated[str | None, Query(description=FIELDS_DESCRIPTION)] = None
+                       ) -> List[Event]:
+    '''
+    \nFull-text search over events, best matches first (bm25 ranking).
+
+    Args:
+        session: DB session
+        q: search text, every word has to match (as a word prefix)
+        limit: maximum number of events in the page
+        cursor: cursor of the page to fetch (X-Next-Cursor header of the previous page)
+        fields: fields of the events to return
+
+    Return value:
+        list of matching events of the requested page
+
+    Raises:
+        HTTPException if the cursor or fields are invalid
+    '''
+    statement, keys = select_fields(Event, fields)
+
+    # Ranked results have no stable key to seek on: the cursor carries the offset
+    offset = decode_cursor(cursor, [Event.id])[0] if cursor is not None else 0
+    if not isinstance(offset, int) or offset < 0:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    match = match_query(q)
+    if match is None:
+        return respond(request, Rows([]))
+
+    # Fetch one row more than requested to know whether a next page exists
+    events = list((await session.exec(search_statement(match, limit + 1, offset, statement))).all())
+    if len(events) > limit:
+        events = events[:limit]
+        set_next_cursor(request, response, encode_cursor([offset + limit]))
+    return respond(request, Rows(events, keys), dict(response.headers))
+
+
+
+# GET /events/calendar
+@router.get("/calendar", response_model=List[CalendarBucket])
+async def get_calendar(session: ReadSessionDep,
+                       request: Request,
+                       date_from: Annotated[date, Query(alias="from", description="First day")],
+                       date_to: Annotated[date, Query(alias="to", description="Last day (included)")],
+                       location: Annotated[str | None, Query(description="Only events in this location")] = None,
+                       group: Annotated[Literal["day", "week", "month"], Query(description="Bucket size (weeks start on Monday)")] = "day",
+                       include_events: Annotated[bool, Query(description=f"List the events of each bucket (at most {config.max_page_size} in the range)")] = False
+                      ) -> List[CalendarBucket]:
+    '''
+    \nReturns the number of events per day, week or month between two days.
+    Buckets without events are left out; the first and last buckets only
+    count the days of the range.
+
+    Args:
+        session: Database session
+        date_from, date_to: range of days, both included
+        location: optional filter
+        group: day, week or month
+        include_events: also list the events (id, title, date, location) of each bucket
+
+    Return value:
+        buckets, oldest first (counts from the stats_event_day summary table:
+        one index range scan, whatever the number of events)
+
+    Raises:
+        HTTPException 422 if from is after to, 400 if include_events is asked
+        for more than config.max_page_size events
+    '''
+    if date_from > date_to:
+        raise HTTPException(status_code=422, detail="from must not be after to")
+
+    # Serve the calendar from the response cache when possible (304 if the client copy is current)
+    cached = response_cache.lookup(request)
+    if cached is not None:
+        return cached
+    generation = response_cache.generation
+
+    rows = (await session.exec(calendar_statement(date_from, date_to, location, group))).all()
+    buckets = {}
+    for start, count in rows:
+        start = date.fromisoformat(start)
+        buckets[start] = CalendarBucket(start=start, end=bucket_end(start, group), count=count)
+
+    if include_events:
+        total = sum(bucket.count for bucket in buckets.values())
+        if total > config.max_page_size:
+            raise HTTPException(
+                status_code=400,
+                detail=f"{total} events in the range, at most {config.max_page_size} can be listed: "
+                       "narrow it or page through GET /events?date_from=&date_to=",
+            )
+        # One range scan of ix_event_date (ix_event_location_date with a location)
+        statement = (
+            select(Event.id, Event.title, Event.date, Event.location)
+            .where(Event.date >= datetime.combine(date_from, time.min))
+            .where(Event.date < datetime.combine(date_to + timedelta(days=1), time.min))
+        )
+        if location is not None:
+            statement = statement.where(Event.location == location)
+        for bucket in buckets.values():
+            bucket.events = []
+        for row in (await session.exec(statement.order_by(Event.date, Event.id))).all():
+            bucket = buckets.get(bucket_start(row.date.date(), group))
+            # A write between the two queries: the counts were read first
+            if bucket is not None:
+                bucket.events.append(CalendarEvent(id=row.id, title=row.title, date=row.date, location=row.location))
+
+    return response_cache.store(request, list(buckets.values()), ["events"], generation)
+
+
+
 # GET /events/{id}
 @router.get("/{event_id}", response_model=Event)
-async def get_event_by_id(session: SessionDep, 
+async def get_event_by_id(session: ReadSessionDep, 
+                          request: Request,
                           event_id: int, 
-                          title="Event ID"
+                          title="Event ID",
+                          fields: Annotated[str | None, Query(description=FIELDS_DESCRIPTION)] = None
                         ) -> Event:
     '''
     \nReturns the event with the given id.
@@ -133,30 +376,43 @@ async def get_event_by_id(session: SessionDep,
     Args:
         session: Database session 
         event_id: ID of the event to be displayed 
+        fields: fields of the event to return
         
     Return value:
         the event fetched by ID
 
     Raises:
-        HTTPException if the event couldn't be retrieved
+        HTTPException if the event couldn't be retrieved / fields are invalid
 
     '''
+    statement, keys = select_fields(Event, fields)
+
+    # Serve the event from the response cache when possible (304 if the client copy is current)
+    cached = response_cache.lookup(request)
+    if cached is not None:
+        return cached
+    generation = response_cache.generation
+
     try:
-        # Build query and select event with corresponding ID
-        # "SELECT * FROM event WHERE id = event_id"
-        event = session.get(Event, event_id)
+        # Build query and select the requested fields of the event with corresponding ID
+        # "SELECT fields FROM event WHERE id = event_id"
+        event = (await session.exec(statement.where(Event.id == event_id))).first()
 
         # Raise Error 404 if no match is found
         if not event:
             raise HTTPException(status_code=404, detail=f"Event with id {event_id} not found")
-        
-        return event
+
+    # Let the 404 through
+    except HTTPException:
+        raise
 
     # If exception occurs, rollback any pending transaction and raise HTTP 500 Internal Server Error
     except Exception as e:
-        session.rollback()
+        await session.rollback()
         raise HTTPException(status_code=500, detail=f"Error retrieving event: {e}")
 
+    return response_cache.store(request, dict(zip(keys, event)), [f"event:{event_id}", "event:*"], generation)
+
 
 
 # PUT /events/{id}
@@ -178,37 +434,59 @@ async def update_event_by_id(session: SessionDep,
         success message
 
     Raises:
-        HTTPException if the event couldn't be updated
+        HTTPException 404 if the event doesn't exist, 409 if the new capacity
+        is lower than the registrations it already has, 500 if the event
+        couldn't be updated
 
     '''
     # Build query and select event with corresponding ID
     # "SELECT * FROM event WHERE id = event_id"
-    event = session.get(Event, event_id)
+    event = await session.get(Event, event_id)
 
     # Raise Error 404 if no match is found
     if not event:
         raise HTTPException(status_code=404, detail=f"Event with id {event_id} not found")
 
-    try:
-        # Store current title
-        former_title = event.title
-        
-        # Update each field with the new data from the request body 
-        event.title = updated_event.title
-        event.description = updated_event.description
-        event.date = updated_event.date
-        event.location = updated_event.location
+    # Store current title
+    former_title = event.title
 
-        # Add, commit to the DB session and then refresh
-        session.add(event)
-        session.commit()
-        session.refresh(event)
+    try:
+        # Guarded "UPDATE event SET ... WHERE id = :id AND registered_count <= :capacity RETURNING *":
+        # the check and the write happen under the write lock, so a registration
+        # committed meanwhile can't leave the event overbooked
+        capacity = updated_event.capacity
+        row = (await session.exec(
+            update(Event)
+            .where(Event.id == event_id)
+            .where(true() if capacity is None else Event.registered_count <= capacity)
+            .values(**updated_event.model_dump())
+            .returning(*table_columns(Event))
+            .execution_options(synchronize_session=False)
+        )).first()
+        if row is None:
+            # No row updated: deleted since the lookup above, or over capacity.
+            # Read in the same write transaction, nothing can change in between
+            exists = (await session.exec(select(Event.id).where(Event.id == event_id))).first()
+            await session.rollback()
+            if exists is None:
+                raise HTTPException(status_code=404, detail=f"Event with id {event_id} not found")
+            raise HTTPException(status_code=409,
+                                detail=f"Event {event_id} already has more registrations than a capacity of {capacity}")
+
+        # Publish the new version and commit
+        await record(session, change("event", "put", event_id, Event(**row._mapping).model_dump(mode="json")))
+        await session.commit()
+
+        # Drop the cached lists and the cached detail of this event
+        response_cache.invalidate("events", f"event:{event_id}")
 
         return f"Event \'{former_title}\' successfully updated!"
     
+    except HTTPException:
+        raise
     # If exception occurs, rollback any pending transaction and raise HTTP 500 Internal Server Error
     except Exception as e:
-        session.rollback()
+        await session.rollback()
         raise HTTPException(status_code=500, detail=f"Error updating event: {e}")
 
 
@@ -231,30 +509,98 @@ async def delete_event_by_id(session : SessionDep,
     Raises:
         HTTPException if the event couldn't be deleted
     '''
-    # Build query and select event with corresponding ID
-    # "SELECT * FROM event WHERE id = event_id"
-    event = session.get(Event, event_id)
-
-    # Raise Error 404 if no match is found
-    if not event:
-        raise HTTPException(status_code=404, detail=f"Event with id {event_id} not found")
-    
     try:
-        # Elimina registrazioni prima
-        session.exec(delete(Registration).where(Registration.event_id == event_id))
+        # Single statement, registrations go with the event (ON DELETE CASCADE)
+        # "DELETE FROM event WHERE id = event_id RETURNING title"
+        statement = delete(Event).where(Event.id == event_id).returning(Event.title)
+        title = (await session.exec(statement)).scalar_one_or_none()
+        if title is not None:
+            await record(session, change("event", "delete", event_id))
+        await session.commit()
 
-        # Delete the event from the session and commit transaction to DB
-        session.delete(event)
-        session.commit()
-        
-        return f"Event \'{event.title}\' successfully deleted!"
-    
     # If exception occurs, rollback any pending transaction and raise HTTP 500 Internal Server Error
     except Exception as e:
-        session.rollback()
+        await session.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to delete event: {e}")
+
+    # Raise Error 404 if no match is found
+    if title is None:
+        raise HTTPException(status_code=404, detail=f"Event with id {event_id} not found")
+
+    # Drop the cached lists and the cached detail of this event
+    response_cache.invalidate("events", f"event:{event_id}")
+
+    return f"Event \'{title}\' successfully deleted!"
     
 
+# GET /events/{id}/registrations
+@router.get("/{event_id}/registrations", response_model=List[Registration])
+async def get_event_registrations(session: ReadSessionDep,
+                                  request: Request,
+                                  response: Response,
+                                  event_id: Annotated[int, Path(description="ID of the event")],
+                                  limit: Annotated[int, Query(ge=1, le=config.max_page_size)] = config.default_page_size,
+                                  cursor: Annotated[str | None, Query(description="X-Next-Cursor of the previous page")] = None,
+                                  fields: Annotated[str | None, Query(description=FIELDS_DESCRIPTION)] = None
+                                 ) -> List[Registration]:
+    '''
+    \nReturns a page of the registrations to the event with the given id, ordered by username.
+
+    Args:
+        session: Database session
+        event_id: ID of the event
+        limit: maximum number of registrations in the page
+        cursor: cursor of the page to fetch (X-Next-Cursor header of the previous page)
+        fields: fields of the registrations to return
+
+    Return value:
+        list of registrations of the requested page (one range scan of the
+        (event_id, username) index)
+
+    Raises:
+        HTTPException if the event doesn't exist / fields are invalid
+    '''
+    statement, keys = select_fields(Registration, fields, (Registration.username,))
+
+
+    # "SELECT * FROM event WHERE id = event_id"
+    if not await session.get(Event, event_id):
+        raise HTTPException(status_code=404, detail=f"Event with id {event_id} not found")
+
+    statement = statement.where(Registration.event_id == event_id)
+    registrations, next_cursor = await paginate(session, statement, (Registration.username,), False, cursor, limit)
+
+    set_next_cursor(request, response, next_cursor)
+    return respond(request, Rows(registrations, keys), dict(response.headers))
+
+
+# GET /events/{id}/stats
+@router.get("/{event_id}/stats", response_model=EventStats)
+async def get_event_stats(session: ReadSessionDep,
+                          event_id: Annotated[int, Path(description="ID of the event")]
+                         ) -> EventStats:
+    '''
+    \nReturns the registration statistics of the event with the given id.
+
+    Args:
+        session: Database session
+        event_id: ID of the event
+
+    Return value:
+        registrations, seats left and fill rate (one primary key lookup:
+        registered_count is maintained on the event)
+
+    Raises:
+        HTTPException if the event doesn't exist
+    '''
+    row = (await session.exec(
+        select(Event.id, Event.title, Event.location, Event.capacity, Event.registered_count).where(Event.id == event_id)
+    )).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail=f"Event with id {event_id} not found")
+    return event_stats(*row)
+
+
 """POST /events/{event_id}/register"""
 @router.post("/{event_id}/register", response_model=Registration, status_code=201)
 async def register_event(
@@ -263,47 +609,124 @@ async def register_event(
     session: SessionDep, # dependency injection della sessione DB
 ):
     """
-    Registra un utente a un evento.
-    1) Controlla se l'utente esiste; se no, lo crea.
-    2) Verifica che l'evento esista.
-    3) Impedisce registrazioni duplicate.
-    4) Crea e restituisce la registrazione.
+    Registra un utente a un evento, in una sola transazione (un solo commit).
+    1) Occupa un posto dell'evento con un UPDATE condizionato su capacity
+       (404 se l'evento non esiste, 409 se e' pieno).
+    2) Crea o aggiorna l'utente con un upsert.
+    3) Inserisce la registrazione con ON CONFLICT DO NOTHING (409 se gia' registrato).
+    4) Restituisce la registrazione creata.
+    Non c'e' nessun "controlla e poi inserisci": due iscrizioni concorrenti non
+    possono superare la capienza ne' duplicare la registrazione.
+    Con config.register_queue_enabled la registrazione passa al writer della coda,
+    che la scrive insieme alle altre in attesa (stesso esito, un solo commit per
+    gruppo): la risposta arriva dopo il commit del gruppo.
     """
+    try:
+        if config.register_queue_enabled:
+            status, detail = await registration_queue.submit(event_id, reg_req)
+            if status != 201:
+                raise HTTPException(status_code=status, detail=detail)
+        else:
+            status, detail = await register_user(session, event_id, reg_req)
+            if status != 201:
+                """Annulla la transazione: in caso di errore non resta scritto nulla"""
+                await session.rollback()
+                raise HTTPException(status_code=status, detail=detail)
+            await session.commit()
+
+    except HTTPException:
+        raise
 
-    """1) Controlla (o crea) l'utente"""
-    user = session.get(User, reg_req.username)
-    if not user:
-        """L'utente non esiste: crealo con i dati forniti""" 
-        user = User(
-            username=reg_req.username,
-            name=reg_req.name,
-            email=reg_req.email
-        )
-        session.add(user)
-    else:
-        """Se l'utente esiste, aggiorna nome ed email se cambiati"""
-        user.name  = reg_req.name
-        user.email = reg_req.email
-
-    """2) Controlla che l'evento esista"""
-    event = session.get(Event, event_id)
-    if not event:
-        raise HTTPException(status_code=404, detail="Event not found")
+    except Exception as e:
+        await session.rollback()
+        raise HTTPException(status_code=500, detail=f"Error registering user: {e}")
 
-    """Salva eventuali modifiche all'utente prima di procedere"""
-    session.commit()
-    session.refresh(user)
+    """Invalida le risposte in cache dell'utente (nome ed email possono essere cambiati) e dell'evento (posti)"""
+    response_cache.invalidate("users", f"user:{reg_req.username}", "events", f"event:{event_id}")
 
-    """3) Verifica che non sia già registrato"""
-    key = (user.username, event_id)
-    if session.get(Registration, key):
-        raise HTTPException(status_code=409, detail="Already registered")
+    """Restituisce l'oggetto Registration creato"""
+    return Registration(username=reg_req.username, event_id=event_id)
 
-    """4) Crea la registrazione"""
-    db_reg = Registration(username=user.username, event_id=event_id)
-    session.add(db_reg)
-    session.commit()
-    session.refresh(db_reg)
 
-    """Restituisce l'oggetto Registration creato"""
-    return db_reg
+
+"""POST /events/{event_id}/register/bulk"""
+@router.post("/{event_id}/register/bulk", response_model=List[BulkItemResult])
+async def register_event_bulk(
+    event_id: int,                                                                                # ID dell’evento nel path
+    reg_reqs: Annotated[List[RegistrationRequest], Body(min_length=1, max_length=config.bulk_max_items)],  # utenti nel body
+    session: SessionDep,                                                                          # sessione DB
+):
+    """
+    Registra molti utenti a un evento in un'unica transazione.
+    1) Crea o aggiorna tutti gli utenti con un solo upsert (prima scrittura: da qui
+       la transazione tiene il lock di scrittura di SQLite).
+    2) Verifica che l'evento esista (altrimenti 404 per tutta la richiesta) e legge i posti liberi.
+    3) Trova con una sola query le registrazioni gia' esistenti (409 per quegli elementi,
+       come per i duplicati all'interno del payload).
+    4) Inserisce le nuove registrazioni fino ad esaurimento posti (409 "Event is full"
+       per le altre) con un solo INSERT multiplo e aggiorna registered_count.
+    """
+
+    """Duplicati nel payload: vale la prima occorrenza di ogni username"""
+    first_index: dict[str, int] = {}
+    for i, reg_req in enumerate(reg_reqs):
+        first_index.setdefault(reg_req.username, i)
+    unique = [reg_reqs[i] for i in first_index.values()]
+
+    try:
+        """1) Upsert di tutti gli utenti (INSERT ... ON CONFLICT(username) DO UPDATE)"""
+        await session.exec(upsert_users_statement(), params=[r.model_dump() for r in unique])
+
+        """2) Controlla che l'evento esista e calcola i posti liberi"""
+        event = (await session.exec(
+            select(Event.capacity, Event.registered_count).where(Event.id == event_id)
+        )).first()
+        if event is None:
+            await session.rollback()
+            raise HTTPException(status_code=404, detail="Event not found")
+        capacity, registered_count = event
+
+        """3) Registrazioni gia' presenti, con una sola query"""
+        already = set((await session.exec(
+            select(Registration.username)
+            .where(Registration.event_id == event_id)
+            .where(Registration.username.in_(first_index))
+        )).all())
+
+        """4) Inserisce solo le nuove registrazioni, nei limiti della capienza"""
+        candidates = [r.username for r in unique if r.username not in already]
+        free = len(candidates) if capacity is None else max(capacity - registered_count, 0)
+        accepted = set(candidates[:free])
+        if accepted:
+            await session.exec(insert(Registration),
+                               params=[{"username": u, "event_id": event_id} for u in candidates[:free]])
+            await session.exec(claim_seats_statement(event_id, len(accepted)))
+
+        """Pubblica gli utenti creati o aggiornati e le nuove registrazioni"""
+        await record(session,
+                     *(change("user", "put", r.username, r.model_dump(mode="json")) for r in unique),
+                     *(change("registration", "put", f"{u}/{event_id}", {"username": u, "event_id": event_id})
+                       for u in candidates[:free]))
+        await session.commit()
+
+    except HTTPException:
+        raise
+
+    except Exception as e:
+        await session.rollback()
+        raise HTTPException(status_code=500, detail=f"Error registering users: {e}")
+
+    """Invalida le risposte in cache degli utenti creati o aggiornati e dell'evento (posti)"""
+    response_cache.invalidate("users", *(f"user:{r.username}" for r in unique), "events", f"event:{event_id}")
+
+    results = []
+    for i, reg_req in enumerate(reg_reqs):
+        if first_index[reg_req.username] != i:
+            results.append(BulkItemResult(index=i, status=409, key=reg_req.username, detail="Duplicate in payload"))
+        elif reg_req.username in already:
+            results.append(BulkItemResult(index=i, status=409, key=reg_req.username, detail="Already registered"))
+        elif reg_req.username not in accepted:
+            results.append(BulkItemResult(index=i, status=409, key=reg_req.username, detail="Event is full"))
+        else:
+            results.append(BulkItemResult(index=i, status=201, key=reg_req.username))
+    return results
@@ -3,9 +3,52 @@ from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
 from app.config import config
 
+from sqlmodel import select
+
+from app.models.event import Event
+from app.models.registration import Registration
+from app.models.user import User
+from app.data.db import ReadSessionDep
+from app.data.pagination import paginate
+from app.cache import response_cache
+from app.data.changes import change_feed
+from app.static_assets import static_srcset, static_url
+
 
 router = APIRouter()
 templates = Jinja2Templates(directory=config.root_dir / "templates")
+templates.env.globals.update(static_url=static_url, static_srcset=static_srcset)
+
+# The pages are rendered on the server with the first page of their data, the
+# scripts only fetch the following pages and refresh after a change.
+# Every card / list is an HTML fragment kept in the response cache under the
+# same tags as the JSON responses, so the write paths invalidate both.
+# The pages then follow the change feed (GET /changes) from change_seq, read
+# before the data: deltas already in the page are applied again, none is lost.
+
+
+def render_fragment(name: str, **context) -> str:
+    return templates.get_template(f"fragments/{name}.html").render(**context)
+
+
+def event_card(event: Event, generation: int) -> str:
+    html = response_cache.fragment(f"event_card:{event.id}")
+    if html is None:
+        html = response_cache.store_fragment(
+            f"event_card:{event.id}", render_fragment("event_card", event=event),
+            [f"event:{event.id}", "event:*"], generation,
+        )
+    return html
+
+
+def user_card(user: User, generation: int) -> str:
+    html = response_cache.fragment(f"user_card:{user.username}")
+    if html is None:
+        html = response_cache.store_fragment(
+            f"user_card:{user.username}", render_fragment("user_card", user=user),
+            [f"user:{user.username}", "user:*"], generation,
+        )
+    return html
 
 
 @router.get("/", response_class=HTMLResponse)
@@ -16,22 +59,87 @@ async def home(request: Request):
 
 
 @router.get("/events_list", response_class=HTMLResponse)
-async def events_list(request: Request):
+async def events_list(request: Request, session: ReadSessionDep):
+    change_seq = change_feed.last_seq
+    # First page of the list: the cards (each one cached on its own) and the next cursor
+    page = response_cache.fragment("events_page")
+    next_cursor = response_cache.fragment("events_page:cursor")
+    if page is None or next_cursor is None:
+        generation = response_cache.generation
+        events, cursor = await paginate(session, select(Event), (Event.id,), False, None, config.default_page_size)
+        page = response_cache.store_fragment(
+            "events_page", "".join(event_card(event, generation) for event in events), ["events"], generation)
+        next_cursor = response_cache.store_fragment("events_page:cursor", cursor or "", ["events"], generation)
+
     return templates.TemplateResponse(
         request=request, name="events.html",
+        context={"events_html": page, "next_cursor": next_cursor or None, "change_seq": change_seq},
     )
 
 
 @router.get("/event_detail/{id}", response_class=HTMLResponse)
-async def event_detail(request: Request, id: int):
+async def event_detail(request: Request, session: ReadSessionDep, id: int):
+    change_seq = change_feed.last_seq
+    generation = response_cache.generation
+
+    # Event details and update form filled in with the current values
+    details = response_cache.fragment(f"event_details:{id}")
+    form = response_cache.fragment(f"event_form:{id}")
+    if details is None or form is None:
+        # "SELECT * FROM event WHERE id = id"
+        event = await session.get(Event, id)
+        if event is None:
+            return templates.TemplateResponse(
+                request=request, name="event_detail.html", status_code=404,
+                context={"event_id": id, "details_html": None, "next_cursor": None, "change_seq": change_seq},
+            )
+        tags = [f"event:{id}", "event:*"]
+        details = response_cache.store_fragment(
+            f"event_details:{id}", render_fragment("event_details", event=event), tags, generation)
+        form = response_cache.store_fragment(
+            f"event_form:{id}", render_fragment("event_form", event=event), tags, generation)
+
+    # First page of the registrations, invalidated with the event (registration writes drop event:{id})
+    registrations_html = response_cache.fragment(f"event_registrations:{id}")
+    next_cursor = response_cache.fragment(f"event_registrations:{id}:cursor")
+    if registrations_html is None or next_cursor is None:
+        statement = select(Registration).where(Registration.event_id == id)
+        registrations, cursor = await paginate(
+            session, statement, (Registration.username,), False, None, config.default_page_size)
+        registrations_html = response_cache.store_fragment(
+            f"event_registrations:{id}",
+            "".join(render_fragment("registration_item", registration=r) for r in registrations),
+            [f"event:{id}", "event:*"], generation,
+        )
+        next_cursor = response_cache.store_fragment(
+            f"event_registrations:{id}:cursor", cursor or "", [f"event:{id}", "event:*"], generation)
+
     return templates.TemplateResponse(
         request=request, name="event_detail.html",
-        context={"event_id": id},
+        context={
+            "event_id": id,
+            "details_html": details,
+            "form_html": form,
+            "registrations_html": registrations_html,
+            "next_cursor": next_cursor or None,
+            "change_seq": change_seq,
+        },
     )
 
 
 @router.get("/users_list", response_class=HTMLResponse)
-async def users_list(request: Request):
+async def users_list(request: Request, session: ReadSessionDep):
+    change_seq = change_feed.last_seq
+    page = response_cache.fragment("users_page")
+    next_cursor = response_cache.fragment("users_page:cursor")
+    if page is None or next_cursor is None:
+        generation = response_cache.generation
+        users, cursor = await paginate(session, select(User), (User.username,), False, None, config.default_page_size)
+        page = response_cache.store_fragment(
+            "users_page", "".join(user_card(user, generation) for user in users), ["users"], generation)
+        next_cursor = response_cache.store_fragment("users_page:cursor", cursor or "", ["users"], generation)
+
     return templates.TemplateResponse(
-        request=request, name="users.html"
+        request=request, name="users.html",
+        context={"users_html": page, "next_cursor": next_cursor or None, "change_seq": change_seq},
     )
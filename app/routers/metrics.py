@@ -0,0 +1,16 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.metrics import render
+
+
+router = APIRouter()
+
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics() -> PlainTextResponse:
+    '''
+    \nRequest latency, SQL statements per request, N+1 and slow query counters
+    in the Prometheus text format.
+    '''
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4; charset=utf-8")
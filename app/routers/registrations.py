@@ -1,25 +1,69 @@
-from fastapi import APIRouter, HTTPException, Response, Depends
+from fastapi import APIRouter, HTTPException, Request, Response, Depends, Query
+from fastapi.responses import StreamingResponse
 from sqlmodel import SQLModel
-from sqlmodel import Session, select
-from typing import List
+from sqlmodel import Session, select, delete
+from typing import List, Annotated
+from app.config import config
 from app.models.user import User
 from app.models.event import Event
 from app.models.registration import Registration
-from app.data.db import SessionDep
+from app.data.db import SessionDep, ReadSessionDep
+from app.data.pagination import paginate, parse_sort, set_next_cursor
+from app.data.export import ExportFormat, export_response
+from app.data.changes import change, record
+from app.cache import response_cache
+from app.encoding import Rows, respond, table_columns
+from app.data.fields import FIELDS_DESCRIPTION, select_fields
 
 """Creiamo un router con prefisso /events per le rotte di registrazione"""
 router = APIRouter(prefix="/registrations", tags=["registrations"])
 
+"""Ordinamenti ammessi: ogni chiave termina con la primary key (tie-breaker del keyset)"""
+REGISTRATION_SORTS = {
+    "username": (Registration.username, Registration.event_id),
+    "event_id": (Registration.event_id, Registration.username),
+}
+
 """GET - /registrations"""
 @router.get("/",response_model=List[Registration])
-async def get_registrations(session: SessionDep):
+async def get_registrations(session: ReadSessionDep,
+                            request: Request,
+                            response: Response,
+                            limit: Annotated[int, Query(ge=1, le=config.max_page_size)] = config.default_page_size,
+                            cursor: Annotated[str | None, Query(description="X-Next-Cursor della pagina precedente")] = None,
+                            sort: Annotated[str, Query(description="username, event_id (prefisso '-' per ordine decrescente)")] = "username",
+                            username: Annotated[str | None, Query(description="Solo le registrazioni di questo utente")] = None,
+                            event_id: Annotated[int | None, Query(description="Solo le registrazioni a questo evento")] = None,
+                            fields: Annotated[str | None, Query(description=FIELDS_DESCRIPTION)] = None):
+    """
+        Restituisce una pagina delle registrazioni presenti nel database.
+        1) Esegue una query sulla tabella 'Registration', filtrata per utente e/o evento,
+           leggendo solo i campi di ?fields= (e le colonne dell'ordinamento, per il cursore).
+        2) Ritorna la pagina richiesta (JSON o MessagePack secondo l'header Accept);
+           gli header X-Next-Cursor / Link puntano alla successiva.
+    """
+    sort_columns, descending = parse_sort(sort, REGISTRATION_SORTS)
+    statement, keys = select_fields(Registration, fields, sort_columns)
+    if username is not None:
+        statement = statement.where(Registration.username == username)
+    if event_id is not None:
+        statement = statement.where(Registration.event_id == event_id)
+
+    registrations, next_cursor = await paginate(session, statement, sort_columns, descending, cursor, limit)
+    set_next_cursor(request, response, next_cursor)
+    return respond(request, Rows(registrations, keys), dict(response.headers))
+
+"""GET - /registrations/export"""
+@router.get("/export")
+async def export_registrations(format: Annotated[ExportFormat, Query(description="ndjson o csv")] = ExportFormat.ndjson
+                              ) -> StreamingResponse:
     """
-        Restituisce tutte le registrazioni presenti nel database.
-        1) Esegue una query sulla tabella 'Registration'.
-        2) Ritorna la lista completa delle registrazioni.
+        Restituisce tutte le registrazioni in streaming (NDJSON o CSV), nell'ordine della primary key.
+        La tabella viene letta a blocchi con un cursore lato server.
     """
-    registrations = session.exec(select(Registration)).all()
-    return registrations
+    """Tutte le colonne della tabella, nell'ordine della primary key"""
+    return export_response(table_columns(Registration), [Registration.username, Registration.event_id],
+                           format, "registrations")
 
 """DELETE - /registrations/?username={username}&event_id={event_id}"""
 @router.delete("/",response_model=str)
@@ -29,14 +73,23 @@ async def delete_registrations(username: str, event_id: int, session: SessionDep
     Elimina la registrazione di un utente per un determinato evento.Se la registrazione non esiste, restituisce errore 404.
     - Altrimenti elimina la registrazione e restituisce 204 No Content.
     """
-    """ variabile che salva 'username' ed 'event_id' come parametri della richiesta"""
-    request = (username, event_id)
-    registration = session.get(Registration, request)
+    """Un solo DELETE ... RETURNING: se due richieste cancellano la stessa registrazione,
+    solo una riceve la riga (e pubblica il delta nel change feed), l'altra riceve 404"""
+    deleted = (await session.exec(
+        delete(Registration)
+        .where(Registration.username == username, Registration.event_id == event_id)
+        .returning(Registration.username)
+        .execution_options(synchronize_session=False)
+    )).first()
     """Se la registrazione non esiste, restituisce errore 404. """
-    if not registration:
+    if deleted is None:
+        await session.rollback()
         raise HTTPException(status_code=404, detail="Registration not found")
-    
-    """elimina la registrazione"""
-    session.delete(registration)
-    session.commit()
+
+    """pubblica la cancellazione nel change feed"""
+    await record(session, change("registration", "delete", f"{username}/{event_id}",
+                                 {"username": username, "event_id": event_id}))
+    await session.commit()
+    """Il trigger registration_count_ad ha liberato il posto: invalida l'evento in cache"""
+    response_cache.invalidate("events", f"event:{event_id}")
     return "the registration is successfully deleted"
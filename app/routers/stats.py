@@ -0,0 +1,122 @@
+from datetime import date, datetime, timedelta, timezone
+from typing import Annotated, List, Literal
+
+from fastapi import APIRouter, HTTPException, Query
+from sqlmodel import select
+
+from app.config import config
+from app.data.db import ReadSessionDep
+from app.data.stats import event_stats, stats_day, stats_location, stats_total
+from app.models.event import Event
+from app.models.stats import DayStats, EventStats, LocationStats, StatsTotals
+
+
+router = APIRouter(prefix="/stats", tags=["stats"])
+
+# Days returned by GET /stats/registrations/daily without a range
+DEFAULT_DAYS = 30
+
+
+# GET /stats
+@router.get("/", response_model=StatsTotals)
+async def get_totals(session: ReadSessionDep) -> StatsTotals:
+    '''
+    \nReturns the number of events, users and registrations.
+
+    Args:
+        session: Database session
+
+    Return value:
+        the totals (three rows of stats_total, no count(*) over the tables)
+    '''
+    totals = dict((await session.exec(select(stats_total.c.name, stats_total.c.value))).all())
+    return StatsTotals(events=totals.get("events", 0), users=totals.get("users", 0),
+                       registrations=totals.get("registrations", 0))
+
+
+# GET /stats/events
+@router.get("/events", response_model=List[EventStats])
+async def get_events_stats(session: ReadSessionDep,
+                           limit: Annotated[int, Query(ge=1, le=config.max_page_size)] = config.default_page_size
+                          ) -> List[EventStats]:
+    '''
+    \nReturns the events with the most registrations first.
+
+    Args:
+        session: Database session
+        limit: number of events
+
+    Return value:
+        registrations, seats left and fill rate of each event (``limit`` rows
+        read backwards from ix_event_registered_count)
+    '''
+    rows = (await session.exec(
+        select(Event.id, Event.title, Event.location, Event.capacity, Event.registered_count)
+        .order_by(Event.registered_count.desc(), Event.id.desc())
+        .limit(limit)
+    )).all()
+    return [event_stats(*row) for row in rows]
+
+
+# GET /stats/locations
+@router.get("/locations", response_model=List[LocationStats])
+async def get_locations_stats(session: ReadSessionDep,
+                              limit: Annotated[int, Query(ge=1, le=config.max_page_size)] = config.default_page_size,
+                              sort: Annotated[Literal["registrations", "events"],
+                                              Query(description="Most registrations or most events first")] = "registrations"
+                             ) -> List[LocationStats]:
+    '''
+    \nReturns the most popular locations.
+
+    Args:
+        session: Database session
+        limit: number of locations
+        sort: registrations or events
+
+    Return value:
+        events and registrations of each location (``limit`` rows of an index
+        of stats_location)
+    '''
+    count = stats_location.c[sort]
+    rows = (await session.exec(
+        select(stats_location.c.location, stats_location.c.events, stats_location.c.registrations)
+        .order_by(count.desc(), stats_location.c.location.desc())
+        .limit(limit)
+    )).all()
+    return [LocationStats(location=location, events=events, registrations=registrations)
+            for location, events, registrations in rows]
+
+
+# GET /stats/registrations/daily
+@router.get("/registrations/daily", response_model=List[DayStats])
+async def get_daily_registrations(session: ReadSessionDep,
+                                  date_from: Annotated[date | None, Query(description="First day (default: 30 days before date_to)")] = None,
+                                  date_to: Annotated[date | None, Query(description="Last day (default: today, UTC)")] = None
+                                 ) -> List[DayStats]:
+    '''
+    \nReturns the registrations made and removed per day. Days without any are
+    left out.
+
+    Args:
+        session: Database session
+        date_from, date_to: range of days, both included
+
+    Return value:
+        one row per day, oldest first (range scan of stats_day)
+
+    Raises:
+        HTTPException 422 if date_from is after date_to
+    '''
+    # stats_day is keyed on SQLite's date('now'), a UTC day
+    date_to = date_to or datetime.now(timezone.utc).date()
+    date_from = date_from or date_to - timedelta(days=DEFAULT_DAYS - 1)
+    if date_from > date_to:
+        raise HTTPException(status_code=422, detail="date_from must not be after date_to")
+
+    rows = (await session.exec(
+        select(stats_day.c.day, stats_day.c.registered, stats_day.c.cancelled)
+        .where(stats_day.c.day >= date_from.isoformat())
+        .where(stats_day.c.day <= date_to.isoformat())
+        .order_by(stats_day.c.day)
+    )).all()
+    return [DayStats(day=day, registered=registered, cancelled=cancelled) for day, registered, cancelled in rows]
@@ -1,11 +1,21 @@
 """Creiamo un router FastAPI dedicato agli endpoint /users"""
 
-from fastapi import APIRouter, Depends, HTTPException, Response
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, Query, Body
+from fastapi.responses import StreamingResponse
+from typing import List, Annotated
+from app.config import config
 from sqlmodel import select, Session, delete
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from app.models.user import User, UserCreate
 from app.models.registration import Registration
-from app.data.db import SessionDep
+from app.models.bulk import BulkItemResult
+from app.data.db import SessionDep, ReadSessionDep
+from app.data.pagination import paginate, parse_sort, set_next_cursor
+from app.data.export import ExportFormat, export_response
+from app.data.changes import change, record
+from app.cache import response_cache
+from app.encoding import Rows, respond, table_columns
+from app.data.fields import FIELDS_DESCRIPTION, select_fields
 
 """prefix="/users" indica che tutte le rotte partiranno con /users
 tags=["users"] serve per raggruppare le rotte nella documentazione Swagger"""
@@ -14,21 +24,44 @@ router = APIRouter(prefix="/users", tags=["users"])
 
 
 
+"""Ordinamenti ammessi: ogni chiave termina con la primary key (tie-breaker del keyset)"""
+USER_SORTS = {
+    "username": (User.username,),
+    "name": (User.name, User.username),
+}
+
 """GET /users"""
 @router.get("/", response_model=List[User])
-async def list_users(session: SessionDep) -> List[User]:  
-    """Usa la dependency get_session per ottenere una Session SQLModel"""
+async def list_users(session: ReadSessionDep,
+                     request: Request,
+                     response: Response,
+                     limit: Annotated[int, Query(ge=1, le=config.max_page_size)] = config.default_page_size,
+                     cursor: Annotated[str | None, Query(description="X-Next-Cursor della pagina precedente")] = None,
+                     sort: Annotated[str, Query(description="username, name (prefisso '-' per ordine decrescente)")] = "username",
+                     fields: Annotated[str | None, Query(description=FIELDS_DESCRIPTION)] = None
+                    ) -> List[User]:
     """
     GET /users
-    Restituisce la lista di tutti gli utenti presenti nel database.
+    Restituisce una pagina degli utenti presenti nel database.
     - Usa la dependency get_session per ottenere una Session SQLModel.
-    - Esegue SELECT * FROM user
-    - Ritorna i risultati come lista di oggetti User.
+    - Esegue SELECT * FROM user (solo i campi di ?fields=, piu' le colonne
+      dell'ordinamento per il cursore) con paginazione keyset (niente OFFSET).
+    - Ritorna i risultati come lista di utenti (righe codificate senza creare
+      oggetti User, JSON o MessagePack secondo l'header Accept); gli header
+      X-Next-Cursor / Link puntano alla pagina successiva.
     """
-    """Costruisci la query per selezionare tutti i record User"""
-    users = session.exec(select(User)).all()
-    """Converte il risultato in una lista Python e restituisce"""
-    return list(users)
+    sort_columns, descending = parse_sort(sort, USER_SORTS)
+    statement, keys = select_fields(User, fields, sort_columns)
+
+    """Risposta dalla cache se presente (304 se la copia del client e' ancora valida)"""
+    cached = response_cache.lookup(request)
+    if cached is not None:
+        return cached
+    generation = response_cache.generation
+
+    users, next_cursor = await paginate(session, statement, sort_columns, descending, cursor, limit)
+    set_next_cursor(request, response, next_cursor)
+    return response_cache.store(request, Rows(users, keys), ["users"], generation, dict(response.headers))
 
 
 
@@ -48,24 +81,76 @@ async def create_user(new_user: UserCreate, session: SessionDep) -> User:
         """
 
     """Controllo di unicità dello username"""
-    existing_user = session.exec(select(User).where(User.username == new_user.username)).first()
+    existing_user = (await session.exec(select(User).where(User.username == new_user.username))).first()
     if existing_user:
         raise HTTPException(status_code=400, detail="Username already exists")
 
     '''Crea nuovo oggetto User'''
-    user = User(**new_user.dict())
-    """Aggiunge il nuovo utente alla sessione"""
+    user = User(**new_user.model_dump())
+    """Aggiunge il nuovo utente alla sessione e lo pubblica nel change feed"""
     session.add(user)
+    await record(session, change("user", "put", user.username, user.model_dump(mode="json")))
     """Salva le modifiche sul database"""
-    session.commit()
+    await session.commit()
     """Ricarica l'istanza per ottenere eventuali valori generati (non applicabile per User)"""
-    session.refresh(user)
+    await session.refresh(user)
+    """Invalida le liste di utenti in cache"""
+    response_cache.invalidate("users")
 
     """Restituisce l'utente creato"""
     return user
 
 
 
+"""POST /users/bulk Crea molti utenti in un'unica transazione"""
+@router.post("/bulk", response_model=List[BulkItemResult])
+async def create_users_bulk(new_users: Annotated[List[UserCreate], Body(min_length=1, max_length=config.bulk_max_items)],
+                            session: SessionDep) -> List[BulkItemResult]:
+    """
+        - Il body e' una lista di oggetti con i campi di User (validata per intero prima di scrivere).
+        - Gli utenti vengono inseriti con un solo INSERT ... ON CONFLICT(username) DO NOTHING
+          RETURNING username e un solo commit: gli username gia' presenti nel DB (anche se
+          inseriti da una richiesta concorrente) non tornano dal RETURNING e ricevono 409,
+          cosi' come i duplicati all'interno del payload.
+        - Restituisce un risultato per ogni elemento, nell'ordine del payload.
+        """
+
+    """Duplicati nel payload: vale la prima occorrenza di ogni username"""
+    first_index: dict[str, int] = {}
+    for i, user in enumerate(new_users):
+        first_index.setdefault(user.username, i)
+
+    try:
+        """Un solo statement: il controllo di unicita' e l'inserimento avvengono sotto lo stesso lock
+        di scrittura, quindi due richieste concorrenti non possono inserire lo stesso username"""
+        rows = [new_users[i].model_dump() for i in first_index.values()]
+        statement = (sqlite_insert(User.__table__)
+                     .on_conflict_do_nothing(index_elements=[User.__table__.c.username])
+                     .returning(User.__table__.c.username))
+        created = {row[0] for row in (await session.exec(statement, params=rows)).all()}
+        await record(session, *(change("user", "put", row["username"], row)
+                                for row in rows if row["username"] in created))
+        await session.commit()
+
+    except Exception as e:
+        await session.rollback()
+        raise HTTPException(status_code=500, detail=f"Error creating users: {e}")
+
+    """Invalida le liste di utenti in cache"""
+    response_cache.invalidate("users")
+
+    results = []
+    for i, user in enumerate(new_users):
+        if first_index[user.username] != i:
+            results.append(BulkItemResult(index=i, status=409, key=user.username, detail="Duplicate in payload"))
+        elif user.username not in created:
+            results.append(BulkItemResult(index=i, status=409, key=user.username, detail="Username already exists"))
+        else:
+            results.append(BulkItemResult(index=i, status=201, key=user.username))
+    return results
+
+
+
 """DELETE /users"""
 @router.delete("/", response_model=str)
 async def delete_all_users(session: SessionDep) -> None:
@@ -76,29 +161,50 @@ async def delete_all_users(session: SessionDep) -> None:
     - Commita la transazione.
     - Restituisce 204 No Content.
     """
-    """Elimina prima tutte le registrazioni"""
-    session.exec(delete(Registration))
-    """Esegue DELETE FROM user"""
-    session.exec(delete(User))
-    """Esegue DELETE FROM user"""
-    session.commit()
+    """Esegue DELETE FROM user, le registrazioni vengono eliminate in cascata (ON DELETE CASCADE)"""
+    await session.exec(delete(User))
+    await record(session, change("user", "clear"))
+    await session.commit()
+    """Invalida tutte le risposte in cache sugli utenti e sugli eventi (posti liberati)"""
+    response_cache.invalidate("users", "user:*", "events", "event:*")
     return "All users and related registrations successfully deleted"
 
 
 
+"""GET /users/export - Esporta tutti gli utenti (dichiarata prima di /users/{username})"""
+@router.get("/export")
+async def export_users(format: Annotated[ExportFormat, Query(description="ndjson o csv")] = ExportFormat.ndjson
+                      ) -> StreamingResponse:
+    """
+    GET /users/export?format=ndjson|csv
+    Restituisce tutti gli utenti in streaming, ordinati per username.
+    - Legge la tabella a blocchi con un cursore lato server: la memoria resta costante.
+    """
+    """Tutte le colonne della tabella: l'import di app.data.seed le rilegge cosi' come sono"""
+    return export_response(table_columns(User), [User.username], format, "users")
+
+
+
 """GET /users/{username} - Restituisce un singolo utente"""
 @router.get("/{username}", response_model=User)
-async def created_user(session: SessionDep, username: str):
+async def created_user(session: ReadSessionDep, request: Request, username: str,
+                       fields: Annotated[str | None, Query(description=FIELDS_DESCRIPTION)] = None):
     """
         GET /users/{username}
         Cerca un utente per username.
-        - Se esiste, lo restituisce.
+        - Se esiste, lo restituisce (dalla cache quando possibile), con i soli campi di ?fields=.
         - Se non esiste, solleva HTTP 404.
     """
-    user = session.get(User,username)
+    statement, keys = select_fields(User, fields)
+    cached = response_cache.lookup(request)
+    if cached is not None:
+        return cached
+    generation = response_cache.generation
+
+    user = (await session.exec(statement.where(User.username == username))).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    return user
+    return response_cache.store(request, dict(zip(keys, user)), [f"user:{username}", "user:*"], generation)
 
 
 
@@ -111,17 +217,40 @@ async def delete_user(username: str, session: SessionDep):
     - Se l'utente non esiste, solleva HTTP 404.
     - Altrimenti elimina e restituisce 204 No Content.
     """
-    user = session.get(User, username)
-    if not user:
+    """Un solo DELETE: le registrazioni dell'utente vengono eliminate in cascata (ON DELETE CASCADE)"""
+    result = await session.exec(delete(User).where(User.username == username))
+    if result.rowcount == 0:
+        await session.rollback()
         raise HTTPException(status_code=404, detail="User not found")
-    
-    """Cancella prima le registrazioni legate all'utente"""
-    registrations = session.exec(select(Registration).where(Registration.username == username)).all()
-    for reg in registrations:
-        session.delete(reg)
-
-    """elimina l'utente"""
-    session.delete(user)
-    session.commit()
+    await record(session, change("user", "delete", username))
+    await session.commit()
+    """Invalida le liste di utenti, l'utente eliminato e gli eventi (posti liberati) in cache"""
+    response_cache.invalidate("users", f"user:{username}", "events", "event:*")
     return  f"User '{username}' successfully deleted"
 
+
+
+"""GET /users/{username}/registrations - Registrazioni di un singolo utente"""
+@router.get("/{username}/registrations", response_model=List[Registration])
+async def list_user_registrations(session: ReadSessionDep,
+                                  request: Request,
+                                  response: Response,
+                                  username: str,
+                                  limit: Annotated[int, Query(ge=1, le=config.max_page_size)] = config.default_page_size,
+                                  cursor: Annotated[str | None, Query(description="X-Next-Cursor della pagina precedente")] = None,
+                                  fields: Annotated[str | None, Query(description=FIELDS_DESCRIPTION)] = None
+                                 ) -> List[Registration]:
+    """
+    GET /users/{username}/registrations
+    Restituisce una pagina delle registrazioni dell'utente, ordinate per event_id.
+    - Se l'utente non esiste, solleva HTTP 404.
+    - La query e' un range scan sulla primary key (username, event_id).
+    """
+    statement, keys = select_fields(Registration, fields, (Registration.event_id,))
+    if not await session.get(User, username):
+        raise HTTPException(status_code=404, detail="User not found")
+
+    statement = statement.where(Registration.username == username)
+    registrations, next_cursor = await paginate(session, statement, (Registration.event_id,), False, cursor, limit)
+    set_next_cursor(request, response, next_cursor)
+    return respond(request, Rows(registrations, keys), dict(response.headers))
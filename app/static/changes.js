@@ -0,0 +1,36 @@
+// Live change feed (GET /changes, Server-Sent Events).
+// onChange(delta) is called for every create / update / delete committed on the
+// server after sequence number `since`: {seq, entity, op, key, data} with entity
+// event, user or registration and op put, delete or clear.
+// onReset() is called when deltas were lost (resume point too old): the page
+// must reload its data. EventSource reconnects and resumes (Last-Event-ID) on its own.
+function subscribeChanges(since, onChange, onReset) {
+  const source = new EventSource(since === null ? '/changes' : `/changes?since=${since}`);
+  source.addEventListener('change', e => onChange(JSON.parse(e.data)));
+  source.addEventListener('reset', () => onReset());
+  return source;
+}
+
+// Text of the deltas and API responses goes into HTML templates: escape it
+function escapeHtml(value) {
+  return String(value ?? '').replace(/[&<>"']/g, c => ({
+    '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'
+  })[c]);
+}
+
+// Inserts `element` among the children of `container` carrying `attribute`, in
+// ascending order of that attribute. Returns false (nothing inserted) when it sorts
+// after the last loaded child and more pages are still to be loaded.
+function insertSorted(container, element, attribute, moreToLoad) {
+  const value = element.getAttribute(attribute);
+  const siblings = [...container.querySelectorAll(`:scope > [${attribute}]`)];
+  const next = siblings.find(s => s.getAttribute(attribute) > value);
+  if (next) {
+    container.insertBefore(element, next);
+  } else if (!moreToLoad) {
+    container.appendChild(element);
+  } else {
+    return false;
+  }
+  return true;
+}
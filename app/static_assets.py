@@ -0,0 +1,345 @@
+"""Static asset pipeline: content-hashed names, precompression, image variants.
+
+``build()`` walks the static directory and writes into ``config.static_build_dir``:
+
+- a copy of every file under a content-hashed name (``styles.3f2a9c1b0d4e.css``),
+  which never changes meaning and can be cached by clients for a year;
+- gzip and brotli variants of the compressible files, kept only when smaller
+  than the original;
+- resized copies of the raster images, in their own format and in WebP, for
+  the templates' ``srcset``.
+
+brotli and Pillow are in requirements.txt; an install without them still
+works, with gzip only and images served as is (a warning says so once).
+
+Output names are derived from the hash of the source file, so an up-to-date
+build only hashes the sources and is cheap enough to run at every startup
+(``python -m app.static_assets`` builds ahead of time, e.g. in a deploy step).
+
+``AssetFiles`` serves the hashed names from the build with
+``Cache-Control: immutable`` and picks the encoding from Accept-Encoding. Plain
+names still come from the static directory and are revalidated (ETag).
+Templates get URLs through the ``static_url`` / ``static_srcset`` globals.
+"""
+
+import gzip
+import hashlib
+import io
+import json
+import logging
+import mimetypes
+import os
+import tempfile
+from dataclasses import asdict, dataclass, field
+from functools import cache
+from pathlib import Path
+
+from jinja2 import pass_context
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+from app.config import config
+
+try:
+    import brotli
+except ImportError:   # optional, gzip only
+    brotli = None
+
+try:
+    from PIL import Image
+except ImportError:   # optional, no image variants
+    Image = None
+
+
+logger = logging.getLogger("app.static_assets")
+
+MANIFEST_NAME = "manifest.json"
+HASH_LENGTH = 12
+COMPRESSIBLE_TYPES = {"application/javascript", "application/json", "application/xml", "image/svg+xml"}
+# Content-Encoding -> file suffix, in order of preference
+ENCODINGS = {"br": ".br", "gzip": ".gz"}
+# Raster formats Pillow can resize: format -> (Pillow format name, save options)
+IMAGE_FORMATS = {
+    "image/jpeg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+    "image/png": ("PNG", {"optimize": True}),
+    "image/webp": ("WEBP", {"quality": 80, "method": 6}),
+}
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+@cache
+def _warn_missing_packages() -> None:
+    missing = [name for name, module in (("brotli", brotli), ("Pillow", Image)) if module is None]
+    if missing:
+        logger.warning("static assets: %s not installed, no %s (pip install -r requirements.txt)",
+                       " and ".join(missing),
+                       " and ".join({"brotli": ".br files", "Pillow": "image variants"}[name] for name in missing))
+
+
+@dataclass
+class Asset:
+    name: str                   # file name in the build directory
+    media_type: str
+    width: int | None = None    # image variants only
+    # Content-Encoding -> file name of the precompressed copy
+    encodings: dict[str, str] = field(default_factory=dict)
+    variants: list["Asset"] = field(default_factory=list)
+
+
+class StaticAssets:
+    def __init__(self):
+        # source path ("styles.css") -> asset
+        self.assets: dict[str, Asset] = {}
+        # hashed name -> asset (originals and image variants)
+        self._by_name: dict[str, Asset] = {}
+
+    @property
+    def build_dir(self) -> Path:
+        return config.static_build_dir
+
+    def build(self, source_dir: Path | None = None) -> None:
+        '''
+        \nBuilds the hashed, precompressed and resized copies of the files of
+        ``source_dir`` that are not in the build directory yet, removes the
+        stale ones and loads the manifest.
+
+        Args:
+            source_dir: directory of the sources (default: <root_dir>/static)
+        '''
+        source_dir = Path(source_dir or config.root_dir / "static")
+        build_dir = self.build_dir
+        _warn_missing_packages()
+        build_dir.mkdir(parents=True, exist_ok=True)
+
+        assets = {}
+        for source in sorted(source_dir.rglob("*")):
+            if source.is_file() and not source.name.startswith("."):
+                assets[source.relative_to(source_dir).as_posix()] = _build_asset(source, source_dir, build_dir)
+
+        keep = {MANIFEST_NAME}
+        for asset in assets.values():
+            for built in (asset, *asset.variants):
+                keep.add(built.name)
+                keep.update(built.encodings.values())
+        for stale in build_dir.rglob("*"):
+            # .tmp- files are being written by another worker
+            if stale.is_file() and not stale.name.startswith(".tmp-") \
+                    and stale.relative_to(build_dir).as_posix() not in keep:
+                stale.unlink()
+
+        _write_atomic(build_dir / MANIFEST_NAME, json.dumps(
+            {path: asdict(asset) for path, asset in assets.items()}, indent=2).encode())
+        self._load(assets)
+        logger.info("static assets: %d files built in %s", len(assets), build_dir)
+
+    def _load(self, assets: dict[str, Asset]) -> None:
+        by_name = {}
+        for asset in assets.values():
+            for built in (asset, *asset.variants):
+                by_name[built.name] = built
+        self.assets, self._by_name = assets, by_name
+
+    def by_name(self, name: str) -> Asset | None:
+        return self._by_name.get(name)
+
+    def url_path(self, path: str) -> str:
+        '''
+        \nPath (relative to the static mount) to serve ``path`` from: its hashed
+        name when it has been built, ``path`` itself otherwise.
+        '''
+        asset = self.assets.get(path)
+        return path if asset is None else asset.name
+
+    def srcset_paths(self, path: str, media_type: str | None = None) -> list[tuple[str, int]]:
+        '''
+        \nThe resized variants of the image ``path`` as (hashed name, width),
+        smallest first.
+
+        Args:
+            path: source path of the image ("home.jpeg")
+            media_type: format of the variants (default: the format of the image)
+        '''
+        asset = self.assets.get(path)
+        if asset is None:
+            return []
+        media_type = media_type or asset.media_type
+        return [(variant.name, variant.width) for variant in asset.variants if variant.media_type == media_type]
+
+
+static_assets = StaticAssets()
+
+
+# Build ----------------------------------------------------------------------------
+
+def _media_type(path: Path) -> str:
+    return mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+
+
+def _hashed_name(relative: Path, digest: str, suffix: str | None = None, width: int | None = None) -> str:
+    # css/styles.css -> css/styles.<digest>.css, home.jpeg -> home.<digest>.960w.webp
+    parts = [relative.stem, digest] + ([f"{width}w"] if width else [])
+    return (relative.parent / ".".join(parts)).as_posix() + (suffix or relative.suffix)
+
+
+def _write_atomic(target: Path, data: bytes) -> None:
+    # Several workers can build at the same time: readers never see a partial file
+    target.parent.mkdir(parents=True, exist_ok=True)
+    fd, temporary = tempfile.mkstemp(dir=target.parent, prefix=".tmp-")
+    with os.fdopen(fd, "wb") as file:
+        file.write(data)
+    os.chmod(temporary, 0o644)   # mkstemp creates 0600 files
+    os.replace(temporary, target)
+
+
+def _build_asset(source: Path, source_dir: Path, build_dir: Path) -> Asset:
+    data = source.read_bytes()
+    relative = source.relative_to(source_dir)
+    digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+    asset = Asset(name=_hashed_name(relative, digest), media_type=_media_type(source))
+
+    target = build_dir / asset.name
+    if not target.exists():
+        _write_atomic(target, data)
+
+    if len(data) >= config.static_compress_min_size and (
+            asset.media_type.startswith("text/") or asset.media_type in COMPRESSIBLE_TYPES):
+        asset.encodings = _compress(data, asset.name, build_dir)
+
+    if Image is not None and asset.media_type in IMAGE_FORMATS:
+        asset.variants = _image_variants(source, relative, digest, asset.media_type, build_dir)
+    return asset
+
+
+def _compress(data: bytes, name: str, build_dir: Path) -> dict[str, str]:
+    encodings = {}
+    for encoding, suffix in ENCODINGS.items():
+        if encoding == "br" and brotli is None:
+            continue
+        compressed_path = build_dir / (name + suffix)
+        if not compressed_path.exists():
+            if encoding == "br":
+                compressed = brotli.compress(data, quality=11)
+            else:
+                # mtime=0: the same source always gives the same bytes
+                compressed = gzip.compress(data, compresslevel=9, mtime=0)
+            if len(compressed) >= len(data):
+                continue
+            _write_atomic(compressed_path, compressed)
+        encodings[encoding] = name + suffix
+    return encodings
+
+
+def _image_variants(source: Path, relative: Path, digest: str, media_type: str, build_dir: Path) -> list[Asset]:
+    try:
+        with Image.open(source) as image:
+            image.load()
+    except (OSError, ValueError) as e:
+        logger.warning("static assets: no variants for %s (%s)", relative, e)
+        return []
+
+    variants = []
+    formats = [media_type] + (["image/webp"] if media_type != "image/webp" else [])
+    # The widths smaller than the image, plus the full width
+    widths = sorted({w for w in config.static_image_widths if w < image.width} | {image.width})
+    for width in widths:
+        for variant_type in formats:
+            suffix = relative.suffix if variant_type == media_type else mimetypes.guess_extension(variant_type)
+            name = _hashed_name(relative, digest, suffix, width)
+            target = build_dir / name
+            if not target.exists():
+                resized = image if width == image.width else image.resize(
+                    (width, round(image.height * width / image.width)), Image.LANCZOS)
+                pillow_format, options = IMAGE_FORMATS[variant_type]
+                if pillow_format == "JPEG" and resized.mode not in ("RGB", "L"):
+                    resized = resized.convert("RGB")
+                output = io.BytesIO()
+                resized.save(output, pillow_format, **options)
+                _write_atomic(target, output.getvalue())
+            variants.append(Asset(name=name, media_type=variant_type, width=width))
+    return variants
+
+
+# Serving --------------------------------------------------------------------------
+
+def _accepted_encodings(header: str) -> dict[str, float]:
+    accepted = {}
+    for item in header.split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding:
+            accepted[coding.strip().lower()] = quality
+    return accepted
+
+
+class AssetFiles(StaticFiles):
+    '''
+    \nStaticFiles serving the hashed names of ``static_assets`` from the build
+    directory (immutable, precompressed copy negotiated on Accept-Encoding)
+    and every other path from ``directory``, revalidated on each use.
+    '''
+
+    async def get_response(self, path, scope):
+        asset = static_assets.by_name(Path(path).as_posix())
+        if asset is None or scope["method"] not in ("GET", "HEAD"):
+            response = await super().get_response(path, scope)
+            response.headers.setdefault("Cache-Control", "no-cache")
+            return response
+
+        name, encoding = asset.name, None
+        if asset.encodings:
+            accepted = _accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+            for candidate in ENCODINGS:
+                if candidate in asset.encodings and accepted.get(candidate, accepted.get("*", 0)) > 0:
+                    name, encoding = asset.encodings[candidate], candidate
+                    break
+
+        full_path = static_assets.build_dir / name
+        try:
+            stat_result = os.stat(full_path)
+        except FileNotFoundError:
+            # Build removed under us (a newer deploy): the plain file is still right
+            return await super().get_response(path, scope)
+
+        headers = {"Cache-Control": IMMUTABLE}
+        if asset.encodings:
+            headers["Vary"] = "Accept-Encoding"
+        if encoding is not None:
+            headers["Content-Encoding"] = encoding
+        response = FileResponse(full_path, stat_result=stat_result, media_type=asset.media_type, headers=headers)
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+# Templates ------------------------------------------------------------------------
+
+@pass_context
+def static_url(context, path: str) -> str:
+    '''
+    \nURL of the static file ``path`` (its content-hashed copy when built).
+    '''
+    return str(context["request"].url_for("static", path=static_assets.url_path(path)))
+
+
+@pass_context
+def static_srcset(context, path: str, media_type: str | None = None) -> str:
+    '''
+    \n``srcset`` attribute value with the resized variants of the image
+    ``path``, empty when it has none (no Pillow, not an image...).
+    '''
+    request = context["request"]
+    return ", ".join(f"{request.url_for('static', path=name)} {width}w"
+                     for name, width in static_assets.srcset_paths(path, media_type))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    static_assets.build()
@@ -0,0 +1,124 @@
+"""Admission control: read latency of a well-behaved client while another floods writes.
+
+Runs the app in process (httpx's ASGI transport) with two clients, told
+apart by their peer address:
+
+- the flooder: ``--writers`` concurrent loops of POST /events, as fast as
+  the app answers (waiting Retry-After when refused), for ``--duration``
+  seconds
+- the reader: GET /events?limit=50 ``--read-rate`` times per second, within
+  its rate limit, for the same time (each created event invalidates the
+  cached page, so most reads hit SQLite)
+
+Runs once per mode:
+
+- ``off``: ``config.rate_limit_enabled = False``, every write is admitted
+- ``on``: the limits of ``config.rate_limits`` and ``config.write_concurrency``
+
+Prints the p50 / p99 latency of the reads, and the writes per second with
+their status counts (429 and 503 are the refused ones).
+
+Usage (from the repository root):
+
+    python -m benchmarks.bench_admission --writers 100 --duration 10
+"""
+
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+import httpx
+
+from app.config import config
+
+
+MODES = ["off", "on"]
+FLOODER = ("10.0.0.1", 40000)
+READER = ("10.0.0.2", 40000)
+
+
+async def flood(client: httpx.AsyncClient, writers: int, deadline: float) -> Counter:
+    statuses = Counter()
+    sequence = 0
+
+    async def writer() -> None:
+        nonlocal sequence
+        while time.perf_counter() < deadline:
+            sequence += 1
+            response = await client.post("/events/", json={
+                "title": f"Flood {sequence}", "description": "Write burst", "date": "2026-01-01T20:00:00",
+                "location": "Bench", "capacity": 100,
+            })
+            statuses[response.status_code] += 1
+            if response.status_code in (429, 503):
+                # The client runs in this process: retrying at once would
+                # measure its own CPU time, not the app's
+                await asyncio.sleep(min(float(response.headers["retry-after"]), deadline - time.perf_counter()))
+
+    await asyncio.gather(*(writer() for _ in range(writers)))
+    return statuses
+
+
+async def read(client: httpx.AsyncClient, rate: float, deadline: float) -> tuple[list[float], Counter]:
+    latencies, statuses = [], Counter()
+    next_read = time.perf_counter()
+    while next_read < deadline:
+        await asyncio.sleep(max(0.0, next_read - time.perf_counter()))
+        start = time.perf_counter()
+        response = await client.get("/events/", params={"limit": 50})
+        latencies.append(time.perf_counter() - start)
+        statuses[response.status_code] += 1
+        next_read += 1 / rate
+    return latencies, statuses
+
+
+async def run(args) -> dict:
+    from app.main import app
+
+    results = {}
+    async with app.router.lifespan_context(app):
+        flooder = httpx.AsyncClient(transport=httpx.ASGITransport(app=app, client=FLOODER),
+                                    base_url="http://bench", timeout=None)
+        reader = httpx.AsyncClient(transport=httpx.ASGITransport(app=app, client=READER),
+                                   base_url="http://bench", timeout=None)
+        async with flooder, reader:
+            for mode in args.modes:
+                config.rate_limit_enabled = mode == "on"
+                deadline = time.perf_counter() + args.duration
+                writes, (latencies, reads) = await asyncio.gather(flood(flooder, args.writers, deadline),
+                                                                  read(reader, args.read_rate, deadline))
+                results[mode] = (writes, latencies, reads)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--writers", type=int, default=100, help="concurrent write loops of the flooder")
+    parser.add_argument("--read-rate", type=float, default=50.0, help="reads per second of the reader")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per mode")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Before importing the app: its engines are bound to config.db_file on import
+        config.db_file = Path(tmp) / "admission.db"
+
+        results = asyncio.run(run(args))
+
+        print(f"{args.writers} write loops against {args.read_rate:.0f} reads/s, {args.duration:.0f} s per mode, "
+              f"limits {config.rate_limits}, {config.write_concurrency} write slots")
+        print(f"  {'mode':<6}{'reads':>10}{'p50 ms':>10}{'p99 ms':>10}{'writes/s':>10}   write statuses")
+        for mode, (writes, latencies, reads) in results.items():
+            latencies.sort()
+            p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+            print(f"  {mode:<6}{len(latencies):>10}{statistics.median(latencies) * 1000:>10.1f}"
+                  f"{p99 * 1000:>10.1f}{sum(writes.values()) / args.duration:>10.0f}"
+                  f"   {dict(sorted(writes.items()))}  reads {dict(sorted(reads.items()))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Latency of deleting an event with many registrations.
+
+Compares, on a scratch database using the engine profile of ``app.config``:
+
+- ``orm-row-by-row``: load every Registration of the event and ``session.delete``
+  each one, then delete the event (how delete_user used to cascade)
+- ``manual-set-based``: ``DELETE FROM registration WHERE event_id = ?`` followed
+  by the event delete (how delete_event_by_id used to cascade)
+- ``on-delete-cascade``: a single ``DELETE FROM event WHERE id = ?``, the
+  registrations go with it through the declared foreign key
+
+Usage (from the repository root):
+
+    python -m benchmarks.bench_cascade_delete --registrations 100000
+"""
+
+import argparse
+import statistics
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+from sqlalchemy import event as sa_event, func
+from sqlmodel import Session, SQLModel, create_engine, delete, select
+
+from app.data.db import apply_pragmas
+from app.models.event import Event
+from app.models.registration import Registration
+from app.models.user import User
+
+
+def build(db_path: Path, registrations: int):
+    engine = create_engine(f"sqlite:///{db_path}")
+    sa_event.listen(engine, "connect", lambda conn, _: apply_pragmas(conn))
+    SQLModel.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(Event.__table__.insert(), {
+            "id": 1, "title": "Popular", "description": "", "date": datetime(2025, 1, 1), "location": "Bench",
+        })
+        conn.execute(User.__table__.insert(),
+                     [{"username": f"user{i}", "name": f"User {i}", "email": f"user{i}@example.com"}
+                      for i in range(registrations)])
+        conn.execute(Registration.__table__.insert(),
+                     [{"username": f"user{i}", "event_id": 1} for i in range(registrations)])
+    return engine
+
+
+def orm_row_by_row(session: Session) -> None:
+    for reg in session.exec(select(Registration).where(Registration.event_id == 1)).all():
+        session.delete(reg)
+    session.delete(session.get(Event, 1))
+    session.commit()
+
+
+def manual_set_based(session: Session) -> None:
+    session.exec(delete(Registration).where(Registration.event_id == 1))
+    session.exec(delete(Event).where(Event.id == 1))
+    session.commit()
+
+
+def on_delete_cascade(session: Session) -> None:
+    session.exec(delete(Event).where(Event.id == 1))
+    session.commit()
+
+
+STRATEGIES = {
+    "orm-row-by-row": orm_row_by_row,
+    "manual-set-based": manual_set_based,
+    "on-delete-cascade": on_delete_cascade,
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--registrations", type=int, default=100_000)
+    parser.add_argument("--strategies", nargs="+", default=list(STRATEGIES), choices=list(STRATEGIES))
+    parser.add_argument("--repeat", type=int, default=3, help="runs per strategy (the median is reported)")
+    args = parser.parse_args()
+
+    timings: dict[str, list[float]] = {name: [] for name in args.strategies}
+    # Interleave the strategies so page cache and disk effects hit all of them alike
+    for _ in range(args.repeat):
+        for name in args.strategies:
+            with tempfile.TemporaryDirectory() as tmp:
+                engine = build(Path(tmp) / "bench.db", args.registrations)
+                with Session(engine) as session:
+                    start = time.perf_counter()
+                    STRATEGIES[name](session)
+                    timings[name].append(time.perf_counter() - start)
+                    left = session.exec(select(func.count()).select_from(Registration)).one()
+                    assert left == 0, f"{name} left {left} registrations"
+                engine.dispose()
+
+    print(f"deleting one event with {args.registrations} registrations (median of {args.repeat})")
+    for name, values in timings.items():
+        print(f"{name:<20}{statistics.median(values) * 1000:>10.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
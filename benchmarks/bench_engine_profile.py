@@ -0,0 +1,152 @@
+"""Read/write throughput of the SQLite engine profile against the old defaults.
+
+Runs the same mixed workload (reader threads paging through events while
+writer threads insert and commit one event at a time) on a scratch copy of
+the schema, once per profile:
+
+- ``default+echo``: what db.py used to build (rollback journal, synchronous=FULL,
+  echo=True, logging sent to /dev/null so the terminal is not flooded)
+- ``default``: same, without echo
+- ``profile``: the engine profile of ``app.config`` (WAL, synchronous=NORMAL,
+  mmap, cache size, busy timeout, foreign keys) plus query_only read connections
+
+Usage (from the repository root):
+
+    python -m benchmarks.bench_engine_profile --duration 5 --readers 4 --writers 2
+"""
+
+import argparse
+import logging
+import os
+import statistics
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+from sqlalchemy import event, text
+from sqlmodel import SQLModel, create_engine
+
+from app.config import config
+from app.data.db import apply_pragmas
+from app.models.event import Event
+
+
+def build_engines(db_path: Path, profile: str, pool_size: int):
+    url = f"sqlite:///{db_path}"
+    connect_args = {"check_same_thread": False, "timeout": config.db_busy_timeout / 1000}
+    echo = profile == "default+echo"
+    write_engine = create_engine(url, connect_args=connect_args, echo=echo,
+                                 pool_size=pool_size, max_overflow=0)
+    read_engine = create_engine(url, connect_args=connect_args, echo=echo,
+                                pool_size=pool_size, max_overflow=0)
+    if echo:
+        # Pay the logging cost without printing thousands of lines
+        for handler in logging.getLogger("sqlalchemy.engine.Engine").handlers:
+            handler.setStream(open(os.devnull, "w"))
+    if profile == "profile":
+        event.listen(write_engine, "connect", lambda conn, _: apply_pragmas(conn))
+        event.listen(read_engine, "connect", lambda conn, _: apply_pragmas(conn, query_only=True))
+    return write_engine, read_engine
+
+
+def seed(engine, rows: int) -> None:
+    SQLModel.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(
+            Event.__table__.insert(),
+            [{"title": f"Event {i}", "description": "x" * 200,
+              "date": datetime(2025, 1, 1), "location": f"City {i % 50}"}
+             for i in range(rows)],
+        )
+
+
+def run_profile(profile: str, args) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "bench.db"
+        write_engine, read_engine = build_engines(db_path, profile, args.readers + args.writers)
+        seed(write_engine, args.rows)
+
+        stop = threading.Event()
+        read_latencies: list[float] = []
+        write_latencies: list[float] = []
+        errors = [0]
+        lock = threading.Lock()
+
+        def reader(n: int) -> None:
+            local = []
+            last_id = 0
+            while not stop.is_set():
+                start = time.perf_counter()
+                with read_engine.connect() as conn:
+                    ids = conn.execute(
+                        text("SELECT id, title, date, location FROM event WHERE id > :last ORDER BY id LIMIT 50"),
+                        {"last": last_id},
+                    ).scalars().all()
+                local.append(time.perf_counter() - start)
+                last_id = ids[-1] if ids else 0
+            with lock:
+                read_latencies.extend(local)
+
+        def writer(n: int) -> None:
+            local = []
+            while not stop.is_set():
+                start = time.perf_counter()
+                try:
+                    with write_engine.begin() as conn:
+                        conn.execute(Event.__table__.insert(), {
+                            "title": f"Writer {n}", "description": "y" * 200,
+                            "date": datetime(2025, 6, 1), "location": "Bench",
+                        })
+                    local.append(time.perf_counter() - start)
+                except Exception:
+                    with lock:
+                        errors[0] += 1
+            with lock:
+                write_latencies.extend(local)
+
+        threads = [threading.Thread(target=reader, args=(i,)) for i in range(args.readers)]
+        threads += [threading.Thread(target=writer, args=(i,)) for i in range(args.writers)]
+        for t in threads:
+            t.start()
+        time.sleep(args.duration)
+        stop.set()
+        for t in threads:
+            t.join()
+
+        write_engine.dispose()
+        read_engine.dispose()
+
+    def p99(values: list[float]) -> float:
+        return statistics.quantiles(values, n=100)[98] * 1000 if len(values) >= 2 else 0.0
+
+    return {
+        "profile": profile,
+        "reads_per_s": len(read_latencies) / args.duration,
+        "writes_per_s": len(write_latencies) / args.duration,
+        "read_p99_ms": p99(read_latencies),
+        "write_p99_ms": p99(write_latencies),
+        "write_errors": errors[0],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per profile")
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--rows", type=int, default=10_000, help="events seeded before the run")
+    parser.add_argument("--profiles", nargs="+", default=["default+echo", "default", "profile"],
+                        choices=["default+echo", "default", "profile"])
+    args = parser.parse_args()
+
+    print(f"{'profile':<14}{'reads/s':>10}{'writes/s':>10}{'read p99 ms':>13}{'write p99 ms':>14}{'errors':>8}")
+    for profile in args.profiles:
+        r = run_profile(profile, args)
+        print(f"{r['profile']:<14}{r['reads_per_s']:>10.0f}{r['writes_per_s']:>10.0f}"
+              f"{r['read_p99_ms']:>13.2f}{r['write_p99_ms']:>14.2f}{r['write_errors']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""Registration burst on a popular event: one commit per registration vs group commit.
+
+Creates an event with ``--capacity`` seats and fires ``--requests`` POST
+/events/{id}/register with ``--concurrency`` concurrent clients (in process,
+through httpx's ASGI transport), a fraction of them repeating a username
+already sent. Runs once per mode, each on a new event:
+
+- ``direct``: every request runs and commits its own transaction
+- ``queue``: ``config.register_queue_enabled``, the requests are committed in
+  batches by the writer of ``registration_queue``
+
+Prints throughput, p50 / p99 latency and the status counts, and checks that
+both modes agree with the database (201s = registrations = registered_count,
+never more than the capacity).
+
+Usage (from the repository root):
+
+    python -m benchmarks.bench_register_burst --requests 5000 --concurrency 200
+    python -m benchmarks.bench_register_burst --synchronous FULL
+"""
+
+import argparse
+import asyncio
+import sqlite3
+import statistics
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+import httpx
+
+from app.config import config
+
+
+MODES = ["direct", "queue"]
+
+
+async def burst(client: httpx.AsyncClient, event_id: int, args) -> tuple[list[float], Counter, float]:
+    duplicates = int(args.requests * args.duplicates)
+    usernames = [f"burst{event_id}_{i}" for i in range(args.requests - duplicates)]
+    usernames += usernames[:duplicates]
+    pending = iter(usernames)
+    latencies, statuses = [], Counter()
+
+    async def worker() -> None:
+        for username in pending:
+            start = time.perf_counter()
+            response = await client.post(f"/events/{event_id}/register",
+                                         json={"username": username, "name": username, "email": f"{username}@example.com"})
+            latencies.append(time.perf_counter() - start)
+            statuses[response.status_code] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    return latencies, statuses, time.perf_counter() - start
+
+
+async def run(args) -> dict:
+    from app.main import app
+
+    results = {}
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            for mode in args.modes:
+                config.register_queue_enabled = mode == "queue"
+                response = await client.post("/events/", json={
+                    "title": f"Burst {mode}", "description": "Popular event", "date": "2026-01-01T20:00:00",
+                    "location": "Bench", "capacity": args.capacity,
+                })
+                response.raise_for_status()
+                with sqlite3.connect(config.db_file) as conn:
+                    event_id = conn.execute("SELECT max(id) FROM event WHERE title = ?", (f"Burst {mode}",)).fetchone()[0]
+                latencies, statuses, elapsed = await burst(client, event_id, args)
+                results[mode] = (event_id, latencies, statuses, elapsed)
+    return results
+
+
+def check(db_path: Path, event_id: int, statuses: Counter, capacity: int) -> str:
+    with sqlite3.connect(db_path) as conn:
+        rows = conn.execute("SELECT count(*) FROM registration WHERE event_id = ?", (event_id,)).fetchone()[0]
+        counter = conn.execute("SELECT registered_count FROM event WHERE id = ?", (event_id,)).fetchone()[0]
+    if statuses[201] == rows == counter <= capacity:
+        return "ok"
+    return f"MISMATCH (201: {statuses[201]}, rows: {rows}, registered_count: {counter})"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--capacity", type=int, default=2500, help="seats of the event")
+    parser.add_argument("--duplicates", type=float, default=0.05, help="fraction of repeated usernames")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    parser.add_argument("--synchronous", choices=["OFF", "NORMAL", "FULL"], default=config.db_synchronous,
+                        help="PRAGMA synchronous (FULL: one fsync per commit)")
+    parser.add_argument("--batch-size", type=int, default=config.register_batch_size)
+    parser.add_argument("--batch-delay", type=float, default=config.register_batch_delay, help="seconds")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "burst.db"
+        # Before importing the app: its engines are bound to config.db_file on import
+        config.db_file = db_path
+        config.db_synchronous = args.synchronous
+        config.register_batch_size = args.batch_size
+        config.register_batch_delay = args.batch_delay
+        # A single client bursting: the rate limits would measure themselves
+        config.rate_limit_enabled = False
+
+        results = asyncio.run(run(args))
+
+        print(f"{args.requests} registrations, concurrency {args.concurrency}, capacity {args.capacity}, "
+              f"synchronous={args.synchronous}")
+        print(f"  {'mode':<10}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}   statuses")
+        baseline = None
+        for mode, (event_id, latencies, statuses, elapsed) in results.items():
+            throughput = len(latencies) / elapsed
+            baseline = baseline or throughput
+            latencies.sort()
+            p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+            print(f"  {mode:<10}{throughput:>10.0f}{statistics.median(latencies) * 1000:>10.1f}{p99 * 1000:>10.1f}"
+                  f"   {dict(sorted(statuses.items()))}  x{throughput / baseline:.2f}  "
+                  f"{check(db_path, event_id, statuses, args.capacity)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,355 @@
+"""Latency and throughput of every API route on a seeded dataset.
+
+Seeds (or reuses) a deterministic dataset of the requested size (see
+``benchmarks.dataset``), then drives every route of ``/events``, ``/users``,
+``/registrations`` and ``/stats``, and the ``/changes`` stream, with
+``--concurrency`` concurrent clients:
+
+- ``inproc``: through httpx's ASGI transport, in this process (no network,
+  measures the app and the database)
+- ``http``: over local HTTP against the app served by uvicorn in a child process
+  (``--workers`` processes: compare 1 and N on the GET routes to see reads
+  scale with the cores)
+
+Each mode runs on its own copy of the dataset, routes run in a fixed order
+(reads, creates, updates, the change stream, single deletes, then the
+delete-all routes, which are timed once on what is left). ``GET /changes``
+is timed up to its first event (the replay of the deltas after ``since``;
+``config.changes_keepalive`` when there is none) and only runs in ``http`` mode: httpx's ASGI transport returns a response
+once the app has sent all of it, and the stream lasts
+``config.changes_stream_max_seconds``. p50 / p99 latency and requests per second
+are printed per route and saved as JSON; ``--compare`` checks a run against a
+previous JSON file and exits with status 1 when a route regressed.
+
+Usage (from the repository root):
+
+    python -m benchmarks.bench_routes --size 10k --requests 500 --output results.json
+    python -m benchmarks.bench_routes --dataset /tmp/bench-1m.db --size 1m --compare results.json
+    python -m benchmarks.bench_routes --modes http --routes GET --no-cache --workers 4
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Callable
+
+import httpx
+
+from app.config import config
+from app.data.seed import START_DATE
+from benchmarks.dataset import SIZES, DatasetSample, build_dataset, dataset_sample
+
+
+@dataclass
+class Route:
+    name: str
+    method: str
+    # i-th request -> (url, JSON body or None)
+    build: Callable[[int], tuple[str, Any]]
+    # Number of requests, None = --requests
+    requests: int | None = None
+    # Server-Sent Events: timed until the first event, then closed
+    stream: bool = False
+
+
+def event_form(i: int, tag: str, sample: DatasetSample) -> dict:
+    return {
+        "title": f"Bench {tag} {sample.words[i % len(sample.words)]} {i}",
+        "description": f"Created by the benchmark ({tag})",
+        "date": (START_DATE.replace(year=2026)).isoformat(),
+        "location": sample.locations[i % len(sample.locations)],
+    }
+
+
+def user_form(username: str) -> dict:
+    return {"username": username, "name": f"Name {username}", "email": f"{username}@example.com"}
+
+
+def build_routes(sample: DatasetSample, args, tag: str) -> list[Route]:
+    '''
+    \nRoutes in execution order. Requests addressing seeded rows are spread over
+    the dataset with a fixed seed; the writes of a run never collide with each
+    other: single deletes consume events from the end of the id range and the
+    last usernames, updates and registrations use the first half.
+    '''
+    n = args.requests
+    events = sample.events
+    rng = random.Random(args.seed)
+    event_ids = [rng.randint(1, max(1, events // 2)) for _ in range(n)]
+    usernames = [rng.choice(sample.usernames) for _ in range(n)]
+    words = [rng.choice(sample.words) for _ in range(n)]
+    # Seeded events span two years from START_DATE
+    days = [START_DATE.date() + timedelta(days=rng.randrange(2 * 365)) for _ in range(n)]
+    locations = sample.locations
+    bulk = args.bulk_items
+
+    return [
+        # Reads
+        Route("GET /events/", "GET", lambda i: (f"/events/?limit=50&sort=date&date_from={START_DATE.replace(month=1 + i % 12).isoformat()}", None)),
+        Route("GET /events/?location", "GET", lambda i: (f"/events/?location={locations[i % len(locations)]}&sort=date&limit=50", None)),
+        Route("GET /events/search", "GET", lambda i: (f"/events/search?q={words[i]}&limit=20", None)),
+        Route("GET /events/{event_id}", "GET", lambda i: (f"/events/{event_ids[i]}", None)),
+        Route("GET /events/{event_id}/registrations", "GET", lambda i: (f"/events/{event_ids[i]}/registrations", None)),
+        Route("GET /events/export", "GET", lambda i: ("/events/export?format=ndjson", None), args.export_requests),
+        Route("GET /users/", "GET", lambda i: (f"/users/?limit=50&sort={'name' if i % 2 else 'username'}", None)),
+        Route("GET /users/{username}", "GET", lambda i: (f"/users/{usernames[i]}", None)),
+        Route("GET /users/{username}/registrations", "GET", lambda i: (f"/users/{usernames[i]}/registrations", None)),
+        Route("GET /users/export", "GET", lambda i: ("/users/export?format=csv", None), args.export_requests),
+        Route("GET /registrations/", "GET", lambda i: (f"/registrations/?event_id={event_ids[i]}", None)),
+        Route("GET /registrations/export", "GET", lambda i: ("/registrations/export", None), args.export_requests),
+        Route("GET /events/calendar", "GET", lambda i: (f"/events/calendar?from={days[i]}&to={days[i] + timedelta(days=30)}", None)),
+        Route("GET /events/calendar?group=month", "GET",
+              lambda i: (f"/events/calendar?from={days[i]}&to={days[i] + timedelta(days=365)}&group=month", None)),
+        Route("GET /stats/", "GET", lambda i: ("/stats/", None)),
+        Route("GET /stats/events", "GET", lambda i: ("/stats/events?limit=50", None)),
+        Route("GET /stats/locations", "GET", lambda i: (f"/stats/locations?sort={'events' if i % 2 else 'registrations'}", None)),
+        Route("GET /stats/registrations/daily", "GET", lambda i: ("/stats/registrations/daily", None)),
+        # Creates
+        Route("POST /events/", "POST", lambda i: ("/events/", event_form(i, tag, sample))),
+        Route("POST /events/bulk", "POST", lambda i: ("/events/bulk", [event_form(i * bulk + j, tag, sample) for j in range(bulk)])),
+        Route("POST /users/", "POST", lambda i: ("/users/", user_form(f"{tag}-new{i}"))),
+        Route("POST /users/bulk", "POST", lambda i: ("/users/bulk", [user_form(f"{tag}-bulk{i}-{j}") for j in range(bulk)])),
+        Route("POST /events/{event_id}/register", "POST", lambda i: (f"/events/{event_ids[i]}/register", user_form(f"{tag}-reg{i}"))),
+        Route("POST /events/{event_id}/register/bulk", "POST",
+              lambda i: (f"/events/{event_ids[i]}/register/bulk", [user_form(f"{tag}-regbulk{i}-{j}") for j in range(bulk)])),
+        # Updates
+        Route("PUT /events/{event_id}", "PUT", lambda i: (f"/events/{event_ids[i]}", event_form(i, tag, sample))),
+        # Change stream: replays the deltas of the writes above
+        Route("GET /changes", "GET", lambda i: (f"/changes?since={i}", None), stream=True),
+        # Single deletes
+        Route("DELETE /registrations/", "DELETE",
+              lambda i: ("/registrations/?username={}&event_id={}".format(*sample.registrations_sample[i]), None),
+              len(sample.registrations_sample)),
+        Route("DELETE /events/{event_id}", "DELETE", lambda i: (f"/events/{events - i}", None), min(n, events // 2)),
+        Route("DELETE /users/{username}", "DELETE", lambda i: (f"/users/{sample.last_usernames[i]}", None),
+              len(sample.last_usernames)),
+        # Delete-all: timed once
+        Route("DELETE /events/", "DELETE", lambda i: ("/events/", None), 1),
+        Route("DELETE /users/", "DELETE", lambda i: ("/users/", None), 1),
+    ]
+
+
+def summarize(latencies: list[float], elapsed: float, errors: int) -> dict:
+    latencies = sorted(latencies)
+    p99 = statistics.quantiles(latencies, n=100)[98] if len(latencies) >= 2 else latencies[0]
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "p50_ms": round(statistics.median(latencies) * 1000, 3),
+        "p99_ms": round(p99 * 1000, 3),
+        "rps": round(len(latencies) / elapsed, 1),
+    }
+
+
+async def run_route(client: httpx.AsyncClient, route: Route, count: int, concurrency: int) -> dict:
+    latencies: list[float] = []
+    errors = 0
+    next_index = 0
+
+    async def worker() -> None:
+        nonlocal errors, next_index
+        while next_index < count:
+            i = next_index
+            next_index += 1
+            url, body = route.build(i)
+            start = time.perf_counter()
+            if route.stream:
+                async with client.stream(route.method, url) as response:
+                    async for line in response.aiter_lines():
+                        # First event, or the keep-alive comment of a stream with nothing to replay
+                        if line.startswith(("event:", ":")):
+                            break
+            else:
+                response = await client.request(route.method, url, json=body)
+                await response.aread()
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, count))))
+    return summarize(latencies, time.perf_counter() - start, errors)
+
+
+async def run_routes(client: httpx.AsyncClient, routes: list[Route], args) -> dict:
+    results = {}
+    for route in routes:
+        if args.routes and not any(pattern in route.name for pattern in args.routes):
+            continue
+        count = route.requests if route.requests is not None else args.requests
+        if count <= 0:
+            continue
+        results[route.name] = await run_route(client, route, count, args.concurrency)
+        print_result(route.name, results[route.name])
+    return results
+
+
+async def run_inproc(routes: list[Route], args) -> dict:
+    # The app engines are bound to config.db_file, set by main() before this import
+    from app.main import app
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            # The ASGI transport waits for the end of a stream (see the module docstring)
+            return await run_routes(client, [route for route in routes if not route.stream], args)
+
+
+async def run_http(db_path: Path, routes: list[Route], args) -> dict:
+    command = [sys.executable, "-m", "benchmarks.server", str(db_path), "--port", str(args.port),
+               "--workers", str(args.workers)]
+    if args.no_cache:
+        command.append("--no-cache")
+    server = subprocess.Popen(command)
+    base_url = f"http://127.0.0.1:{args.port}"
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    try:
+        async with httpx.AsyncClient(base_url=base_url, timeout=None, limits=limits) as client:
+            for _ in range(200):
+                try:
+                    await client.get("/events/?limit=1")
+                    break
+                except httpx.TransportError:
+                    if server.poll() is not None:
+                        raise RuntimeError("the benchmark server exited")
+                    await asyncio.sleep(0.1)
+            else:
+                raise RuntimeError("the benchmark server did not start")
+            return await run_routes(client, routes, args)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def print_result(name: str, r: dict) -> None:
+    print(f"  {name:<42}{r['requests']:>7}{r['errors']:>7}{r['p50_ms']:>10.2f}{r['p99_ms']:>10.2f}{r['rps']:>10.1f}")
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> bool:
+    '''
+    \nPrints the change of every route against a previous run.
+
+    Return value:
+        True if a route regressed by more than ``threshold`` (p50, p99 or rps)
+    '''
+    regressed = False
+    print(f"\ncompared with {baseline['meta'].get('revision')} ({baseline['meta'].get('timestamp')}), "
+          f"threshold {threshold:.0%}")
+    for mode, routes in current["results"].items():
+        for name, r in routes.items():
+            old = baseline["results"].get(mode, {}).get(name)
+            if old is None:
+                continue
+            changes = {
+                "p50": r["p50_ms"] / old["p50_ms"] - 1 if old["p50_ms"] else 0.0,
+                "p99": r["p99_ms"] / old["p99_ms"] - 1 if old["p99_ms"] else 0.0,
+                "rps": old["rps"] / r["rps"] - 1 if r["rps"] else 0.0,
+            }
+            worse = [key for key, change in changes.items() if change > threshold]
+            regressed |= bool(worse)
+            flag = f"  REGRESSION ({', '.join(worse)})" if worse else ""
+            print(f"  {mode:<7}{name:<42}p50 {changes['p50']:+7.1%}  p99 {changes['p99']:+7.1%}  "
+                  f"rps {-changes['rps']:+7.1%}{flag}")
+    return regressed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", choices=list(SIZES), default="10k", help="dataset size")
+    parser.add_argument("--dataset", type=Path,
+                        help="seeded database to reuse (created if missing, never modified)")
+    parser.add_argument("--modes", nargs="+", choices=["inproc", "http"], default=["inproc", "http"])
+    parser.add_argument("--requests", type=int, default=200, help="requests per route")
+    parser.add_argument("--export-requests", type=int, default=3, help="requests per export route")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--bulk-items", type=int, default=100, help="items per bulk request")
+    parser.add_argument("--routes", nargs="+", help="only the routes whose name contains one of these")
+    parser.add_argument("--no-cache", action="store_true", help="disable the response cache")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=1, help="server worker processes (http mode)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, help="JSON file to write the results to")
+    parser.add_argument("--compare", type=Path, help="previous JSON results to compare with")
+    parser.add_argument("--threshold", type=float, default=0.10, help="regression threshold (0.10 = 10%%)")
+    args = parser.parse_args()
+
+    events, users, registrations = SIZES[args.size]
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        # Must happen before anything imports app.data.db (engines bound on import)
+        config.db_file = workdir / "inproc.db"
+        config.cache_enabled = not args.no_cache
+        # The load comes from one client: measure the routes, not the rate limits
+        config.rate_limit_enabled = False
+
+        dataset = args.dataset or workdir / "dataset.db"
+        if not dataset.exists():
+            start = time.perf_counter()
+            print(f"seeding {dataset} ({events} events, {users} users, {registrations} registrations)")
+            build_dataset(dataset, events, users, registrations)
+            print(f"seeded in {time.perf_counter() - start:.1f} s")
+
+        # Sizes and rows of the dataset actually used (--dataset may have been seeded with other sizes)
+        sample = dataset_sample(dataset, args.requests, args.seed)
+        events, users, registrations = sample.events, sample.users, sample.registrations
+
+        results = {}
+        for mode in args.modes:
+            db_path = workdir / f"{mode}.db"
+            shutil.copyfile(dataset, db_path)
+            routes = build_routes(sample, args, tag=mode)
+            workers = f", {args.workers} workers" if mode == "http" else ""
+            print(f"\n{mode}  (concurrency {args.concurrency}{workers})")
+            print(f"  {'route':<42}{'reqs':>7}{'errors':>7}{'p50 ms':>10}{'p99 ms':>10}{'req/s':>10}")
+            if mode == "inproc":
+                results[mode] = asyncio.run(run_inproc(routes, args))
+            else:
+                results[mode] = asyncio.run(run_http(db_path, routes, args))
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "size": args.size,
+            "events": events,
+            "users": users,
+            "registrations": registrations,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "workers": args.workers,
+            "bulk_items": args.bulk_items,
+            "cache": not args.no_cache,
+        },
+        "results": results,
+    }
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+        print(f"\nresults written to {args.output}")
+    if args.compare:
+        if compare(report, json.loads(args.compare.read_text()), args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""Serialization throughput of large list responses: ORM + response_model vs rows + fast encoder.
+
+Builds a dataset of ``--rows`` events, users and registrations (see
+``benchmarks.dataset``) and turns the whole of each table into a response
+body, along each path:
+
+- ``response_model``: ORM entities validated and serialized by FastAPI
+  (``serialize_response`` with ``List[Model]``, then JSONResponse), what a
+  list route returning models does
+- ``orm+encoder``: ORM entities through jsonable_encoder and json.dumps, the
+  former path of the response cache
+- ``rows+json``, ``rows+orjson``, ``rows+msgpack``: Core rows of
+  ``table_columns(Model)`` encoded by ``app.encoding`` (stdlib json, orjson
+  and MessagePack, both in requirements.txt)
+
+Prints the time to fetch the rows and to encode them (best of ``--repeat``),
+rows per second over both, the body size and its ratio to the JSON body,
+and whether every JSON body is the same document.
+
+Usage (from the repository root):
+
+    python -m benchmarks.bench_serialization --rows 100000
+"""
+
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+from sqlalchemy import event as sa_event
+from sqlmodel import Session, create_engine, select
+
+from app import encoding
+from app.data.db import apply_pragmas
+from app.encoding import Rows, table_columns
+from app.models.event import Event
+from app.models.registration import Registration
+from app.models.user import User
+from benchmarks.dataset import build_dataset
+
+
+MODELS = {"event": Event, "user": User, "registration": Registration}
+
+
+def fetch_orm(engine, model) -> list:
+    with Session(engine) as session:
+        return list(session.exec(select(model)).all())
+
+
+def fetch_rows(engine, model) -> list:
+    with Session(engine) as session:
+        return list(session.exec(select(*table_columns(model))).all())
+
+
+def encode_response_model(model):
+    field = create_model_field(name="Response", type_=List[model], mode="serialization")
+
+    def encode(objects: list) -> bytes:
+        content = asyncio.run(serialize_response(field=field, response_content=objects))
+        return JSONResponse(content).body
+    return encode
+
+
+def encode_orm(objects: list) -> bytes:
+    return json.dumps(jsonable_encoder(objects), separators=(",", ":")).encode()
+
+
+def paths(model) -> dict:
+    '''
+    \nThe paths to compare: name -> (fetch, encode).
+    '''
+    result = {
+        "response_model": (fetch_orm, encode_response_model(model)),
+        "orm+encoder": (fetch_orm, encode_orm),
+        "rows+json": (fetch_rows, lambda rows: encoding._dumps_stdlib(Rows(rows).dicts())),
+    }
+    if encoding.orjson is not None:
+        result["rows+orjson"] = (fetch_rows, lambda rows: encoding._dumps_orjson(Rows(rows).dicts()))
+    if encoding.msgpack is not None:
+        result["rows+msgpack"] = (fetch_rows, lambda rows: encoding.encode(Rows(rows), encoding.MSGPACK))
+    return result
+
+
+def measure(engine, fetch, encode, repeat: int) -> tuple[float, float, bytes]:
+    best_fetch = best_encode = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = fetch(engine)
+        fetched = time.perf_counter()
+        body = encode(rows)
+        best_fetch = min(best_fetch, fetched - start)
+        best_encode = min(best_encode, time.perf_counter() - fetched)
+    return best_fetch, best_encode, body
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000, help="rows of each table")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--tables", nargs="+", choices=list(MODELS), default=list(MODELS))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "serialization.db"
+        build_dataset(db_path, args.rows, args.rows, args.rows)
+        engine = create_engine(f"sqlite:///{db_path}")
+        sa_event.listen(engine, "connect", lambda conn, _: apply_pragmas(conn, query_only=True))
+
+        print(f"{args.rows} rows per table, best of {args.repeat}")
+        missing = [name for name, module in (("orjson", encoding.orjson), ("msgpack", encoding.msgpack)) if module is None]
+        if missing:
+            print(f"not installed, paths skipped: {', '.join(missing)} (pip install -r requirements.txt)")
+        for table in args.tables:
+            model = MODELS[table]
+            print(f"\n{table}")
+            print(f"  {'path':<16}{'fetch ms':>10}{'encode ms':>11}{'rows/s':>12}{'MB':>8}{'size':>7}   same JSON")
+            reference = json_size = None
+            for name, (fetch, encode) in paths(model).items():
+                fetch_time, encode_time, body = measure(engine, lambda e: fetch(e, model), encode, args.repeat)
+                if name == "rows+msgpack":
+                    same = "-"
+                else:
+                    document = json.loads(body)
+                    reference = reference if reference is not None else document
+                    json_size = json_size or len(body)
+                    same = "yes" if document == reference else "NO"
+                print(f"  {name:<16}{fetch_time * 1000:>10.0f}{encode_time * 1000:>11.0f}"
+                      f"{args.rows / (fetch_time + encode_time):>12,.0f}{len(body) / 1e6:>8.1f}"
+                      f"{len(body) / json_size:>7.0%}   {same}")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
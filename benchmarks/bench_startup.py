@@ -0,0 +1,173 @@
+"""Startup time and time to first request of the app.
+
+Starts the app served by uvicorn (``benchmarks.server``) in a child process
+and polls it until a first request succeeds, ``--runs`` times per scenario:
+
+- ``new``: no database yet (schema creation and fake data)
+- ``unversioned``: a copy of a database created before the schema versioning
+  (``--legacy``, default ``app/data/database.db``); only the first start migrates
+- ``current``: a database already at the latest schema version (no DDL)
+
+Also timed: ``import app.main`` in a fresh interpreter. Medians are printed
+and saved as JSON; ``--compare`` checks a run against a previous JSON file
+and exits with status 1 when a scenario regressed.
+
+Usage (from the repository root):
+
+    python -m benchmarks.bench_startup --runs 5 --output startup.json
+    python -m benchmarks.bench_startup --compare startup.json
+"""
+
+import argparse
+import json
+import platform
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import httpx
+
+from benchmarks.bench_routes import git_revision
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def time_import() -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "import app.main"], check=True)
+    return time.perf_counter() - start
+
+
+def time_to_first_request(db_path: Path, timeout: float = 60.0) -> tuple[float, float | None]:
+    '''
+    \nStarts the server on ``db_path`` and waits for its first response.
+
+    Return value:
+        (seconds from spawn to the first response, startup hook duration
+        reported by /metrics)
+    '''
+    port = free_port()
+    start = time.perf_counter()
+    server = subprocess.Popen([sys.executable, "-m", "benchmarks.server", str(db_path), "--port", str(port)])
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=timeout) as client:
+            while True:
+                try:
+                    client.get("/events/?limit=1").raise_for_status()
+                    break
+                except httpx.TransportError:
+                    if server.poll() is not None:
+                        raise RuntimeError("the server exited")
+                    if time.perf_counter() - start > timeout:
+                        raise RuntimeError("the server did not start")
+                    time.sleep(0.005)
+            first_request = time.perf_counter() - start
+            hook = None
+            for line in client.get("/metrics").text.splitlines():
+                if line.startswith("app_startup_duration_seconds "):
+                    hook = float(line.split()[1])
+            return first_request, hook
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def summarize(samples: list[tuple[float, float | None]]) -> dict:
+    hooks = [hook for _, hook in samples if hook is not None]
+    return {
+        "runs": len(samples),
+        "first_request_ms": statistics.median(first for first, _ in samples) * 1000,
+        "first_request_min_ms": min(first for first, _ in samples) * 1000,
+        "startup_hook_ms": statistics.median(hooks) * 1000 if hooks else None,
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> bool:
+    '''
+    \nPrints the change of every scenario against a previous run.
+
+    Return value:
+        True if a scenario got slower by more than ``threshold``
+    '''
+    regressed = False
+    print(f"\ncompared with {baseline['meta'].get('revision')} ({baseline['meta'].get('timestamp')}), "
+          f"threshold {threshold:.0%}")
+    old_import = baseline["meta"].get("import_ms")
+    if old_import:
+        change = current["meta"]["import_ms"] / old_import - 1
+        regressed |= change > threshold
+        print(f"  {'import':<14}{change:+7.1%}{'  REGRESSION' if change > threshold else ''}")
+    for name, r in current["results"].items():
+        old = baseline["results"].get(name)
+        if old is None or not old["first_request_ms"]:
+            continue
+        change = r["first_request_ms"] / old["first_request_ms"] - 1
+        regressed |= change > threshold
+        flag = "  REGRESSION" if change > threshold else ""
+        print(f"  {name:<14}{change:+7.1%}{flag}")
+    return regressed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="starts per scenario")
+    parser.add_argument("--legacy", type=Path, default=Path("app/data/database.db"),
+                        help="database created before the schema versioning")
+    parser.add_argument("--output", type=Path, help="JSON file to write the results to")
+    parser.add_argument("--compare", type=Path, help="previous JSON results to compare with")
+    parser.add_argument("--threshold", type=float, default=0.20, help="regression threshold (0.20 = 20%%)")
+    args = parser.parse_args()
+
+    imports = [time_import() for _ in range(args.runs)]
+    import_ms = statistics.median(imports) * 1000
+    print(f"  import app.main: {import_ms:.1f} ms (median of {args.runs})\n")
+    results = {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        new = [time_to_first_request(workdir / f"new-{i}.db") for i in range(args.runs)]
+        results["new"] = summarize(new)
+
+        # First start migrates the copy, the following ones find it current
+        current_db = workdir / "current.db"
+        shutil.copyfile(args.legacy, current_db)
+        unversioned = time_to_first_request(current_db)
+        results["unversioned"] = summarize([unversioned])
+        results["current"] = summarize([time_to_first_request(current_db) for _ in range(args.runs)])
+
+    print(f"  {'scenario':<14}{'runs':>6}{'first request ms':>18}{'min ms':>10}{'startup hook ms':>17}")
+    for name, r in results.items():
+        hook = f"{r['startup_hook_ms']:.1f}" if r["startup_hook_ms"] is not None else "-"
+        print(f"  {name:<14}{r['runs']:>6}{r['first_request_ms']:>18.1f}{r['first_request_min_ms']:>10.1f}{hook:>17}")
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "runs": args.runs,
+            "import_ms": import_ms,
+        },
+        "results": results,
+    }
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+        print(f"\nresults written to {args.output}")
+    if args.compare:
+        if compare(report, json.loads(args.compare.read_text()), args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""Deterministic, scalable benchmark dataset.
+
+Builds a database the way the app does: the schema through the migrations
+(``app.data.migrations.migrate``, so ``schema_version`` is current and a
+server started on a copy runs none of them), then ``events`` events,
+``users`` users and ``registrations`` registrations from the fake data
+generator of ``app.data.seed``. The same sizes and seed always give the
+same database. The benchmarks read the rows they address (usernames,
+locations, registrations) back with ``dataset_sample``.
+
+Usage (from the repository root):
+
+    python -m benchmarks.dataset bench.db --size 1m
+"""
+
+import argparse
+import os
+import re
+import sqlite3
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+from sqlalchemy import event as sa_event
+from sqlmodel import create_engine
+
+
+# Named sizes: (events, users, registrations)
+SIZES = {
+    "10k": (10_000, 10_000, 10_000),
+    "100k": (100_000, 100_000, 100_000),
+    "1m": (1_000_000, 1_000_000, 1_000_000),
+    "10m": (10_000_000, 10_000_000, 10_000_000),
+}
+
+
+def build_dataset(db_path: Path, events: int, users: int, registrations: int,
+                  seed: int = 0, workers: int | None = None) -> None:
+    '''
+    \nCreates ``db_path`` with the app schema and the requested number of rows.
+
+    Args:
+        db_path: database file to create (must not exist)
+        events, users, registrations: number of rows of each table
+        seed: random seed of the generated rows
+        workers: generator processes (default: one per core)
+    '''
+    # Imported here: app.data.db binds its engines to config.db_file on import
+    from app.data.db import apply_pragmas
+    from app.data.migrations import migrate
+    from app.data.seed import generate
+
+    if db_path.exists():
+        raise FileExistsError(db_path)
+
+    engine = create_engine(f"sqlite:///{db_path}")
+    sa_event.listen(engine, "connect", lambda conn, _: apply_pragmas(conn))
+    migrate(engine)
+    # Indexes, FTS index, counters and statistics are rebuilt after the rows, then ANALYZE
+    generate(engine, events, users, registrations, seed=seed, workers=workers or os.cpu_count() or 1)
+    # Fold the WAL into the main file: the dataset is copied as a single file
+    with engine.connect() as conn:
+        conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+    engine.dispose()
+
+
+@dataclass
+class DatasetSample:
+    events: int
+    users: int
+    registrations: int
+    # Usernames in username order, and the last ``size`` of them (for the deletes)
+    usernames: list[str]
+    last_usernames: list[str]
+    locations: list[str]
+    # Words of the event titles, for the full-text search
+    words: list[str]
+    # (username, event_id) of the first ``size`` registrations
+    registrations_sample: list[tuple[str, int]]
+
+
+def dataset_sample(db_path: Path, size: int, seed: int = 0) -> DatasetSample:
+    '''
+    \nReads the sizes of a dataset and the rows the benchmarks address.
+
+    Args:
+        size: rows to read per list
+        seed: seed of the random sample of usernames and title words
+
+    Return value:
+        a DatasetSample: ``usernames`` never contains one of ``last_usernames``
+    '''
+    with sqlite3.connect(db_path) as conn:
+        events, users, registrations = (
+            conn.execute(f"SELECT count(*) FROM {table}").fetchone()[0]
+            for table in ("event", '"user"', "registration")
+        )
+        last_usernames = [row[0] for row in conn.execute(
+            'SELECT username FROM "user" ORDER BY username DESC LIMIT ?', (min(size, users // 2),))]
+        # A stable pseudo-random sample, spread over the rest of the table
+        usernames = [row[0] for row in conn.execute(
+            'SELECT username FROM "user" WHERE username < ? ORDER BY (rowid * ? + ?) % 1000003 LIMIT ?',
+            (last_usernames[-1] if last_usernames else "\U0010ffff", 7919, seed, size))]
+        locations = [row[0] for row in conn.execute(
+            "SELECT location FROM stats_location ORDER BY events DESC, location LIMIT 100")]
+        titles = [row[0] for row in conn.execute("SELECT title FROM event ORDER BY id LIMIT 200")]
+        registrations_sample = [tuple(row) for row in conn.execute(
+            "SELECT username, event_id FROM registration ORDER BY username, event_id LIMIT ?", (size,))]
+    words = sorted({word.lower() for title in titles for word in re.findall(r"[^\W\d_]{4,}", title)})
+    return DatasetSample(events, users, registrations, usernames, last_usernames, locations, words,
+                         registrations_sample)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("db", type=Path, help="database file to create")
+    parser.add_argument("--size", choices=list(SIZES), default="10k")
+    parser.add_argument("--events", type=int, help="overrides the events of --size")
+    parser.add_argument("--users", type=int, help="overrides the users of --size")
+    parser.add_argument("--registrations", type=int, help="overrides the registrations of --size")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, help="generator processes (default: one per core)")
+    args = parser.parse_args()
+
+    events, users, registrations = SIZES[args.size]
+    events = args.events if args.events is not None else events
+    users = args.users if args.users is not None else users
+    registrations = args.registrations if args.registrations is not None else registrations
+
+    start = time.perf_counter()
+    build_dataset(args.db, events, users, registrations, seed=args.seed, workers=args.workers)
+    print(f"{args.db}: {events} events, {users} users, {registrations} registrations "
+          f"in {time.perf_counter() - start:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
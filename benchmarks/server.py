@@ -0,0 +1,48 @@
+"""Runs the app with uvicorn on a given database (HTTP mode of bench_routes).
+
+Usage (from the repository root):
+
+    python -m benchmarks.server bench.db --port 8765
+    python -m benchmarks.server bench.db --port 8765 --workers 4
+"""
+
+import argparse
+import os
+from pathlib import Path
+
+from app.config import config
+
+
+def create_app():
+    # Called in every worker process: the configuration comes through the
+    # environment, and must be set before importing the app (its engines are
+    # bound to config.db_file on import)
+    config.db_file = os.environ["BENCH_SERVER_DB"]
+    config.cache_enabled = os.environ.get("BENCH_SERVER_CACHE", "1") == "1"
+    # The load generator is a single client: off unless asked for
+    config.rate_limit_enabled = os.environ.get("BENCH_SERVER_ADMISSION", "0") == "1"
+
+    from app.main import app
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("db", type=Path)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=1, help="worker processes")
+    parser.add_argument("--no-cache", action="store_true", help="disable the response cache")
+    args = parser.parse_args()
+
+    os.environ["BENCH_SERVER_DB"] = str(args.db.resolve())
+    os.environ["BENCH_SERVER_CACHE"] = "0" if args.no_cache else "1"
+
+    import uvicorn
+
+    uvicorn.run("benchmarks.server:create_app", factory=True, host=args.host, port=args.port,
+                workers=args.workers, log_level="warning", access_log=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Shared fixtures: the app on a database of its own, served in process.
+
+The engines of ``app.data.db`` are bound to ``config.db_file`` when the app
+is imported, so the configuration is set here, before any test module
+imports it. Every test runs the lifespan (migrations, change feed,
+registration queue) and talks to the app through httpx's ASGI transport.
+"""
+
+import itertools
+import tempfile
+from pathlib import Path
+
+import httpx
+import pytest
+
+from app.config import config
+
+
+_tmp = Path(tempfile.mkdtemp(prefix="app-tests-"))
+config.db_file = _tmp / "test.db"
+config.static_build_dir = _tmp / "static_build"
+# A whole test file comes from one client: tests/test_admission.py turns the limits on
+config.rate_limit_enabled = False
+
+_names = itertools.count()
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def app():
+    from app.main import app
+    return app
+
+
+@pytest.fixture
+async def client(app):
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            yield client
+
+
+@pytest.fixture
+def unique():
+    '''
+    \nNames that no other test uses (the database is shared by the whole run).
+    '''
+    return lambda prefix="t": f"{prefix}{next(_names)}"
+
+
+def event_body(**fields) -> dict:
+    return {"title": "Event", "description": "Description", "date": "2026-05-01T20:00:00",
+            "location": "Milano", "capacity": None, **fields}
+
+
+def user_body(username: str, **fields) -> dict:
+    return {"username": username, "name": f"Name {username}", "email": f"{username}@example.com", **fields}
+
+
+async def create_event(client: httpx.AsyncClient, **fields) -> int:
+    # POST /events answers with a message: the bulk route gives the id back
+    response = await client.post("/events/bulk", json=[event_body(**fields)])
+    assert response.status_code == 200, response.text
+    return response.json()[0]["key"]
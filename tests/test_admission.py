@@ -0,0 +1,94 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app.admission import AdmissionMiddleware, route_class, token_buckets
+from app.config import config
+
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def limits():
+    '''
+    \nTurns the rate limits on for a test; ``config.rate_limits`` updates the
+    classes in place, so they are restored from a copy.
+    '''
+    saved = dict(config.rate_limits)
+    config.rate_limit_enabled = True
+    token_buckets.clear()
+    yield config
+    config.rate_limits = saved
+    config.rate_limit_enabled = False
+    token_buckets.clear()
+
+
+@pytest.fixture
+async def other_client(app):
+    transport = httpx.ASGITransport(app=app, client=("192.0.2.8", 50000))
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
+
+
+@pytest.mark.parametrize("method, path, klass", [
+    ("GET", "/events/", "read"),
+    ("POST", "/events/", "write"),
+    ("POST", "/events/3/register/bulk", "bulk"),
+    ("DELETE", "/users/", "bulk"),
+    ("DELETE", "/users/someone", "write"),
+    ("GET", "/static/styles.css", None),
+])
+def test_route_class(method, path, klass):
+    assert route_class(method, path) == klass
+
+
+async def test_empty_bucket_gets_429_with_retry_after(client, limits):
+    limits.rate_limits = {"read": (0.5, 2)}
+    statuses = [(await client.get("/stats/")).status_code for _ in range(3)]
+    assert statuses == [200, 200, 429]
+    refused = await client.get("/stats/")
+    assert refused.status_code == 429
+    # One token every 2 s
+    assert refused.headers["retry-after"] == "2"
+
+
+async def test_bucket_refills(client, limits):
+    limits.rate_limits = {"read": (20, 1)}
+    assert (await client.get("/stats/")).status_code == 200
+    assert (await client.get("/stats/")).status_code == 429
+    await asyncio.sleep(0.1)
+    assert (await client.get("/stats/")).status_code == 200
+
+
+async def test_buckets_per_client_and_class(client, other_client, limits):
+    limits.rate_limits = {"read": (0.01, 1), "write": (0.01, 1)}
+    assert (await client.get("/stats/")).status_code == 200
+    assert (await client.get("/stats/")).status_code == 429
+    # Another client, and the writes of the same client, have buckets of their own
+    assert (await other_client.get("/stats/")).status_code == 200
+    assert (await client.delete("/users/nobody-admission")).status_code == 404
+
+
+async def test_writes_beyond_the_slots_get_503(limits, monkeypatch):
+    monkeypatch.setattr(config, "write_concurrency", 1)
+    monkeypatch.setattr(config, "write_queue_timeout", 0.05)
+    release = asyncio.Event()
+
+    async def slow_app(scope, receive, send):
+        await release.wait()
+        await send({"type": "http.response.start", "status": 201, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    transport = httpx.ASGITransport(app=AdmissionMiddleware(slow_app))
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        first = asyncio.create_task(client.post("/events/", json={}))
+        await asyncio.sleep(0.01)
+        refused = await client.post("/events/", json={})
+        release.set()
+        assert (await first).status_code == 201
+    assert refused.status_code == 503
+    assert refused.headers["retry-after"] == "1"
+    assert "busy" in json.loads(refused.content)["detail"]
@@ -0,0 +1,94 @@
+import pytest
+from starlette.requests import Request
+
+from app.cache import ResponseCache
+from tests.conftest import create_event, event_body, user_body
+
+
+pytestmark = pytest.mark.anyio
+
+
+def request(path: str, **headers) -> Request:
+    return Request({"type": "http", "method": "GET", "path": path, "query_string": b"",
+                    "headers": [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()]})
+
+
+async def test_conditional_requests(client):
+    event_id = await create_event(client)
+    first = await client.get(f"/events/{event_id}")
+    etag = first.headers["etag"]
+    assert first.headers["cache-control"] == "no-cache"
+    assert (await client.get(f"/events/{event_id}")).headers["etag"] == etag
+    not_modified = await client.get(f"/events/{event_id}", headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+    assert (await client.get(f"/events/{event_id}", headers={"If-None-Match": '"other"'})).status_code == 200
+
+
+async def test_put_invalidates_the_event_and_the_lists(client, unique):
+    location = unique("cache")
+    event_id = await create_event(client, location=location, title="Before")
+    etag = (await client.get(f"/events/{event_id}")).headers["etag"]
+    assert [e["title"] for e in (await client.get("/events/", params={"location": location})).json()] == ["Before"]
+
+    response = await client.put(f"/events/{event_id}", json=event_body(location=location, title="After"))
+    assert response.status_code == 200
+    # The client copy is stale: a full response, not a 304
+    detail = await client.get(f"/events/{event_id}", headers={"If-None-Match": etag})
+    assert detail.status_code == 200
+    assert detail.json()["title"] == "After"
+    assert [e["title"] for e in (await client.get("/events/", params={"location": location})).json()] == ["After"]
+
+
+async def test_register_and_delete_invalidate_the_event(client, unique):
+    location = unique("cache")
+    event_id = await create_event(client, location=location)
+    assert (await client.get(f"/events/{event_id}")).json()["registered_count"] == 0
+    await client.post(f"/events/{event_id}/register", json=user_body(unique("cache")))
+    assert (await client.get(f"/events/{event_id}")).json()["registered_count"] == 1
+
+    await client.get("/events/", params={"location": location})
+    assert (await client.delete(f"/events/{event_id}")).status_code == 200
+    assert (await client.get(f"/events/{event_id}")).status_code == 404
+    assert (await client.get("/events/", params={"location": location})).json() == []
+
+
+async def test_created_event_shows_in_cached_list(client, unique):
+    location = unique("cache")
+    assert (await client.get("/events/", params={"location": location})).json() == []
+    await create_event(client, location=location)
+    assert len((await client.get("/events/", params={"location": location})).json()) == 1
+
+
+def test_wildcard_tag_drops_every_event():
+    cache = ResponseCache(max_entries=100)
+    for event_id in (1, 2):
+        cache.store(request(f"/events/{event_id}"), {"id": event_id}, [f"event:{event_id}", "event:*"],
+                    cache.generation)
+    cache.store(request("/users/mario"), {"username": "mario"}, ["user:mario"], cache.generation)
+
+    cache.invalidate("event:1")
+    assert cache.lookup(request("/events/1")) is None
+    assert cache.lookup(request("/events/2")) is not None
+
+    cache.invalidate("events", "event:*")
+    assert cache.lookup(request("/events/2")) is None
+    assert cache.lookup(request("/users/mario")) is not None
+
+
+def test_response_computed_during_a_write_is_not_cached():
+    cache = ResponseCache(max_entries=100)
+    generation = cache.generation
+    # A write commits between the read of the rows and store()
+    cache.invalidate("event:1")
+    response = cache.store(request("/events/1"), {"id": 1}, ["event:1"], generation)
+    assert response.status_code == 200
+    assert cache.lookup(request("/events/1")) is None
+
+
+def test_lru_bound():
+    cache = ResponseCache(max_entries=2)
+    for event_id in (1, 2, 3):
+        cache.store(request(f"/events/{event_id}"), {"id": event_id}, [f"event:{event_id}"], cache.generation)
+    assert len(cache) == 2
+    assert cache.lookup(request("/events/1")) is None
@@ -0,0 +1,51 @@
+import pytest
+
+from tests.conftest import create_event, event_body
+
+
+pytestmark = pytest.mark.anyio
+
+
+async def calendar(client, location: str, group: str, **params) -> list[dict]:
+    response = await client.get("/events/calendar", params={"from": "2031-01-01", "to": "2031-02-28",
+                                                             "location": location, "group": group, **params})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+@pytest.fixture
+async def location(client, unique):
+    location = unique("city")
+    for day in ("2031-01-06", "2031-01-07", "2031-01-20", "2031-02-03"):
+        await create_event(client, location=location, date=f"{day}T20:00:00")
+    return location
+
+
+async def test_buckets(client, location):
+    assert [(b["start"], b["count"]) for b in await calendar(client, location, "day")] == [
+        ("2031-01-06", 1), ("2031-01-07", 1), ("2031-01-20", 1), ("2031-02-03", 1)]
+    assert [(b["start"], b["end"], b["count"]) for b in await calendar(client, location, "week")] == [
+        ("2031-01-06", "2031-01-12", 2), ("2031-01-20", "2031-01-26", 1), ("2031-02-03", "2031-02-09", 1)]
+    assert [(b["start"], b["end"], b["count"]) for b in await calendar(client, location, "month")] == [
+        ("2031-01-01", "2031-01-31", 3), ("2031-02-01", "2031-02-28", 1)]
+
+
+async def test_include_events(client, location):
+    buckets = await calendar(client, location, "month", include_events="true")
+    assert [len(bucket["events"]) for bucket in buckets] == [3, 1]
+
+
+async def test_counts_follow_updates_and_deletes(client, location):
+    event_id = await create_event(client, location=location, date="2031-02-10T09:00:00")
+    assert (await calendar(client, location, "month"))[1]["count"] == 2
+
+    await client.put(f"/events/{event_id}", json=event_body(location=location, date="2031-01-15T09:00:00"))
+    assert [b["count"] for b in await calendar(client, location, "month")] == [4, 1]
+
+    await client.delete(f"/events/{event_id}")
+    assert [b["count"] for b in await calendar(client, location, "month")] == [3, 1]
+
+
+async def test_range_must_be_ordered(client):
+    response = await client.get("/events/calendar", params={"from": "2031-02-01", "to": "2031-01-01"})
+    assert response.status_code == 422
@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from tests.conftest import create_event, event_body, user_body
+
+
+pytestmark = pytest.mark.anyio
+
+
+async def register(client, event_id: int, username: str):
+    return await client.post(f"/events/{event_id}/register", json=user_body(username))
+
+
+async def test_full_event_refuses_registrations(client, unique):
+    event_id = await create_event(client, capacity=2)
+    statuses = [(await register(client, event_id, unique("reg"))).status_code for _ in range(3)]
+    assert statuses == [201, 201, 409]
+    assert (await client.get(f"/events/{event_id}")).json()["registered_count"] == 2
+
+
+async def test_duplicate_registration(client, unique):
+    event_id = await create_event(client, capacity=5)
+    username = unique("reg")
+    assert (await register(client, event_id, username)).status_code == 201
+    assert (await register(client, event_id, username)).status_code == 409
+    assert (await client.get(f"/events/{event_id}")).json()["registered_count"] == 1
+
+
+async def test_concurrent_registrations_never_overbook(client, unique):
+    event_id = await create_event(client, capacity=10)
+    responses = await asyncio.gather(*(register(client, event_id, unique("reg")) for _ in range(40)))
+    assert sorted(response.status_code for response in responses) == [201] * 10 + [409] * 30
+    assert (await client.get(f"/events/{event_id}")).json()["registered_count"] == 10
+
+
+async def test_update_cannot_lower_capacity_below_registrations(client, unique):
+    event_id = await create_event(client, capacity=5)
+    for _ in range(3):
+        await register(client, event_id, unique("reg"))
+
+    response = await client.put(f"/events/{event_id}", json=event_body(title="Smaller", capacity=2))
+    assert response.status_code == 409
+    event = (await client.get(f"/events/{event_id}")).json()
+    assert (event["title"], event["capacity"]) == ("Event", 5)
+
+    response = await client.put(f"/events/{event_id}", json=event_body(title="Exact", capacity=3))
+    assert response.status_code == 200
+    event = (await client.get(f"/events/{event_id}")).json()
+    assert (event["title"], event["capacity"], event["registered_count"]) == ("Exact", 3, 3)
+
+
+async def test_update_missing_event(client):
+    assert (await client.put("/events/999999999", json=event_body())).status_code == 404
+
+
+async def test_update_racing_a_delete(client):
+    # Updates that found the event before the delete committed: 404, never a capacity 409
+    for _ in range(5):
+        event_id = await create_event(client, capacity=5)
+        responses = await asyncio.gather(
+            *(client.put(f"/events/{event_id}", json=event_body(capacity=5)) for _ in range(10)),
+            client.delete(f"/events/{event_id}"),
+        )
+        assert {response.status_code for response in responses[:-1]} <= {200, 404}
+        assert responses[-1].status_code == 200
@@ -0,0 +1,36 @@
+import asyncio
+
+import pytest
+
+from app.data.changes import ChangeFeed, change_feed
+from app.data.db import async_engine, async_read_engine
+from tests.conftest import create_event
+
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_deltas_after_a_sequence_number(client, unique):
+    since = change_feed.last_seq
+    location = unique("changes")
+    event_id = await create_event(client, location=location)
+    await client.delete(f"/events/{event_id}")
+    # The tail task reads the deltas of each commit in the background
+    for _ in range(50):
+        deltas = [delta for delta in await change_feed.changes_after(since) if delta["key"] == str(event_id)]
+        if len(deltas) == 2:
+            break
+        await change_feed.wait(change_feed.last_seq, 0.1)
+    assert [(delta["entity"], delta["op"]) for delta in deltas] == [("event", "put"), ("event", "delete")]
+    assert deltas[0]["data"]["location"] == location
+
+
+async def test_stop_right_after_a_notification(client):
+    feed = ChangeFeed()
+    for _ in range(20):
+        await feed.start(async_read_engine, async_engine)
+        await asyncio.sleep(0)
+        # A commit wakes the tail task up just before the shutdown
+        feed.notify()
+        await asyncio.wait_for(feed.stop(), 5)
+        assert not feed.running
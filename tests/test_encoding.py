@@ -0,0 +1,34 @@
+import pytest
+
+from tests.conftest import create_event
+
+
+pytestmark = pytest.mark.anyio
+
+msgpack = pytest.importorskip("msgpack")
+
+
+async def test_list_defaults_to_json(client, unique):
+    await create_event(client, title=unique("enc"))
+    response = await client.get("/events/", params={"limit": 5})
+    assert response.headers["content-type"].startswith("application/json")
+    assert "Accept" in response.headers["vary"]
+
+
+async def test_msgpack_has_the_same_document(client, unique):
+    await create_event(client, title=unique("enc"))
+    as_json = await client.get("/events/", params={"limit": 5})
+    as_msgpack = await client.get("/events/", params={"limit": 5}, headers={"Accept": "application/msgpack"})
+    assert as_msgpack.headers["content-type"] == "application/msgpack"
+    assert msgpack.unpackb(as_msgpack.content) == as_json.json()
+
+
+@pytest.mark.parametrize("accept, media_type", [
+    ("application/x-msgpack", "application/msgpack"),
+    ("application/json, application/msgpack;q=0.5", "application/json"),
+    ("application/json;q=0.5, application/msgpack", "application/msgpack"),
+    ("text/html, */*;q=0.8", "application/json"),
+])
+async def test_negotiation(client, accept, media_type):
+    response = await client.get("/users/", params={"limit": 1}, headers={"Accept": accept})
+    assert response.headers["content-type"].startswith(media_type)
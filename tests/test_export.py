@@ -0,0 +1,46 @@
+import json
+import sqlite3
+
+import pytest
+
+from app.config import config
+from app.data import seed
+from tests.conftest import create_event, user_body
+
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_export_has_every_event_column(client, unique):
+    event_id = await create_event(client, title=unique("export"), capacity=7)
+    response = await client.get("/events/export")
+    assert response.status_code == 200
+    rows = {row["id"]: row for row in map(json.loads, response.text.splitlines())}
+    assert rows[event_id]["capacity"] == 7
+    assert set(rows[event_id]) == {"id", "title", "description", "date", "location", "capacity", "registered_count"}
+
+
+@pytest.mark.parametrize("fmt", ["ndjson", "csv"])
+async def test_export_import_round_trip(client, unique, tmp_path, fmt):
+    event_id = await create_event(client, title=unique("export"), capacity=3)
+    username = unique("export")
+    await client.post(f"/events/{event_id}/register", json=user_body(username))
+
+    for table, path in (("event", "/events/export"), ("user", "/users/export"),
+                        ("registration", "/registrations/export")):
+        response = await client.get(path, params={"format": fmt})
+        (tmp_path / f"{table}.{fmt}").write_text(response.text)
+
+    # Import into an empty database with the schema of the app
+    target = tmp_path / "import.db"
+    with sqlite3.connect(config.db_file) as source, sqlite3.connect(target) as driver:
+        for sql, in source.execute("SELECT sql FROM sqlite_master WHERE type = 'table' "
+                                   "AND name IN ('event', 'user', 'registration')"):
+            driver.execute(sql)
+        for table in ("event", "user", "registration"):
+            seed.import_file(driver, tmp_path / f"{table}.{fmt}", table)
+        capacity = driver.execute("SELECT capacity FROM event WHERE id = ?", (event_id,)).fetchone()[0]
+        registered = driver.execute("SELECT count(*) FROM registration WHERE event_id = ?", (event_id,)).fetchone()[0]
+    assert capacity == 3
+    assert registered == 1
+
@@ -0,0 +1,49 @@
+import pytest
+
+from app.data.fields import FIELDS_DESCRIPTION
+from tests.conftest import create_event, user_body
+
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_event_fields(client):
+    event_id = await create_event(client, title="Sparse", location="Torino")
+    response = await client.get(f"/events/{event_id}", params={"fields": "location,title"})
+    assert response.status_code == 200
+    # In the order of the model, whatever the order of the parameter
+    assert list(response.json()) == ["title", "location"]
+    assert response.json() == {"title": "Sparse", "location": "Torino"}
+
+
+async def test_list_fields_keep_the_cursor(client, unique):
+    prefix = unique("fields")
+    await client.post("/users/bulk", json=[user_body(f"{prefix}-{i}") for i in range(3)])
+    response = await client.get("/users/", params={"fields": "email", "sort": "name", "limit": 1})
+    assert response.status_code == 200
+    # The sort keys are read for the cursor but not returned
+    assert [list(user) for user in response.json()] == [["email"]]
+    next_page = await client.get("/users/", params={"fields": "email", "sort": "name", "limit": 1,
+                                                    "cursor": response.headers["x-next-cursor"]})
+    assert next_page.status_code == 200
+    assert next_page.json() != response.json()
+
+
+async def test_registration_fields(client, unique):
+    event_id = await create_event(client)
+    username = unique("fields")
+    assert (await client.post(f"/events/{event_id}/register", json=user_body(username))).status_code == 201
+    response = await client.get("/registrations/", params={"event_id": event_id, "fields": "username"})
+    assert response.json() == [{"username": username}]
+
+
+@pytest.mark.parametrize("fields", ["password", "", "title,password"])
+async def test_unknown_or_empty_fields(client, fields):
+    assert (await client.get("/events/", params={"fields": fields})).status_code == 400
+
+
+async def test_fields_are_documented_in_english(client):
+    schema = (await client.get("/openapi.json")).json()
+    for path in ("/users/", "/registrations/", "/events/"):
+        parameters = schema["paths"][path]["get"]["parameters"]
+        assert next(p for p in parameters if p["name"] == "fields")["description"] == FIELDS_DESCRIPTION
@@ -0,0 +1,65 @@
+import asyncio
+
+import httpx
+import pytest
+
+from tests.conftest import user_body
+
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def other_client(client, app):
+    # Second client, from another address (client fixture first: it runs the lifespan)
+    transport = httpx.ASGITransport(app=app, client=("192.0.2.7", 50000))
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as other:
+        yield other
+
+
+async def test_retry_is_replayed(client, unique):
+    key, username = unique("key"), unique("idem")
+    first = await client.post("/users/", json=user_body(username), headers={"Idempotency-Key": key})
+    retry = await client.post("/users/", json=user_body(username), headers={"Idempotency-Key": key})
+    assert first.status_code == retry.status_code == 201
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert retry.json() == first.json()
+
+
+async def test_reused_key_with_another_body(client, unique):
+    key = unique("key")
+    assert (await client.post("/users/", json=user_body(unique("idem")),
+                              headers={"Idempotency-Key": key})).status_code == 201
+    response = await client.post("/users/", json=user_body(unique("idem")), headers={"Idempotency-Key": key})
+    assert response.status_code == 422
+
+
+async def test_keys_are_scoped_per_client(client, other_client, unique):
+    key = unique("key")
+    first = await client.post("/users/", json=user_body(unique("idem")), headers={"Idempotency-Key": key})
+    assert first.status_code == 201
+
+    # Same key from another client: its own request runs, with its own body
+    other = unique("idem")
+    response = await other_client.post("/users/", json=user_body(other), headers={"Idempotency-Key": key})
+    assert response.status_code == 201
+    assert "idempotent-replayed" not in response.headers
+    assert response.json()["username"] == other
+
+    # ... and is replayed to that client only
+    retry = await other_client.post("/users/", json=user_body(other), headers={"Idempotency-Key": key})
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert retry.json()["username"] == other
+
+
+async def test_concurrent_retries_create_one_row(client, unique):
+    key, title = unique("key"), unique("idem")
+    body = {"title": title, "description": "d", "date": "2026-05-01T20:00:00", "location": "Roma"}
+    responses = await asyncio.gather(*(client.post("/events/", json=body, headers={"Idempotency-Key": key})
+                                       for _ in range(6)))
+    statuses = sorted(response.status_code for response in responses)
+    assert statuses.count(201) >= 1 and set(statuses) <= {201, 409}
+    assert all(response.headers["retry-after"] == "1" for response in responses if response.status_code == 409)
+
+    found = (await client.get("/events/search", params={"q": title})).json()
+    assert len(found) == 1
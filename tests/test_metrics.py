@@ -0,0 +1,52 @@
+import re
+
+import pytest
+
+from tests.conftest import create_event
+
+
+pytestmark = pytest.mark.anyio
+
+
+async def sample(client, line_start: str) -> float:
+    text = (await client.get("/metrics")).text
+    match = re.search(rf"^{re.escape(line_start)} (\S+)$", text, re.MULTILINE)
+    return 0.0 if match is None else float(match.group(1))
+
+
+async def test_requests_are_labelled_with_the_route_template(client):
+    event_id = await create_event(client)
+    series = 'http_requests_total{method="GET",route="/events/{event_id}",status="200"}'
+    before = await sample(client, series)
+    for _ in range(3):
+        assert (await client.get(f"/events/{event_id}")).status_code == 200
+    assert await sample(client, series) == before + 3
+
+    text = (await client.get("/metrics")).text
+    # One series per route, never per id
+    assert f'route="/events/{event_id}"' not in text
+    assert 'http_request_duration_seconds_count{method="GET",route="/events/{event_id}"}' in text
+
+
+async def test_sql_statements_are_counted_per_route(client):
+    await client.get("/stats/")
+    series = 'http_request_db_statements_count{method="GET",route="/stats/"}'
+    before = await sample(client, series)
+    # Cached or not, every request is observed
+    await client.get("/stats/")
+    assert await sample(client, series) == before + 1
+
+
+async def test_unmatched_paths_share_one_label(client):
+    series = 'http_requests_total{method="GET",route="unmatched",status="404"}'
+    before = await sample(client, series)
+    await client.get("/no/such/path/1")
+    await client.get("/no/such/path/2")
+    assert await sample(client, series) == before + 2
+
+
+async def test_exposition_format(client):
+    response = await client.get("/metrics")
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert "# TYPE http_request_duration_seconds histogram" in response.text
+    assert "# TYPE app_startup_duration_seconds gauge" in response.text
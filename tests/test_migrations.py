@@ -0,0 +1,54 @@
+from sqlalchemy import text
+from sqlmodel import create_engine
+
+from app.data.migrations import LATEST_VERSION, MIGRATIONS, SCHEMA_VERSION_DDL, migrate, schema_version
+
+
+def migrate_to(engine, version: int) -> None:
+    # What migrate() did when ``version`` was the latest migration
+    with engine.begin() as conn:
+        conn.exec_driver_sql(SCHEMA_VERSION_DDL)
+        for number, description, migration in MIGRATIONS:
+            if number <= version:
+                migration(conn)
+                conn.execute(text("INSERT INTO schema_version (version, description) VALUES (:v, :d)"),
+                             {"v": number, "d": description})
+
+
+def tables(conn) -> set[str]:
+    return {name for name, in conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')")}
+
+
+def test_new_database(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'new.db'}")
+    assert migrate(engine) == [version for version, _, _ in MIGRATIONS]
+    assert migrate(engine) == []
+    with engine.connect() as conn:
+        assert schema_version(conn) == LATEST_VERSION
+    engine.dispose()
+
+
+def test_upgrade_fills_the_statistics(tmp_path):
+    # A database of before the statistics, with events in it
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    migrate_to(engine, 6)
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO event (title, description, date, location, registered_count) VALUES "
+            "('a', 'd', '2026-03-01 10:00:00.000000', 'Roma', 0), "
+            "('b', 'd', '2026-03-01 18:00:00.000000', 'Roma', 0), "
+            "('c', 'd', '2026-03-02 10:00:00.000000', 'Pisa', 0)")
+
+    assert migrate(engine) == list(range(7, LATEST_VERSION + 1))
+    with engine.connect() as conn:
+        assert {"stats_total", "stats_location", "stats_day", "stats_event_day", "stats_event_day_ai"} <= tables(conn)
+        rows = conn.exec_driver_sql("SELECT day, location, events FROM stats_event_day ORDER BY day").all()
+        assert [tuple(row) for row in rows] == [("2026-03-01", "Roma", 2), ("2026-03-02", "Pisa", 1)]
+        assert conn.exec_driver_sql("SELECT value FROM stats_total WHERE name = 'events'").scalar_one() == 3
+        columns = [row[1] for row in conn.exec_driver_sql("PRAGMA table_info(idempotency_key)")]
+        assert columns[0] == "client"
+    engine.dispose()
+
+
+def test_versions_are_sequential():
+    assert [version for version, _, _ in MIGRATIONS] == list(range(1, LATEST_VERSION + 1))
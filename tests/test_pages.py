@@ -0,0 +1,48 @@
+import html
+
+import pytest
+
+from app.config import config
+from tests.conftest import create_event, event_body, user_body
+
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_events_page_renders_the_first_page(client):
+    await create_event(client)
+    first_page = (await client.get("/events/", params={"limit": config.default_page_size})).json()
+    response = await client.get("/events_list")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/html")
+    for event in first_page:
+        assert html.escape(event["title"]) in response.text
+
+
+async def test_users_page_renders_the_first_page(client, unique):
+    await client.post("/users/", json=user_body(unique("page")))
+    first_page = (await client.get("/users/", params={"limit": config.default_page_size})).json()
+    response = await client.get("/users_list")
+    assert response.status_code == 200
+    for user in first_page:
+        assert html.escape(user["username"]) in response.text
+
+
+async def test_event_page_follows_the_writes(client, unique):
+    title, new_title, username = unique("Page title "), unique("Page title "), unique("page")
+    event_id = await create_event(client, title=title)
+    page = (await client.get(f"/event_detail/{event_id}")).text
+    assert title in page
+    assert username not in page
+
+    # The cached fragments of the event are dropped by the writes
+    await client.put(f"/events/{event_id}", json=event_body(title=new_title))
+    await client.post(f"/events/{event_id}/register", json=user_body(username))
+    page = (await client.get(f"/event_detail/{event_id}")).text
+    assert new_title in page
+    assert title not in page
+    assert username in page
+
+
+async def test_missing_event_page(client):
+    assert (await client.get("/event_detail/999999999")).status_code == 404
@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+
+from app.data.pagination import encode_cursor
+from tests.conftest import event_body, user_body
+
+
+pytestmark = pytest.mark.anyio
+
+
+async def create_events(client, location: str, days: list[int]) -> list[int]:
+    response = await client.post("/events/bulk", json=[
+        event_body(title=f"Day {day}", location=location, date=f"2026-03-{day:02d}T20:00:00") for day in days
+    ])
+    assert response.status_code == 200
+    return [item["key"] for item in response.json()]
+
+
+async def walk(client, url: str, **params) -> list[dict]:
+    rows, cursor = [], None
+    while True:
+        response = await client.get(url, params={**params, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200, response.text
+        rows.extend(response.json())
+        cursor = response.headers.get("x-next-cursor")
+        if cursor is None:
+            return rows
+        assert 'rel="next"' in response.headers["link"]
+
+
+async def test_pages_follow_the_sort_order(client, unique):
+    location = unique("pages")
+    # Same dates twice: the id breaks the ties
+    ids = await create_events(client, location, [5, 3, 9, 3, 7])
+    rows = await walk(client, "/events/", location=location, sort="date", limit=2)
+    assert [row["id"] for row in rows] == [ids[1], ids[3], ids[0], ids[4], ids[2]]
+    descending = await walk(client, "/events/", location=location, sort="-date", limit=2)
+    assert [row["id"] for row in descending] == [ids[2], ids[4], ids[0], ids[3], ids[1]]
+
+
+async def test_date_filters(client, unique):
+    location = unique("pages")
+    await create_events(client, location, [1, 10, 20])
+    rows = await walk(client, "/events/", location=location, date_from="2026-03-10T00:00:00",
+                      date_to="2026-03-20T00:00:00")
+    assert [row["title"] for row in rows] == ["Day 10"]
+
+
+async def test_inserts_during_a_walk_neither_repeat_nor_skip_rows(client, unique):
+    location = unique("pages")
+    ids = await create_events(client, location, list(range(10, 30)))
+    seen, cursor = [], None
+    while True:
+        params = {"location": location, "sort": "date", "limit": 3, **({"cursor": cursor} if cursor else {})}
+        # Rows inserted before the current position while the client walks the pages
+        page, _ = await asyncio.gather(client.get("/events/", params=params),
+                                       create_events(client, location, [1, 2]))
+        seen.extend(row["id"] for row in page.json())
+        cursor = page.headers.get("x-next-cursor")
+        if cursor is None:
+            break
+    assert len(seen) == len(set(seen))
+    assert [id for id in seen if id in set(ids)] == ids
+
+
+async def test_users_sorted_by_name(client, unique):
+    prefix = unique("pages")
+    names = ["Carla", "Anna", "Bruno", "Anna"]
+    await client.post("/users/bulk", json=[user_body(f"{prefix}-{i}", name=f"{prefix} {name}")
+                                          for i, name in enumerate(names)])
+    # The users of the other tests come before and after: start right before these ones
+    cursor = encode_cursor([f"{prefix} ", ""])
+    first = await client.get("/users/", params={"sort": "name", "limit": 3, "cursor": cursor})
+    second = await client.get("/users/", params={"sort": "name", "limit": 1,
+                                                 "cursor": first.headers["x-next-cursor"]})
+    rows = first.json() + second.json()
+    assert [row["name"] for row in rows] == [f"{prefix} {name}" for name in sorted(names)]
+    # Same name: ordered by username
+    assert rows[0]["username"] < rows[1]["username"]
+
+
+@pytest.mark.parametrize("params", [{"cursor": "not-a-cursor"}, {"sort": "title"}, {"limit": 0}])
+async def test_invalid_parameters(client, params):
+    assert (await client.get("/events/", params=params)).status_code in (400, 422)
+
+
+async def test_cursor_of_another_sort_is_refused(client, unique):
+    location = unique("pages")
+    await create_events(client, location, [1, 2, 3])
+    page = await client.get("/events/", params={"location": location, "sort": "date", "limit": 1})
+    # date cursors hold (date, id): the id sort has a single column
+    response = await client.get("/events/", params={"sort": "id", "cursor": page.headers["x-next-cursor"]})
+    assert response.status_code == 400
@@ -0,0 +1,47 @@
+import asyncio
+
+import pytest
+
+from app.config import config
+from tests.conftest import create_event, user_body
+
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def queue_enabled(monkeypatch):
+    monkeypatch.setattr(config, "register_queue_enabled", True)
+
+
+async def register(client, event_id: int, username: str):
+    return await client.post(f"/events/{event_id}/register", json=user_body(username))
+
+
+async def test_group_commit_respects_capacity(client, unique, queue_enabled):
+    event_id = await create_event(client, capacity=2)
+    responses = await asyncio.gather(*(register(client, event_id, unique("queue")) for _ in range(4)))
+    assert sorted(response.status_code for response in responses) == [201, 201, 409, 409]
+    assert (await client.get(f"/events/{event_id}")).json()["registered_count"] == 2
+    registered = {response.json()["username"] for response in responses if response.status_code == 201}
+    rows = (await client.get("/registrations/", params={"event_id": event_id})).json()
+    assert {row["username"] for row in rows} == registered
+
+
+async def test_duplicate_and_unknown_event(client, unique, queue_enabled):
+    event_id = await create_event(client, capacity=5)
+    username = unique("queue")
+    first, again = await asyncio.gather(register(client, event_id, username), register(client, event_id, username))
+    assert sorted([first.status_code, again.status_code]) == [201, 409]
+    assert (await register(client, 10**9, unique("queue"))).status_code == 404
+    assert (await client.get(f"/events/{event_id}")).json()["registered_count"] == 1
+
+
+async def test_burst_in_one_batch(client, unique, queue_enabled):
+    event_id = await create_event(client)
+    usernames = [unique("queue") for _ in range(50)]
+    responses = await asyncio.gather(*(register(client, event_id, username) for username in usernames))
+    assert {response.status_code for response in responses} == {201}
+    assert (await client.get(f"/events/{event_id}")).json()["registered_count"] == 50
+    # The users are created by the same batch
+    assert (await client.get(f"/users/{usernames[-1]}")).status_code == 200
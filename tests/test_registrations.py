@@ -0,0 +1,49 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from app.config import config
+from tests.conftest import create_event, user_body
+
+
+pytestmark = pytest.mark.anyio
+
+
+def registration_ops(username: str, event_id: int) -> list[str]:
+    # Deltas of the change feed, straight from change_log
+    with sqlite3.connect(config.db_file) as conn:
+        rows = conn.execute("SELECT op FROM change_log WHERE entity = 'registration' AND key = ? ORDER BY seq",
+                            (f"{username}/{event_id}",)).fetchall()
+    return [op for op, in rows]
+
+
+async def test_delete_registration(client, unique):
+    event_id = await create_event(client, capacity=3)
+    username = unique("reg")
+    await client.post(f"/events/{event_id}/register", json=user_body(username))
+
+    response = await client.delete("/registrations/", params={"username": username, "event_id": event_id})
+    assert response.status_code == 200
+    assert (await client.get(f"/events/{event_id}")).json()["registered_count"] == 0
+    response = await client.delete("/registrations/", params={"username": username, "event_id": event_id})
+    assert response.status_code == 404
+
+
+async def test_concurrent_deletes_publish_one_delta(client, unique):
+    event_id = await create_event(client, capacity=10)
+    usernames = [unique("reg") for _ in range(10)]
+    for username in usernames:
+        await client.post(f"/events/{event_id}/register", json=user_body(username))
+
+    # Every registration deleted by 4 requests at once
+    responses = await asyncio.gather(*(
+        client.delete("/registrations/", params={"username": username, "event_id": event_id})
+        for username in usernames for _ in range(4)
+    ))
+    statuses = [response.status_code for response in responses]
+    for i in range(0, len(statuses), 4):
+        assert sorted(statuses[i:i + 4]) == [200, 404, 404, 404]
+    assert (await client.get(f"/events/{event_id}")).json()["registered_count"] == 0
+    for username in usernames:
+        assert registration_ops(username, event_id) == ["put", "delete"]
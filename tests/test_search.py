@@ -0,0 +1,48 @@
+import pytest
+
+from tests.conftest import create_event, event_body
+
+
+pytestmark = pytest.mark.anyio
+
+
+async def search(client, q: str) -> list[int]:
+    response = await client.get("/events/search", params={"q": q})
+    assert response.status_code == 200, response.text
+    return [event["id"] for event in response.json()]
+
+
+async def test_search_follows_the_writes(client, unique):
+    old, new = unique("ftsold"), unique("ftsnew")
+    event_id = await create_event(client, title=f"Concert {old}")
+    assert await search(client, old) == [event_id]
+    # Prefix match
+    assert event_id in await search(client, old[:-1])
+
+    response = await client.put(f"/events/{event_id}", json=event_body(title=f"Concert {new}"))
+    assert response.status_code == 200
+    assert await search(client, old) == []
+    assert await search(client, new) == [event_id]
+
+    assert (await client.delete(f"/events/{event_id}")).status_code == 200
+    assert await search(client, new) == []
+
+
+async def test_description_and_location_are_indexed(client, unique):
+    word, place = unique("ftsdesc"), unique("ftsplace")
+    event_id = await create_event(client, description=f"About {word}", location=place)
+    assert await search(client, word) == [event_id]
+    assert await search(client, place) == [event_id]
+
+
+async def test_every_word_must_match(client, unique):
+    first, second = unique("ftsand"), unique("ftsand")
+    both = await create_event(client, title=f"{first} {second}")
+    await create_event(client, title=first)
+    assert await search(client, f"{first} {second}") == [both]
+
+
+async def test_query_syntax_is_not_injected(client):
+    # FTS5 operators and quotes in the input are searched as words, not parsed
+    for q in ['"', "title:x", "a OR", "NEAR(", "*"]:
+        assert (await client.get("/events/search", params={"q": q})).status_code == 200
@@ -0,0 +1,73 @@
+import gzip
+import logging
+
+import pytest
+
+from app import static_assets as static_assets_module
+from app.config import config
+from app.static_assets import IMMUTABLE, static_assets
+
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_hashed_name_is_immutable(client):
+    url = f"/static/{static_assets.url_path('styles.css')}"
+    assert url != "/static/styles.css"
+    response = await client.get(url, headers={"Accept-Encoding": "identity"})
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == IMMUTABLE
+    assert "content-encoding" not in response.headers
+    assert response.content == (config.root_dir / "static" / "styles.css").read_bytes()
+
+
+async def test_plain_name_is_revalidated(client):
+    response = await client.get("/static/styles.css")
+    assert response.headers["cache-control"] == "no-cache"
+    revalidated = await client.get("/static/styles.css", headers={"If-None-Match": response.headers["etag"]})
+    assert revalidated.status_code == 304
+
+
+async def test_precompressed_copies(client):
+    pytest.importorskip("brotli")
+    url = f"/static/{static_assets.url_path('styles.css')}"
+    source = (config.root_dir / "static" / "styles.css").read_bytes()
+
+    # httpx decodes the body: the content is the source whatever the encoding
+    brotli_response = await client.get(url, headers={"Accept-Encoding": "gzip, br"})
+    assert brotli_response.headers["content-encoding"] == "br"
+    assert brotli_response.content == source
+
+    gzip_response = await client.get(url, headers={"Accept-Encoding": "gzip, br;q=0"})
+    assert gzip_response.headers["content-encoding"] == "gzip"
+    assert gzip_response.headers["vary"] == "Accept-Encoding"
+    assert gzip_response.content == source
+    assert gzip.decompress(
+        (static_assets.build_dir / static_assets.assets["styles.css"].encodings["gzip"]).read_bytes()) == source
+
+
+async def test_image_variants(client):
+    pytest.importorskip("PIL")
+    variants = static_assets.srcset_paths("home.jpeg")
+    assert variants
+    assert [width for _, width in variants] == sorted(width for _, width in variants)
+    webp = static_assets.srcset_paths("home.jpeg", "image/webp")
+    assert webp
+    response = await client.get(f"/static/{webp[0][0]}")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/webp"
+    assert response.headers["cache-control"] == IMMUTABLE
+
+
+def test_missing_packages_are_logged_once(monkeypatch, caplog):
+    monkeypatch.setattr(static_assets_module, "brotli", None)
+    monkeypatch.setattr(static_assets_module, "Image", None)
+    static_assets_module._warn_missing_packages.cache_clear()
+    try:
+        with caplog.at_level(logging.WARNING, logger="app.static_assets"):
+            static_assets_module._warn_missing_packages()
+            static_assets_module._warn_missing_packages()
+    finally:
+        static_assets_module._warn_missing_packages.cache_clear()
+    assert len(caplog.records) == 1
+    assert "brotli and Pillow not installed" in caplog.records[0].getMessage()
@@ -0,0 +1,70 @@
+import sqlite3
+from datetime import datetime, timezone
+
+import pytest
+
+from app.config import config
+from tests.conftest import create_event, user_body
+
+
+pytestmark = pytest.mark.anyio
+
+
+async def totals(client) -> dict:
+    return (await client.get("/stats/")).json()
+
+
+async def today(client) -> dict:
+    days = (await client.get("/stats/registrations/daily")).json()
+    day = datetime.now(timezone.utc).date().isoformat()
+    return next((row for row in days if row["day"] == day), {"registered": 0, "cancelled": 0})
+
+
+def location_stats(location: str) -> tuple[int, int] | None:
+    with sqlite3.connect(config.db_file) as conn:
+        return conn.execute("SELECT events, registrations FROM stats_location WHERE location = ?",
+                            (location,)).fetchone()
+
+
+async def test_counts_follow_register_and_unregister(client, unique):
+    event_id = await create_event(client, capacity=10)
+    username = unique("stats")
+    before, day_before = await totals(client), await today(client)
+
+    assert (await client.post(f"/events/{event_id}/register", json=user_body(username))).status_code == 201
+    after = await totals(client)
+    # The registration created its user as well
+    assert after == {**before, "users": before["users"] + 1, "registrations": before["registrations"] + 1}
+    assert (await today(client))["registered"] == day_before["registered"] + 1
+    event = (await client.get(f"/events/{event_id}/stats")).json()
+    assert (event["registered_count"], event["available"]) == (1, 9)
+
+    response = await client.delete("/registrations/", params={"username": username, "event_id": event_id})
+    assert response.status_code == 200
+    assert (await totals(client))["registrations"] == before["registrations"]
+    assert (await today(client))["cancelled"] == day_before["cancelled"] + 1
+
+
+async def test_totals_match_the_tables(client):
+    await create_event(client)
+    with sqlite3.connect(config.db_file) as conn:
+        counts = {name: conn.execute(f'SELECT count(*) FROM "{table}"').fetchone()[0]
+                  for name, table in (("events", "event"), ("users", "user"), ("registrations", "registration"))}
+    assert await totals(client) == counts
+
+
+async def test_location_counts_follow_moves_and_deletes(client, unique):
+    first, second = unique("statsloc"), unique("statsloc")
+    event_id = await create_event(client, location=first)
+    await create_event(client, location=first)
+    await client.post(f"/events/{event_id}/register", json=user_body(unique("stats")))
+    assert location_stats(first) == (2, 1)
+
+    moved = await client.put(f"/events/{event_id}", json={"title": "Moved", "description": "Description",
+                                                           "date": "2026-05-01T20:00:00", "location": second})
+    assert moved.status_code == 200
+    assert location_stats(first) == (1, 0)
+    assert location_stats(second) == (1, 1)
+
+    await client.delete(f"/events/{event_id}")
+    assert location_stats(second) is None
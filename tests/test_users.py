@@ -0,0 +1,41 @@
+import asyncio
+
+import pytest
+
+from tests.conftest import user_body
+
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_create_user_twice(client, unique):
+    username = unique("user")
+    assert (await client.post("/users/", json=user_body(username))).status_code == 201
+    response = await client.post("/users/", json=user_body(username))
+    assert response.status_code == 400
+
+
+async def test_bulk_reports_each_item(client, unique):
+    existing, new = unique("user"), unique("user")
+    await client.post("/users/", json=user_body(existing))
+
+    response = await client.post("/users/bulk", json=[user_body(new), user_body(existing), user_body(new)])
+    assert response.status_code == 200
+    assert [(item["status"], item["key"]) for item in response.json()] == [(201, new), (409, existing), (409, new)]
+    assert (await client.get(f"/users/{new}")).status_code == 200
+
+
+async def test_concurrent_bulk_with_the_same_username(client, unique):
+    shared = unique("user")
+    # Large batches keep each INSERT running while the other requests start theirs
+    batches = [[user_body(shared), *(user_body(unique("user")) for _ in range(300))] for _ in range(8)]
+
+    responses = await asyncio.gather(*(client.post("/users/bulk", json=batch) for batch in batches))
+
+    assert [response.status_code for response in responses] == [200] * 8
+    statuses = [response.json()[0]["status"] for response in responses]
+    assert sorted(statuses) == [201] + [409] * 7
+    # The other users of every batch were created
+    assert all(item["status"] == 201 for response in responses for item in response.json()[1:])
+    for batch in batches:
+        assert (await client.get(f"/users/{batch[-1]['username']}")).status_code == 200